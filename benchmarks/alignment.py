@@ -0,0 +1,72 @@
+"""Compare single-pass ticker alignment with the pairwise merge chain.
+
+Tickers get staggered listing dates and randomly missing days, like a real
+universe. Both paths use the "inner" policy, so their results must match.
+
+Usage (after `pip install -e .` in the repository root):
+    python benchmarks/alignment.py [--tickers 100 300 1000] [--days 5000]
+        [--missing 0.01]
+"""
+
+import argparse
+import time
+from functools import reduce
+import numpy as np
+import pandas as pd
+from investment_simulator import utils
+from synthetic import synthetic_prices
+
+
+def ticker_frames(n_tickers: int, n_days: int, missing: float, seed: int = 0) -> list:
+    rng = np.random.default_rng(seed)
+    prices = synthetic_prices(n_tickers, n_days, seed=seed)
+    frames = []
+    for ticker in prices.columns:
+        start = rng.integers(0, n_days // 4) if missing else 0
+        frame = prices[[ticker]].iloc[start:]
+        frames.append(frame[rng.random(len(frame)) >= missing])
+    return frames
+
+
+def merge_chain(frames: list) -> pd.DataFrame:
+    return reduce(
+        lambda x, y: x.merge(y, how="inner", left_index=True, right_index=True),
+        frames,
+    ).sort_index()
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[100, 300, 1000])
+    parser.add_argument("--days", type=int, default=5000)
+    parser.add_argument(
+        "--missing",
+        type=float,
+        default=0.01,
+        help="share of days missing per ticker; 0 also disables staggered starts",
+    )
+    args = parser.parse_args()
+    rows = []
+    for n_tickers in args.tickers:
+        frames = ticker_frames(n_tickers, args.days, args.missing)
+        merged, merge_s = timed(merge_chain, frames)
+        aligned, align_s = timed(utils.align_frames, frames)
+        pd.testing.assert_frame_equal(merged, aligned)
+        row = {"tickers": n_tickers, "merge_s": merge_s, "inner_s": align_s}
+        for policy in (5, "ragged"):
+            aligned, seconds = timed(utils.align_frames, frames, policy=policy)
+            row[f"{policy}_s"] = seconds
+            row[f"{policy}_days"] = len(aligned)
+        row["inner_days"] = len(merged)
+        rows.append(row)
+    print(pd.DataFrame(rows).round(4).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Compare drawdown engines on synthetic daily histories.
+
+Usage (after `pip install -e .` in the repository root):
+    python benchmarks/drawdown_engines.py [--tickers 10] [--days 1000 5000 20000]
+"""
+
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from investment_simulator import utils
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.get_agg_metrics import DRAWDOWN_ENGINES
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.set_variables import set_weights
+from synthetic import synthetic_prices
+
+
+def run(data: pd.DataFrame, problem: str, engine: str) -> dict:
+    tickers = list(data.columns)
+    optimizer = Optimizer()
+    set_weights(tickers)
+    start = time.perf_counter()
+    sc.keep_long_positions_only()
+    if problem == "cap":
+        # cap at the equal-weight portfolio's drawdown so the problem is
+        # feasible and the cap binds at any history length
+        path = utils.get_percent_change_against_initial_state(data).mean(axis=1)
+        threshold = np.max(np.maximum.accumulate(path) - path)
+        so.maximize_return(data, tickers)
+        sc.cap_maximal_drawdown_at_threshold(data, tickers, threshold, engine=engine)
+    else:
+        so.minimize_maximal_drawdown(data, tickers, engine=engine)
+    build = time.perf_counter() - start
+    optimizer.optimize()
+    total = time.perf_counter() - start
+    return {
+        "days": len(data),
+        "problem": problem,
+        "engine": engine,
+        "build_s": round(build, 4),
+        "total_s": round(total, 4),
+        "status": optimizer.status,
+        "value": optimizer.value,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=10)
+    parser.add_argument("--days", type=int, nargs="+", default=[1000, 5000, 20000])
+    args = parser.parse_args()
+    rows = []
+    for n_days in args.days:
+        data = synthetic_prices(args.tickers, n_days)
+        for problem in ("cap", "minimize"):
+            for engine in DRAWDOWN_ENGINES:
+                rows.append(run(data, problem, engine))
+    print(pd.DataFrame(rows).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
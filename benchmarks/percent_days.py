@@ -0,0 +1,86 @@
+"""Compare % days backends (convex surrogate vs exact mixed-integer).
+
+For each history length, optimizes the % of outperforming days against an
+equal-weight benchmark and the % of days with a loss with both
+backends, and reports the realized % of days of each solution, the bound the
+solver optimized, and how many days the surrogate's solution is away from
+the exact one.
+
+Usage (after `pip install -e .` in the repository root):
+    python benchmarks/percent_days.py [--tickers 10] [--days 250 1000]
+        [--solver SCIPY] [--time-limit 60] [--mip-gap 0.01]
+"""
+
+import argparse
+import time
+import pandas as pd
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.get_agg_metrics import PERCENT_DAYS_BACKENDS
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.set_variables import set_weights
+from synthetic import synthetic_prices
+
+BENCHMARK = "INDEX"
+
+
+def run(data: pd.DataFrame, problem: str, backend: str, args) -> dict:
+    tickers = [ticker for ticker in data.columns if ticker != BENCHMARK]
+    optimizer = Optimizer()
+    set_weights(tickers)
+    start = time.perf_counter()
+    sc.keep_long_positions_only()
+    if problem == "outperforming":
+        objective = so.maximize_percent_outperforming_days(
+            data, tickers, BENCHMARK, backend=backend
+        )
+        name = f"return against {BENCHMARK} (% outperforming days)"
+    else:
+        objective = so.minimize_days_with_loss(data, tickers, 0.0, backend=backend)
+        name = "DoD return (% underperforming days)"
+    if backend == "exact":
+        optimizer.optimize(args.solver, args.time_limit, args.mip_gap)
+    else:
+        optimizer.optimize()
+    total = time.perf_counter() - start
+    metric = optimizer._optimizer_metrics[name]
+    realized = metric.get_value()
+    return {
+        "days": len(data),
+        "problem": problem,
+        "backend": backend,
+        "total_s": round(total, 4),
+        "status": optimizer.status,
+        "bound": metric.get_bound(),
+        "realized": realized,
+        "realized_days": (
+            None if realized is None else round(realized * metric.series.expr.size)
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, default=10)
+    parser.add_argument("--days", type=int, nargs="+", default=[250, 1000])
+    parser.add_argument("--solver", default="SCIPY")
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--mip-gap", type=float, default=0.01)
+    args = parser.parse_args()
+    rows = []
+    for n_days in args.days:
+        data = synthetic_prices(args.tickers, n_days, benchmark=BENCHMARK)
+        for problem in ("outperforming", "loss"):
+            for backend in PERCENT_DAYS_BACKENDS:
+                rows.append(run(data, problem, backend, args))
+    table = pd.DataFrame(rows)
+    exact = table[table["backend"] == "exact"].set_index(["days", "problem"])
+    table["days_vs_exact"] = [
+        row.realized_days - exact.loc[(row.days, row.problem), "realized_days"]
+        for row in table.itertuples()
+    ]
+    print(table.to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
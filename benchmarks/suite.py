@@ -0,0 +1,352 @@
+"""Time every objective and constraint on synthetic panels of growing size.
+
+Each case registers a recipe (see `investment_simulator.recipe`) on an
+`Optimizer` and solves it: every objective alone, every constraint alone
+under `maximize_return`, and a few common combinations, all with long
+positions only. Thresholds are set to the equal-weight portfolio's value of
+the constrained metric, so every case is feasible and the constraint binds
+at any panel size.
+
+Results are written as JSON (one row per case and panel size, plus the
+environment they were measured in); pass two result files to `--compare` to
+print the change in solve time and memory between them.
+
+Usage (after `pip install -e .` in the repository root):
+    python benchmarks/suite.py [--tickers 10 50] [--days 1000 5000]
+        [--only drawdown] [--solver CLARABEL] [--output results.json]
+    python benchmarks/suite.py --compare before.json after.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import subprocess
+import time
+import tracemalloc
+from datetime import datetime
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+from scipy.signal import lfilter
+from investment_simulator import utils
+from investment_simulator.evaluate import BatchEvaluator
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.recipe import apply_recipe
+from investment_simulator.set_variables import set_weights
+from synthetic import synthetic_prices
+
+BENCHMARK = "BENCH"
+WINDOW = 20
+SLACK = 0.01
+
+OBJECTIVES = {
+    "maximize_return": {},
+    "maximize_avg_return": {},
+    "maximize_ema_return": {"smoothing_window": WINDOW},
+    "maximize_avg_dod_return": {},
+    "maximize_ema_dod_return": {"smoothing_window": WINDOW},
+    "maximize_return_against_benchmark": {"benchmark": BENCHMARK},
+    "maximize_avg_return_against_benchmark": {"benchmark": BENCHMARK},
+    "maximize_ema_return_against_benchmark": {
+        "benchmark": BENCHMARK,
+        "smoothing_window": WINDOW,
+    },
+    "maximize_percent_outperforming_days": {"benchmark": BENCHMARK},
+    "minimize_maximal_loss": {},
+    "minimize_days_with_loss": {"threshold": 0},
+    "minimize_maximal_drawdown": {},
+    "minimize_avg_drawdown": {},
+    "minimize_ema_drawdown": {"smoothing_window": WINDOW},
+    "minimize_underperforming_days": {"benchmark": BENCHMARK},
+    "minimize_ema_deviation": {"smoothing_window": WINDOW},
+    "minimize_classical_volatility": {},
+}
+
+# constraint -> (keyword arguments, equal-weight metric its threshold is set
+# to, whether the threshold is a floor, a cap, or a cap on the metric's loss)
+CONSTRAINTS = {
+    "keep_long_positions_only": ({}, None, None),
+    "keep_return_above_threshold": (
+        {},
+        "simple return (value on return date)",
+        "floor",
+    ),
+    "keep_avg_return_above_threshold": (
+        {},
+        "simple return (historical average)",
+        "floor",
+    ),
+    "keep_ema_return_above_threshold": (
+        {"smoothing_window": WINDOW},
+        "simple return (exponential weighted average)",
+        "floor",
+    ),
+    "keep_avg_dod_return_above_threshold": (
+        {},
+        "DoD return (historical average)",
+        "floor",
+    ),
+    "keep_ema_dod_return_above_threshold": (
+        {"smoothing_window": WINDOW},
+        "DoD return (exponential weighted average)",
+        "floor",
+    ),
+    "keep_return_against_benchmark_above_threshold": (
+        {"benchmark": BENCHMARK},
+        f"return against {BENCHMARK} (value on return date)",
+        "floor",
+    ),
+    "keep_avg_return_against_benchmark_above_threshold": (
+        {"benchmark": BENCHMARK},
+        f"return against {BENCHMARK} (historical average)",
+        "floor",
+    ),
+    "keep_ema_return_against_benchmark_above_threshold": (
+        {"benchmark": BENCHMARK, "smoothing_window": WINDOW},
+        f"return against {BENCHMARK} (exponential weighted average)",
+        "floor",
+    ),
+    "keep_percent_outperforming_days_above_threshold": (
+        {"benchmark": BENCHMARK},
+        f"return against {BENCHMARK} (% outperforming days)",
+        "floor",
+    ),
+    "cap_maximal_loss_at_threshold": ({}, "simple return (historical min)", "loss"),
+    "cap_maximal_dod_loss_at_threshold": ({}, "DoD return (historical min)", "loss"),
+    "cap_maximal_drawdown_at_threshold": ({}, "drawdown (historical max)", "cap"),
+    "cap_avg_drawdown_at_threshold": ({}, "drawdown (historical average)", "cap"),
+    "cap_ema_drawdown_at_threshold": (
+        {"smoothing_window": WINDOW},
+        "drawdown (exponential weighted average)",
+        "cap",
+    ),
+    "cap_percent_underperforming_days_at_threshold": (
+        {"benchmark": BENCHMARK},
+        f"return against {BENCHMARK} (% underperforming days)",
+        "cap",
+    ),
+    "keep_ema_deviation_below_threshold": (
+        {"smoothing_window": WINDOW},
+        "simple return (deviation from historical weighted average)",
+        "cap",
+    ),
+    "keep_portfolio_variance_below_threshold": (
+        {},
+        "portfolio variance (classical method)",
+        "cap",
+    ),
+}
+
+COMBINATIONS = [
+    (
+        "maximize_avg_dod_return",
+        [
+            "cap_maximal_dod_loss_at_threshold",
+            "keep_portfolio_variance_below_threshold",
+        ],
+    ),
+    (
+        "maximize_ema_return",
+        ["cap_maximal_dod_loss_at_threshold", "cap_maximal_drawdown_at_threshold"],
+    ),
+    ("minimize_classical_volatility", ["keep_avg_return_above_threshold"]),
+    (
+        "maximize_avg_return_against_benchmark",
+        ["keep_portfolio_variance_below_threshold", "cap_avg_drawdown_at_threshold"],
+    ),
+    (
+        "minimize_maximal_drawdown",
+        ["keep_ema_return_above_threshold", "cap_maximal_loss_at_threshold"],
+    ),
+]
+
+
+def equal_weight_metrics(data: pd.DataFrame, tickers) -> pd.Series:
+    """Metrics of the equal-weight portfolio, named like `Metric` names."""
+    evaluator = BatchEvaluator(
+        data, tickers, smoothing_window=WINDOW, benchmark=BENCHMARK
+    )
+    metrics = evaluator.evaluate(np.full((1, len(tickers)), 1 / len(tickers)))
+    metrics = metrics.iloc[0]
+    # not computed by the evaluator: std of the return path against its ema
+    path = evaluator.returns.mean(axis=1)
+    alpha = 2 / (WINDOW + 1)
+    ema, _ = lfilter([alpha], [1, alpha - 1], path, zi=[(1 - alpha) * path[0]])
+    metrics["simple return (deviation from historical weighted average)"] = np.std(
+        path - ema
+    )
+    return metrics
+
+
+def constraint_step(name: str, metrics: pd.Series):
+    kwargs, metric, kind = CONSTRAINTS[name]
+    if metric is None:
+        return name
+    value = metrics[metric]
+    if kind == "floor":
+        threshold = value - SLACK * abs(value)
+    elif kind == "loss":
+        threshold = -value + SLACK * abs(value)
+    else:
+        threshold = value + SLACK * abs(value)
+    return name, dict(kwargs, threshold=float(threshold))
+
+
+def cases():
+    """(kind, objective, constraint names) of every case."""
+    for objective in OBJECTIVES:
+        yield "objective", objective, []
+    for constraint in CONSTRAINTS:
+        if constraint != "keep_long_positions_only":
+            yield "constraint", "maximize_return", [constraint]
+    for objective, constraints in COMBINATIONS:
+        yield "combination", objective, constraints
+
+
+def solve(data, tickers, objective, constraints, metrics, solver) -> Optimizer:
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(tickers)
+    steps = ["keep_long_positions_only"] + [
+        constraint_step(name, metrics) for name in constraints
+    ]
+    apply_recipe(optimizer, data, tickers, (objective, OBJECTIVES[objective]), steps)
+    optimizer.optimize(solver=solver)
+    return optimizer
+
+
+def run_case(data, tickers, objective, constraints, metrics, solver, memory) -> dict:
+    row = {}
+    utils.derived_series_cache.clear()
+    start = time.perf_counter()
+    try:
+        optimizer = solve(data, tickers, objective, constraints, metrics, solver)
+    except Exception as e:
+        row["status"] = f"error: {type(e).__name__}"
+        return row
+    row["total_s"] = time.perf_counter() - start
+    timings = optimizer.timings
+    row["build_s"] = timings.get("metric construction", 0)
+    row["canonicalization_s"] = timings.get("canonicalization", 0)
+    row["solver_s"] = timings.get("solver", 0)
+    row["separation_s"] = timings.get("separation", 0)
+    row.update(
+        status=optimizer.status,
+        value=optimizer.value,
+        solver=optimizer.solver_stats["solver"],
+        iterations=optimizer.solver_stats["iterations"],
+        variables=int(optimizer.problem.size_metrics.num_scalar_variables),
+    )
+    if memory:
+        # separate run: tracing allocations slows down the timed one
+        utils.derived_series_cache.clear()
+        tracemalloc.start()
+        try:
+            solve(data, tickers, objective, constraints, metrics, solver)
+            row["peak_mb"] = tracemalloc.get_traced_memory()[1] / 2**20
+        finally:
+            tracemalloc.stop()
+    return row
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "created": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cvxpy": cp.__version__,
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+    }
+
+
+def compare(before: str, after: str):
+    keys = ["tickers", "days", "kind", "objective", "constraints"]
+    frames = []
+    for path in (before, after):
+        with open(path, "r") as f:
+            frame = pd.DataFrame(json.loads(f.read())["results"])
+        frame["constraints"] = frame["constraints"].map(" + ".join)
+        frames.append(frame.set_index(keys))
+    merged = frames[0].join(frames[1], lsuffix="_before", rsuffix="_after")
+    table = pd.DataFrame(index=merged.index)
+    for column in ("total_s", "solver_s", "peak_mb"):
+        if f"{column}_before" in merged and f"{column}_after" in merged:
+            table[f"{column} ratio"] = (
+                merged[f"{column}_after"] / merged[f"{column}_before"]
+            )
+    table["status"] = merged["status_after"]
+    print(table.round(3).to_string())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tickers", type=int, nargs="+", default=[10, 50])
+    parser.add_argument("--days", type=int, nargs="+", default=[1000, 5000])
+    parser.add_argument("--only", help="run cases whose functions contain this")
+    parser.add_argument("--solver", help="cvxpy solver, cvxpy picks one if unset")
+    parser.add_argument("--no-memory", action="store_true", help="skip tracemalloc")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"))
+    args = parser.parse_args()
+    if args.compare:
+        compare(*args.compare)
+        return
+    rows = []
+    for n_tickers in args.tickers:
+        for n_days in args.days:
+            data = synthetic_prices(
+                n_tickers, n_days, seed=args.seed, benchmark=BENCHMARK
+            )
+            tickers = [f"T{i}" for i in range(n_tickers)]
+            metrics = equal_weight_metrics(data, tickers)
+            for kind, objective, constraints in cases():
+                if args.only and not any(
+                    args.only in name for name in [objective] + constraints
+                ):
+                    continue
+                row = {
+                    "tickers": n_tickers,
+                    "days": n_days,
+                    "kind": kind,
+                    "objective": objective,
+                    "constraints": constraints,
+                }
+                row.update(
+                    run_case(
+                        data,
+                        tickers,
+                        objective,
+                        constraints,
+                        metrics,
+                        args.solver,
+                        not args.no_memory,
+                    )
+                )
+                rows.append(row)
+                elapsed = row.get("total_s")
+                elapsed = "-" if elapsed is None else f"{elapsed:.3f}s"
+                print(
+                    f"{n_tickers:>5} x {n_days:<6} {row['status']:<26} {elapsed:>9}  "
+                    f"{objective} {' + '.join(constraints)}"
+                )
+    with open(args.output, "w") as f:
+        f.write(json.dumps({"environment": environment(), "results": rows}, indent=4))
+    print(f"Results written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+"""Synthetic price panels in the `DataProcessor` layout, for offline runs.
+
+Dates are "%Y-%m-%d" strings on business days, with one column of daily
+close prices per ticker (T0, T1, ...) and optionally a benchmark index, as
+`DataProcessor.refresh_dataframe` builds. `synthetic_cpi` gives a matching
+monthly CPI series for real-return metrics.
+"""
+
+import numpy as np
+import pandas as pd
+from investment_simulator.dataset import to_days
+from investment_simulator.inflation import CPI
+
+
+def synthetic_prices(
+    n_tickers: int,
+    n_days: int,
+    seed: int = 0,
+    benchmark: str = None,
+) -> pd.DataFrame:
+    """
+    Args:
+        benchmark: add a column of this name with the prices of an
+            equal-weight index of the tickers.
+    """
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(3e-4, 1e-2, size=(n_days, n_tickers))
+    prices = 100 * np.cumprod(1 + returns, axis=0)
+    dates = pd.bdate_range("2000-01-03", periods=n_days).strftime("%Y-%m-%d")
+    data = pd.DataFrame(
+        prices, index=dates, columns=[f"T{i}" for i in range(n_tickers)]
+    )
+    if benchmark:
+        data[benchmark] = 100 * np.cumprod(1 + returns.mean(axis=1))
+    return data
+
+
+def synthetic_cpi(data: pd.DataFrame, seed: int = 0) -> CPI:
+    """Monthly CPI covering the dates of `data`, growing about 0.2% a month."""
+    rng = np.random.default_rng(seed)
+    months = pd.date_range(
+        pd.Timestamp(data.index[0]).to_period("M").start_time,
+        data.index[-1],
+        freq="MS",
+    )
+    inflation = rng.normal(2e-3, 2e-3, size=len(months))
+    return CPI(to_days(months.strftime("%Y-%m-%d")), 100 * np.cumprod(1 + inflation))
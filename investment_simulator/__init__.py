@@ -1,5 +1,9 @@
+import os
 from pathlib import Path
 
 
 REPO_DIR = Path(str(__file__)).parents[1].resolve()
-DATA_DIR = REPO_DIR / "data"
+# cached responses, price store, solve cache and outputs; set
+# INVESTMENT_SIMULATOR_DATA_DIR to keep them elsewhere (inherited by the
+# worker processes of the service and batch runner)
+DATA_DIR = Path(os.environ.get("INVESTMENT_SIMULATOR_DATA_DIR", REPO_DIR / "data"))
@@ -0,0 +1,209 @@
+"""Walk-forward backtesting.
+
+The price history is split into folds of `train_window` in-sample days
+followed by `test_window` out-of-sample days, advancing by `step` days. Each
+fold re-optimizes the same objective / constraint recipe (see `recipe`) on
+its training window, and the allocation is then held over the test window.
+Folds are independent and run on a process pool.
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Sequence
+
+from investment_simulator import utils
+from investment_simulator.data_processor import DataProcessor
+from investment_simulator.inflation import CPI
+from investment_simulator.recipe import Step, apply_recipe, is_real
+
+
+def evaluate_allocation(data: pd.DataFrame, tickers, weights: np.ndarray) -> dict:
+    """Performance of a fixed allocation over `data` (first row is the base)."""
+    path = utils.get_percent_change_against_initial_state(data[tickers]) @ weights
+    dod = utils.get_percent_change_over_time(data[tickers]) @ weights
+    return {
+        "final return": path[-1],
+        "average return": path.mean(),
+        "max drawdown": np.max(np.maximum.accumulate(path) - path),
+        "worst DoD return": dod.min() if dod.size else np.nan,
+        "average DoD return": dod.mean() if dod.size else np.nan,
+    }
+
+
+def _run_fold(fold: dict) -> dict:
+    # imported here so worker processes only pay for it when running folds
+    from investment_simulator.simulator import InvestmentSimulator
+
+    train, test, tickers = fold["train"], fold["test"], fold["tickers"]
+    sim = InvestmentSimulator(tickers, data=train)
+    apply_recipe(
+        sim, train, tickers, fold["objective"], fold["constraints"], fold["cpi"]
+    )
+    sim.optimize()
+    weights = sim._optimizer_variables["weights"].var.value
+    result = {
+        "fold": fold["fold"],
+        "train start": train.index[0],
+        "train end": train.index[-1],
+        "test start": test.index[0],
+        "test end": test.index[-1],
+        "status": sim.status,
+        "value": sim.value,
+        "allocation": {},
+        "in-sample": {},
+        "out-of-sample": {},
+        "path": None,
+    }
+    if weights is None:
+        return result
+    result["allocation"] = dict(zip(tickers, weights))
+    result["in-sample"] = evaluate_allocation(train, tickers, weights)
+    result["out-of-sample"] = evaluate_allocation(test, tickers, weights)
+    result["path"] = pd.Series(
+        (test[tickers].to_numpy() / test[tickers].to_numpy()[0]) @ weights,
+        index=test.index,
+    )
+    return result
+
+
+class WalkForwardBacktest:
+
+    def __init__(
+        self,
+        tickers: List[str],
+        objective: Step,
+        constraints: Sequence[Step] = (),
+        train_window: int = 504,
+        test_window: int = 63,
+        step: int = None,
+        input_date: str = None,
+        output_date: str = None,
+        data: pd.DataFrame = None,
+        cpi: CPI = None,
+    ):
+        """
+        Args:
+            objective, constraints: recipe re-applied on every fold.
+            train_window, test_window, step: fold lengths and the distance
+                between fold starts, in trading days. `step` defaults to
+                `test_window` (non-overlapping test windows); a larger
+                `step` would leave days between test windows unheld, so it
+                is rejected.
+            data: price data in the `DataProcessor` layout; retrieved for
+                `input_date` - `output_date` if not given.
+            cpi: monthly CPI of recipe steps asking for real returns; loaded
+                if not given and a step needs it.
+        """
+        self.tickers = tickers
+        self.objective = objective
+        self.constraints = list(constraints)
+        self.train_window = train_window
+        self.test_window = test_window
+        self.step = step or test_window
+        if self.step > test_window:
+            raise Exception(
+                f"Step ({self.step}) exceeds the test window ({test_window}); "
+                f"the days in between would not be held by any fold."
+            )
+        if data is None:
+            dp = DataProcessor(input_date, output_date)
+            dp.retrieve_price(tickers)
+            dp.refresh_dataframe()
+            data = dp.data
+        self.data = data
+        if cpi is None and any(map(is_real, [objective, *constraints])):
+            cpi = DataProcessor(input_date, output_date).retrieve_cpi()
+        self.cpi = cpi
+        self.stitched_path = None
+        self.report = None
+
+    def folds(self) -> List[dict]:
+        folds = []
+        start = 0
+        # each test window starts on the last training day, which is the base
+        # for its out-of-sample returns
+        while start + self.train_window + 1 <= len(self.data):
+            train_end = start + self.train_window
+            folds.append(
+                {
+                    "fold": len(folds),
+                    "train": self.data.iloc[start:train_end],
+                    "test": self.data.iloc[
+                        train_end - 1 : train_end + self.test_window
+                    ],
+                    "tickers": self.tickers,
+                    "objective": self.objective,
+                    "constraints": self.constraints,
+                    "cpi": self.cpi,
+                }
+            )
+            start += self.step
+        return folds
+
+    def _stitch(self, results: List[dict]) -> pd.Series:
+        """Chain the out-of-sample growth of consecutive folds, each held
+        until the next fold's allocation takes over."""
+        pieces = []
+        level = 1.0
+        for result in results:
+            if result["path"] is None:
+                continue
+            growth = result["path"].iloc[: self.step + 1]
+            pieces.append(level * growth.iloc[1:])
+            level *= growth.iloc[-1]
+        if not pieces:
+            return pd.Series(dtype=float)
+        return pd.concat(pieces) - 1
+
+    def run(self, max_workers: int = None) -> dict:
+        """Optimize and evaluate all folds on a process pool.
+
+        Returns:
+            The consolidated report: one entry per fold (allocation, in- and
+            out-of-sample metrics) and the metrics of the stitched
+            out-of-sample path.
+        """
+        folds = self.folds()
+        if not folds:
+            raise Exception("Not enough data for a single training window.")
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_run_fold, folds))
+        self.stitched_path = self._stitch(results)
+        stitched = {}
+        if len(self.stitched_path):
+            path = self.stitched_path.to_numpy()
+            wealth = np.concatenate([[1.0], 1 + path])
+            stitched = {
+                "start": self.stitched_path.index[0],
+                "end": self.stitched_path.index[-1],
+                "final return": path[-1],
+                "max drawdown": np.max(np.maximum.accumulate(path) - path),
+                "worst DoD return": np.min(wealth[1:] / wealth[:-1] - 1),
+            }
+        self.report = {
+            "tickers": self.tickers,
+            "objective": self.objective,
+            "constraints": self.constraints,
+            "train window": self.train_window,
+            "test window": self.test_window,
+            "step": self.step,
+            "folds": [
+                {k: v for k, v in result.items() if k != "path"} for result in results
+            ],
+            "stitched": stitched,
+        }
+        return self.report
+
+    def to_frame(self) -> pd.DataFrame:
+        """Per-fold report as a table (one row per fold)."""
+        rows = []
+        for fold in self.report["folds"]:
+            row = {k: v for k, v in fold.items() if not isinstance(v, dict)}
+            row.update({f"weight {k}": v for k, v in fold["allocation"].items()})
+            row.update({f"in-sample {k}": v for k, v in fold["in-sample"].items()})
+            row.update(
+                {f"out-of-sample {k}": v for k, v in fold["out-of-sample"].items()}
+            )
+            rows.append(row)
+        return pd.DataFrame(rows).set_index("fold")
@@ -0,0 +1,217 @@
+"""Declarative batch runs.
+
+A JSON or YAML spec lists simulations, each with tickers, a date window, an
+objective of `set_objective` and constraints of `set_constraints` (recipe
+steps, see `recipe`). Keys of `defaults` apply to every simulation that does
+not set them:
+
+    defaults:
+      input_date: "2015-01-01"
+      output_date: "2023-12-31"
+      constraints: [keep_long_positions_only]
+    simulations:
+      - name: ema
+        tickers: [IVV, QQQ, GLD]
+        objective: {maximize_ema_return: {smoothing_window: 100}}
+      - tickers: [IVV, QQQ, GLD]
+        objective: minimize_maximal_drawdown
+        constraints:
+          - keep_long_positions_only
+          - cap_maximal_drawdown_at_threshold: {threshold: 0.2, real: true}
+
+Steps are a function name, a `{name: kwargs}` mapping or a `[name, kwargs]`
+pair. Other simulation fields are those of a service job (see
+`service.parse_job`): benchmarks, alignment, frequency, representative_days
+and solver.
+
+    investment-simulator-batch spec.yaml --output runs.jsonl --workers 4
+
+Simulations run on a process pool, and each report is written as one JSON
+line as soon as it completes. Every line carries the run's key, a hash of its
+simulation, so rerunning the same command after a crash skips the runs
+already in the output.
+"""
+
+import argparse
+import contextlib
+import datetime
+import hashlib
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Dict, List, Union
+import yaml
+
+from investment_simulator.service import parse_job, run_job
+
+
+def _step(step):
+    if isinstance(step, dict):
+        if len(step) != 1:
+            raise Exception(f"A step mapping names one function, got {list(step)}.")
+        return list(step.items())[0]
+    return step
+
+
+def _dates(value):
+    # YAML parses unquoted dates
+    if isinstance(value, datetime.date):
+        return value.isoformat()
+    return value
+
+
+def load_spec(path: Union[str, Path]) -> List[dict]:
+    """Read a JSON or YAML spec (by file extension).
+
+    Returns:
+        The simulations, defaults filled in, each with its name (or None),
+        its key and its job, see `service.parse_job`.
+
+    Raises:
+        Exception: The spec has no simulations, or one of them is invalid.
+    """
+    path = Path(path)
+    with open(path, "r") as f:
+        if path.suffix in (".yaml", ".yml"):
+            spec = yaml.safe_load(f)
+        else:
+            spec = json.loads(f.read())
+    if not isinstance(spec, dict) or not spec.get("simulations"):
+        raise Exception(f"{path} has no simulations.")
+    defaults = spec.get("defaults") or {}
+    simulations = []
+    for i, simulation in enumerate(spec["simulations"]):
+        body = dict(defaults, **simulation)
+        name = body.pop("name", None)
+        for field in ("input_date", "output_date"):
+            body[field] = _dates(body.get(field))
+        if "objective" in body:
+            body["objective"] = _step(body["objective"])
+        body["constraints"] = [_step(step) for step in body.get("constraints") or []]
+        if body.get("timeout") is not None:
+            raise Exception("Batch runs have no timeout; use the service for that.")
+        try:
+            job = parse_job(body)
+        except Exception as e:
+            raise Exception(f"Simulation {name or i}: {e}")
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(json.dumps(job, sort_keys=True).encode())
+        simulations.append({"name": name, "key": digest.hexdigest(), "job": job})
+    return simulations
+
+
+def recorded_runs(path: Union[str, Path], retry_failed: bool = False) -> Dict:
+    """Keys of the runs already in the output at `path`, except failed ones
+    if `retry_failed`. A partially written last line (left by a crash) is
+    dropped from the file."""
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r") as f:
+        lines = f.read().splitlines(keepends=True)
+    records = {}
+    valid = []
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        if line.endswith("\n"):
+            valid.append(line)
+            records[record["key"]] = record
+    if len(valid) != len(lines):
+        with open(path, "w") as f:
+            f.writelines(valid)
+    if retry_failed:
+        records = {k: r for k, r in records.items() if r["error"] is None}
+    return records
+
+
+def _run(simulation: dict) -> dict:
+    start = time.perf_counter()
+    result, error = None, None
+    # keep stdout for the report stream
+    with contextlib.redirect_stdout(sys.stderr):
+        try:
+            result = run_job(simulation["job"])
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+    return {
+        "key": simulation["key"],
+        "name": simulation["name"],
+        "status": "failed" if error else result["status"],
+        "elapsed": time.perf_counter() - start,
+        "simulation": simulation["job"],
+        "result": result,
+        "error": error,
+    }
+
+
+def run_batch(
+    simulations: List[dict],
+    output=None,
+    max_workers: int = None,
+    retry_failed: bool = False,
+) -> int:
+    """Run `simulations` (see `load_spec`) on a process pool and append one
+    JSON line per report to `output` (a path, or stdout if None) as each one
+    completes. Runs already recorded in the output are skipped.
+
+    Returns:
+        Number of failed runs.
+    """
+    done = {} if output is None else recorded_runs(output, retry_failed)
+    pending = {}
+    for simulation in simulations:
+        if simulation["key"] not in done:
+            pending.setdefault(simulation["key"], simulation)
+    print(
+        f"{len(pending)} runs to go, {len(simulations) - len(pending)} recorded\n",
+        file=sys.stderr,
+    )
+    failed = 0
+    stream = sys.stdout if output is None else open(output, "a")
+    try:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_run, s) for s in pending.values()]
+            for i, future in enumerate(as_completed(futures)):
+                record = future.result()
+                stream.write(json.dumps(record) + "\n")
+                stream.flush()
+                if output is not None:
+                    os.fsync(stream.fileno())
+                failed += record["error"] is not None
+                print(
+                    f"[{i + 1}/{len(futures)}] {record['name'] or record['key']}: "
+                    f"{record['status']} ({record['elapsed']:.2f}s)",
+                    file=sys.stderr,
+                )
+    finally:
+        if output is not None:
+            stream.close()
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("spec", help="JSON or YAML spec of the simulations")
+    parser.add_argument(
+        "--output",
+        help="JSON lines of reports, resumed if it exists (stdout if not given)",
+    )
+    parser.add_argument("--workers", type=int, help="defaults to the CPU count")
+    parser.add_argument(
+        "--retry-failed", action="store_true", help="rerun failed runs on resume"
+    )
+    args = parser.parse_args()
+    failed = run_batch(
+        load_spec(args.spec), args.output, args.workers, args.retry_failed
+    )
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
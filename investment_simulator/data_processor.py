@@ -1,72 +1,110 @@
-from functools import reduce
 import json
+import numpy as np
 import pandas as pd
-from typing import List
+from typing import Dict, List, Union
 
-from investment_simulator import DATA_DIR
+from investment_simulator import DATA_DIR, utils
 from investment_simulator.data_retriever import DataRetriever
+from investment_simulator.inflation import CPI
+from investment_simulator.price_store import PriceStore
 
 
 class DataProcessor:
 
-    def __init__(self, min_date, max_date):
+    def __init__(
+        self,
+        min_date,
+        max_date,
+        use_store: bool = True,
+        alignment: Union[str, int, Dict[str, Union[str, int]]] = "inner",
+    ):
+        """
+        Args:
+            use_store: read prices from the columnar `PriceStore`, ingesting
+                the raw JSON responses on first use. If False, parse the JSON
+                responses directly.
+            alignment: missing-data policy when aligning tickers on dates,
+                for all tickers or per ticker (others stay "inner"): "inner",
+                "ragged" or a forward-fill limit in days, see
+                `utils.align_frames`.
+        """
         self.data_elements = {}
         self.data = pd.DataFrame()
+        self.cpi = None
         self.min_date = min_date
         self.max_date = max_date
         self.data_retriever = DataRetriever()
+        self.price_store = PriceStore() if use_store else None
+        self.alignment = alignment
 
-    def _resample(self, data: pd.DataFrame, frequency: str = "D"):
-        """Resample the data to desired frequency."""
-        resampled_data = data.copy()
-        resampled_data.index = pd.to_datetime(resampled_data.index)
-        resampled_data = resampled_data.sort_index()
-        resampled_data = resampled_data.resample(frequency).ffill()
-        resampled_data.index = resampled_data.index.strftime("%Y-%m-%d")
+    def _read_price_json(self, ticker: str) -> pd.DataFrame:
+        # retrieve raw json data
+        try:
+            with open(f"{DATA_DIR}/{ticker}.json", "r") as f:
+                price = json.loads(f.read())["Time Series (Daily)"]
+        except FileNotFoundError:
+            self.data_retriever.get_price_data(ticker)
+            return self._read_price_json(ticker)
+        # reformat into dataframe
+        price = pd.DataFrame.from_dict(price, orient="index")
+        return price[["4. close"]].rename(columns={"4. close": ticker})
 
-        return resampled_data
+    def _read_price_store(self, ticker: str) -> pd.DataFrame:
+        raw_path = DATA_DIR / f"{ticker}.json"
+        if not raw_path.exists() and not self.price_store.has(ticker):
+            self.data_retriever.get_price_data(ticker)
+        # (re-)ingest when the raw response is newer than the store
+        if self.price_store.is_stale(ticker, raw_path):
+            self.price_store.ingest_json(ticker, raw_path)
+        dates, close = self.price_store.read(
+            ticker, "close", min_date=self.min_date, max_date=self.max_date
+        )
+        return pd.DataFrame({ticker: close}, index=np.datetime_as_string(dates))
 
     def retrieve_price(self, tickers: List[str]):
+        # download missing tickers up front, concurrently
+        missing = [
+            ticker
+            for ticker in tickers
+            if not (DATA_DIR / f"{ticker}.json").exists()
+            and not (self.price_store and self.price_store.has(ticker))
+        ]
+        if missing:
+            for ticker, error in self.data_retriever.get_price_data_bulk(
+                missing
+            ).items():
+                if error is not None:
+                    raise Exception(f"Failed to retrieve {ticker}: {error}")
         prices = []
         for ticker in tickers:
-            # retrieve raw json data
-            try:
-                with open(f"{DATA_DIR}/{ticker}.json", "r") as f:
-                    price = json.loads(f.read())["Time Series (Daily)"]
-            except FileNotFoundError:
-                price = self.data_retriever.get_price_data(ticker)
-            # reformat into dataframe
-            price = pd.DataFrame.from_dict(price, orient="index")
-            price = price[["4. close"]].rename(columns={"4. close": ticker})
+            if self.price_store is not None:
+                price = self._read_price_store(ticker)
+            else:
+                price = self._read_price_json(ticker)
             prices.append(price)
-        # join all tickers data
-        prices = reduce(
-            lambda x, y: x.merge(y, how="inner", left_index=True, right_index=True),
-            prices,
-        )
+        # align all tickers on dates in one pass
+        if isinstance(self.alignment, dict):
+            prices = utils.align_frames(prices, policies=self.alignment)
+        else:
+            prices = utils.align_frames(prices, policy=self.alignment)
         # append to data element
         self.data_elements["price"] = prices
 
-    def retrieve_cpi(self):
+    def retrieve_cpi(self) -> CPI:
+        """Load monthly CPI for real-return metrics. It is kept at monthly
+        resolution (see `inflation.CPI`) rather than merged into `data`."""
         # retrieve raw cpi data
         try:
             with open(f"{DATA_DIR}/CPI.json", "r") as f:
                 cpi = json.loads(f.read())["data"]
         except FileNotFoundError:
-            cpi = self.data_retriever.get_cpi_data()
-        # reformat into dataframe
-        cpi = pd.DataFrame.from_records(cpi).set_index("date")
-        cpi = cpi.rename(columns={"value": "CPI"})
-        # resample from monthly to daily
-        cpi = self._resample(cpi, frequency="D")
-        # append to data element
-        self.data_elements["CPI"] = cpi
+            self.data_retriever.get_cpi_data()
+            return self.retrieve_cpi()
+        self.cpi = CPI.from_records(cpi)
+        return self.cpi
 
     def refresh_dataframe(self):
-        self.data = reduce(
-            lambda x, y: x.merge(y, how="inner", left_index=True, right_index=True),
-            list(self.data_elements.values()),
-        )
+        self.data = pd.concat(list(self.data_elements.values()), axis=1, join="inner")
         if self.min_date:
             self.data = self.data[self.data.index >= self.min_date]
         if self.max_date:
@@ -1,13 +1,108 @@
 import os
 import json
+import random
+import tempfile
+import threading
+import time
+import numpy as np
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from requests.adapters import HTTPAdapter
+from typing import Callable, Dict, List
 from investment_simulator import DATA_DIR
 
+# "compact" responses hold the latest 100 data points
+COMPACT_SIZE = 100
+# how long cached macro datasets are considered fresh
+DATASET_TTL = {
+    "CPI": timedelta(days=7),
+    "INFLATION": timedelta(days=30),
+}
+
+
+# keys of (HTTP 200) Alpha Vantage responses carrying a message instead of data
+MESSAGE_KEYS = ("Note", "Information", "Error Message")
+# phrases of the messages signalling the call quota is hit; other messages
+# (invalid API key, premium-only endpoint, bad query) are permanent errors
+THROTTLE_PHRASES = ("call frequency", "rate limit", "calls per", "requests per")
+
+
+def is_throttled(data: dict) -> bool:
+    """Whether an Alpha Vantage response is a call-quota message."""
+    messages = " ".join(str(data.get(key, "")) for key in MESSAGE_KEYS).lower()
+    return any(phrase in messages for phrase in THROTTLE_PHRASES)
+
+
+class TokenBucket:
+    """Thread-safe token bucket allowing `rate_per_minute` requests, with
+    bursts of up to `capacity`."""
+
+    def __init__(self, rate_per_minute: float, capacity: int = 1):
+        self.rate = rate_per_minute / 60
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available and take it."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
 
 class DataRetriever:
 
-    def __init__(self):
+    def __init__(
+        self,
+        base_url: str = None,
+        requests_per_minute: float = None,
+        max_workers: int = 8,
+        max_retries: int = 5,
+        backoff: float = 1.0,
+    ):
+        """
+        Args:
+            base_url: API root, e.g. a local stand-in such as
+                `mock_api.MockAlphaVantage`. Defaults to the environment
+                variable ALPHA_VANTAGE_BASE_URL, then Alpha Vantage itself.
+            requests_per_minute: API quota shared by all requests of this
+                retriever. Defaults to the environment variable
+                ALPHA_VANTAGE_REQUESTS_PER_MINUTE; unlimited if neither is set.
+            max_workers: concurrent requests (and pooled connections) used by
+                bulk downloads.
+            max_retries, backoff: retries of throttled requests (quota
+                messages and HTTP 429), connection errors and server errors,
+                with exponential backoff starting at `backoff` seconds. Other
+                HTTP errors are raised at once.
+        """
         self.api_key = os.getenv("ALPHA_VANTAGE_API_KEY")
+        self.base_url = base_url or os.getenv(
+            "ALPHA_VANTAGE_BASE_URL", "https://www.alphavantage.co"
+        )
+        requests_per_minute = requests_per_minute or os.getenv(
+            "ALPHA_VANTAGE_REQUESTS_PER_MINUTE"
+        )
+        self.rate_limiter = (
+            TokenBucket(float(requests_per_minute)) if requests_per_minute else None
+        )
+        self.max_workers = max_workers
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_workers)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def _get_url(self, **kwargs):
         query = []
@@ -15,18 +110,64 @@ class DataRetriever:
             if v:
                 query.append(f"{k}={v}")
         query = "&".join(query)
-        url = f"https://www.alphavantage.co/query?{query}"
+        url = f"{self.base_url}/query?{query}"
         return url
 
     def _get_data(self, **kwargs):
         url = self._get_url(**kwargs)
-        r = requests.get(url)
-        data = r.json()
+        for attempt in range(self.max_retries + 1):
+            if self.rate_limiter:
+                self.rate_limiter.acquire()
+            try:
+                r = self.session.get(url, timeout=60)
+                r.raise_for_status()
+                data = r.json()
+                if not is_throttled(data):
+                    break
+                error = Exception(f"Throttled: {data}")
+            except requests.HTTPError as e:
+                # only rate limiting and server errors are transient; other
+                # client errors (e.g. a bad key or symbol) fail fast
+                status = e.response.status_code
+                if status != 429 and status < 500:
+                    raise
+                error = e
+            except (requests.RequestException, ValueError) as e:
+                error = e
+            if attempt == self.max_retries:
+                raise error
+            time.sleep(self.backoff * 2**attempt * (1 + random.random()))
+        if any(key in data for key in MESSAGE_KEYS):
+            raise Exception(f"Request {kwargs.get('function')} failed: {data}")
         return json.dumps(data)
 
     def _write_data(self, data, symbol):
-        with open(f"{DATA_DIR}/{symbol}.json", "w") as f:
-            f.write(data)
+        # write to a temporary file and rename, so concurrent readers never
+        # see a partially written cache file
+        fd, tmp_path = tempfile.mkstemp(dir=DATA_DIR, prefix=f".{symbol}.")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, f"{DATA_DIR}/{symbol}.json")
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def _map_concurrently(self, func: Callable, tickers: List[str]) -> Dict:
+        """Run `func(ticker)` for all tickers on `max_workers` threads.
+
+        Returns:
+            Each ticker's result, or the exception it raised.
+        """
+
+        def call(ticker):
+            try:
+                return func(ticker)
+            except Exception as e:
+                return e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(tickers, executor.map(call, tickers)))
 
     def get_price_data(self, ticker):
         data = self._get_data(
@@ -53,3 +194,109 @@ class DataRetriever:
         )
         self._write_data(data, "INFLATION")
         return data
+
+    def _read_data(self, symbol):
+        with open(f"{DATA_DIR}/{symbol}.json", "r") as f:
+            return json.loads(f.read())
+
+    def get_last_cached_date(self, ticker):
+        """Return the latest date in the cached daily series, or None."""
+        try:
+            time_series = self._read_data(ticker)["Time Series (Daily)"]
+        except (FileNotFoundError, KeyError):
+            return None
+        return max(time_series) if time_series else None
+
+    def refresh_price_data(self, ticker, today: date = None) -> str:
+        """Bring the cached daily series of a ticker up to date.
+
+        Only the compact window (latest 100 points) is requested when the
+        cache is missing fewer trading days than that; the new rows are then
+        merged into the cached series. Otherwise the full history is fetched.
+
+        Returns:
+            "full", "compact" or "skipped" depending on what was requested.
+        """
+        today = today or date.today()
+        last_date = self.get_last_cached_date(ticker)
+        if last_date is None:
+            self.get_price_data(ticker)
+            return "full"
+        gap = np.busday_count(np.datetime64(last_date, "D") + 1, today + timedelta(1))
+        if gap <= 0:
+            return "skipped"
+        if gap >= COMPACT_SIZE:
+            self.get_price_data(ticker)
+            return "full"
+        data = json.loads(
+            self._get_data(
+                function="TIME_SERIES_DAILY",
+                symbol=ticker,
+                apikey=self.api_key,
+                outputsize="compact",
+                datatype="json",
+            )
+        )
+        if "Time Series (Daily)" not in data:
+            raise Exception(f"Unexpected response for {ticker}: {data}")
+        cached = self._read_data(ticker)
+        cached["Time Series (Daily)"].update(data["Time Series (Daily)"])
+        cached["Time Series (Daily)"] = dict(
+            sorted(cached["Time Series (Daily)"].items(), reverse=True)
+        )
+        if "Meta Data" in data:
+            cached["Meta Data"] = data["Meta Data"]
+        self._write_data(json.dumps(cached), ticker)
+        return "compact"
+
+    def is_fresh(self, symbol, ttl: timedelta) -> bool:
+        """Whether the cached file of a dataset is younger than `ttl`."""
+        try:
+            modified = os.path.getmtime(f"{DATA_DIR}/{symbol}.json")
+        except FileNotFoundError:
+            return False
+        return time.time() - modified < ttl.total_seconds()
+
+    def refresh_cpi_data(self, ttl: timedelta = DATASET_TTL["CPI"]) -> bool:
+        """Refetch CPI if the cache is older than `ttl`; return whether it did."""
+        if self.is_fresh("CPI", ttl):
+            return False
+        self.get_cpi_data()
+        return True
+
+    def refresh_inflation_data(self, ttl: timedelta = DATASET_TTL["INFLATION"]) -> bool:
+        """Refetch INFLATION if the cache is older than `ttl`; return whether it
+        did."""
+        if self.is_fresh("INFLATION", ttl):
+            return False
+        self.get_inflation_data()
+        return True
+
+    def get_price_data_bulk(self, tickers: List[str]) -> Dict:
+        """Download the full price history of `tickers` concurrently.
+
+        Returns:
+            None for each ticker that was written, or the exception raised.
+        """
+        return self._map_concurrently(self.get_price_data, tickers)
+
+    def refresh(self, tickers, today: date = None) -> dict:
+        """Incrementally refresh price data of `tickers` plus CPI and INFLATION.
+
+        Returns:
+            The kind of request issued for each dataset (or the exception
+            raised for it).
+        """
+        result = self._map_concurrently(
+            lambda ticker: self.refresh_price_data(ticker, today), tickers
+        )
+        datasets = {
+            "CPI": self.refresh_cpi_data,
+            "INFLATION": self.refresh_inflation_data,
+        }
+        result.update(
+            self._map_concurrently(
+                lambda name: "full" if datasets[name]() else "skipped", list(datasets)
+            )
+        )
+        return result
@@ -0,0 +1,131 @@
+"""Array-backed price panel.
+
+`Dataset` holds prices as one T x N matrix with int64 dates (days since
+1970-01-01) and a ticker-to-column map. Date-range and ticker slicing return
+views of the same matrix instead of copies, and content fingerprints are
+memoized, so metric functions on large panels skip most of the per-call
+pandas work. `get_ts_metrics`, `get_agg_metrics`, `set_objective`,
+`set_constraints` and the array functions of `utils` accept a `Dataset`
+wherever they take a `DataProcessor` DataFrame:
+
+    dataset = Dataset.from_frame(sim.data)
+    so.maximize_return(dataset.between("2015-01-01", None), sim.tickers)
+"""
+
+import hashlib
+import numpy as np
+import pandas as pd
+from typing import Dict, List, Union
+
+
+def to_days(dates) -> np.ndarray:
+    """Dates as "%Y-%m-%d" strings (or anything numpy parses as dates) to
+    int64 days since 1970-01-01."""
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.int64)
+
+
+class Dataset:
+
+    def __init__(
+        self,
+        values: np.ndarray,
+        dates: np.ndarray,
+        tickers: List[str],
+    ):
+        """
+        Args:
+            values: T x N prices, one column per ticker, dates ascending.
+                Used as is (not copied) and made read-only, since slices and
+                derived arrays share it.
+            dates: T int64 days since 1970-01-01, see `to_days`.
+            tickers: N column names.
+        """
+        values = np.asarray(values)
+        dates = np.asarray(dates, dtype=np.int64)
+        if values.ndim != 2 or values.shape != (len(dates), len(tickers)):
+            raise Exception(
+                f"Expected {len(dates)} x {len(tickers)} prices, got {values.shape}."
+            )
+        values.setflags(write=False)
+        self.values = values
+        self.dates = dates
+        self.tickers = list(tickers)
+        self.columns: Dict[str, int] = {
+            ticker: i for i, ticker in enumerate(self.tickers)
+        }
+        self._fingerprints = {}
+
+    @classmethod
+    def from_frame(cls, frame: pd.DataFrame, dtype=np.float64) -> "Dataset":
+        """Convert a `DataProcessor` DataFrame (string dates as index). Pass
+        `dtype=np.float32` to halve memory on very large panels. The prices
+        are copied once, so the frame itself stays writable."""
+        values = np.array(frame.to_numpy(dtype=dtype), dtype=dtype, order="C")
+        return cls(values, to_days(frame.index), list(frame.columns))
+
+    def to_frame(self) -> pd.DataFrame:
+        return pd.DataFrame(self.values, index=self.index, columns=self.tickers)
+
+    def __len__(self) -> int:
+        return len(self.dates)
+
+    @property
+    def shape(self):
+        return self.values.shape
+
+    @property
+    def index(self) -> np.ndarray:
+        """Dates as "%Y-%m-%d" strings, as in the DataFrame layout."""
+        return np.datetime_as_string(self.dates.astype("datetime64[D]"))
+
+    def to_numpy(self, dtype=None) -> np.ndarray:
+        """The price matrix: a view unless `dtype` asks for a conversion."""
+        if dtype is None or self.values.dtype == dtype:
+            return self.values
+        return self.values.astype(dtype)
+
+    def __getitem__(self, tickers: Union[str, List[str]]) -> "Dataset":
+        """Dataset of a ticker subset (in the requested order). A view when
+        the columns are evenly spaced, e.g. a contiguous run of tickers, which
+        covers selecting the tickers a panel was built from; a copy of the
+        selected columns otherwise."""
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        missing = [ticker for ticker in tickers if ticker not in self.columns]
+        if missing:
+            raise KeyError(f"Tickers not in dataset: {missing}.")
+        positions = np.array([self.columns[ticker] for ticker in tickers])
+        steps = np.diff(positions)
+        if len(positions) == 1 or (steps[0] > 0 and np.all(steps == steps[0])):
+            step = 1 if len(positions) == 1 else int(steps[0])
+            columns = slice(positions[0], positions[-1] + 1, step)
+        else:
+            columns = positions
+        return Dataset(self.values[:, columns], self.dates, tickers)
+
+    def between(self, min_date=None, max_date=None) -> "Dataset":
+        """View of the dates in [min_date, max_date] (inclusive, either may be
+        None), found by binary search."""
+        start = (
+            0 if min_date is None else np.searchsorted(self.dates, to_days(min_date))
+        )
+        end = (
+            len(self.dates)
+            if max_date is None
+            else np.searchsorted(self.dates, to_days(max_date), side="right")
+        )
+        return Dataset(self.values[start:end], self.dates[start:end], self.tickers)
+
+    def fingerprint(self, tickers: Union[str, List[str]]) -> str:
+        """Content hash of the `tickers` columns, including the dates.
+        Memoized: the prices are read-only."""
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        key = tuple(tickers)
+        if key not in self._fingerprints:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(repr((tickers, len(self), str(self.values.dtype))).encode())
+            digest.update(self.dates.tobytes())
+            for ticker in tickers:
+                column = self.values[:, self.columns[ticker]]
+                digest.update(np.ascontiguousarray(column).tobytes())
+            self._fingerprints[key] = digest.hexdigest()
+        return self._fingerprints[key]
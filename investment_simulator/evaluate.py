@@ -0,0 +1,127 @@
+"""Vectorized ex-post evaluation of many candidate allocations.
+
+`BatchEvaluator` computes the metrics of `get_ts_metrics` / `get_agg_metrics`
+in NumPy for a K x N matrix of weights at once, without cvxpy. Use it to
+screen random or heuristic portfolios, or to validate solver output. Columns
+are named like the corresponding `Metric` names.
+"""
+
+import numpy as np
+import pandas as pd
+from typing import List
+
+from investment_simulator import utils
+
+# series measured per sampling period instead of from the initial state: their
+# metrics change unit (not only precision) when prices are resampled
+PER_PERIOD_SERIES = ("DoD return", "portfolio variance")
+
+
+class BatchEvaluator:
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        tickers: List[str],
+        smoothing_window: int = None,
+        benchmark: str = None,
+        threshold: float = 0,
+        max_bytes: int = 256 * 2**20,
+    ):
+        """
+        Args:
+            smoothing_window: also compute exponential weighted averages.
+            benchmark: also compute return against this ticker and the % of
+                days out/underperforming it by `threshold`.
+            max_bytes: memory budget of the T x chunk intermediate arrays;
+                portfolios are evaluated in chunks that fit it.
+        """
+        self.tickers = tickers
+        self.returns = utils.get_derived_array(
+            utils.get_percent_change_against_initial_state, data, tickers
+        )
+        self.dod_returns = utils.get_derived_array(
+            utils.get_percent_change_over_time, data, tickers
+        )
+        self.covariance = utils.get_derived_array(
+            utils.get_covariance_matrix, data, tickers
+        )
+        self.benchmark = benchmark
+        self.threshold = threshold
+        self.benchmark_return = None
+        if benchmark:
+            self.benchmark_return = utils.get_derived_array(
+                utils.get_percent_change_against_initial_state, data, benchmark
+            ).ravel()
+        self.smoothing_window = smoothing_window
+        self.max_bytes = max_bytes
+
+    def _aggregate(self, name: str, series: np.ndarray) -> dict:
+        """Aggregations of a T x k block of series (one column per portfolio)."""
+        metrics = {
+            f"{name} (historical min)": series.min(axis=0),
+            f"{name} (historical max)": series.max(axis=0),
+            f"{name} (historical average)": series.mean(axis=0),
+            # copy, so the result does not keep the T x k block alive
+            f"{name} (value on return date)": series[-1].copy(),
+        }
+        if self.smoothing_window:
+            ema_weights = utils.get_ema_weights(len(series), self.smoothing_window)
+            metrics[f"{name} (exponential weighted average)"] = ema_weights @ series
+        return metrics
+
+    def _evaluate_chunk(self, weights: np.ndarray) -> dict:
+        simple_return = self.returns @ weights.T
+        dod_return = self.dod_returns @ weights.T
+        drawdown = np.maximum.accumulate(simple_return, axis=0) - simple_return
+        metrics = {}
+        metrics.update(self._aggregate("simple return", simple_return))
+        metrics.update(self._aggregate("DoD return", dod_return))
+        metrics.update(self._aggregate("drawdown", drawdown))
+        metrics["DoD return (% days with loss)"] = np.mean(dod_return < 0, axis=0)
+        if self.benchmark:
+            delta = simple_return - self.benchmark_return[:, None]
+            name = f"return against {self.benchmark}"
+            metrics.update(self._aggregate(name, delta))
+            metrics[f"{name} (% outperforming days)"] = np.mean(
+                delta > self.threshold, axis=0
+            )
+            metrics[f"{name} (% underperforming days)"] = np.mean(
+                delta < self.threshold, axis=0
+            )
+        metrics["portfolio variance (classical method)"] = np.einsum(
+            "kn,nm,km->k", weights, self.covariance, weights
+        )
+        return metrics
+
+    def evaluate(self, weights: np.ndarray) -> pd.DataFrame:
+        """Evaluate a K x N matrix of weights (rows in ticker order).
+
+        Returns:
+            One row per portfolio, one column per metric.
+        """
+        weights = np.atleast_2d(np.asarray(weights, dtype=float))
+        if weights.shape[1] != len(self.tickers):
+            raise Exception(
+                f"Expected {len(self.tickers)} weights per portfolio, "
+                f"got {weights.shape[1]}."
+            )
+        # up to ~8 T x chunk float64 arrays (series and temporaries) are
+        # alive at once
+        chunk_size = max(1, self.max_bytes // (8 * 8 * self.returns.shape[0]))
+        chunks = [
+            self._evaluate_chunk(weights[start : start + chunk_size])
+            for start in range(0, len(weights), chunk_size)
+        ]
+        return pd.DataFrame(
+            {
+                metric: np.concatenate([chunk[metric] for chunk in chunks])
+                for metric in chunks[0]
+            }
+        )
+
+
+def random_weights(n_portfolios: int, n_tickers: int, seed: int = None) -> np.ndarray:
+    """Long-only portfolios drawn uniformly from the simplex."""
+    rng = np.random.default_rng(seed)
+    return rng.dirichlet(np.ones(n_tickers), size=n_portfolios)
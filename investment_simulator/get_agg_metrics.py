@@ -1,97 +1,501 @@
 import cvxpy as cp
+import numpy as np
+from investment_simulator import utils
+from investment_simulator import get_ts_metrics as ts
+from investment_simulator.inflation import CPI
 from investment_simulator.set_variables import set_ema
-from investment_simulator.optimizer_object import Metric, Optimizer
+from investment_simulator.optimizer_object import (
+    Constraint,
+    Metric,
+    Optimizer,
+    Variable,
+    timed,
+)
 
+DRAWDOWN_ENGINES = ("cummax", "anchored")
+PERCENT_DAYS_BACKENDS = ("surrogate", "exact")
 
+
+def _aggregation_key(aggregation: str, ts_metric: Metric, *args):
+    if ts_metric.key is None:
+        return None
+    return (aggregation, ts_metric.key) + args
+
+
+def compile_linear_aggregation(ts_metric: Metric, row_weights: np.ndarray):
+    """Fold `row_weights @ ts_metric.expr` into a single coefficient vector.
+
+    When the series is linear in the portfolio weights (`coef @ weights +
+    offset`), any weighted sum over time is `(row_weights @ coef) @ weights +
+    row_weights @ offset`: an N-dimensional expression precomputed in NumPy,
+    instead of a T-dimensional one (plus auxiliary variables) in the solver.
+
+    Returns:
+        The compiled expression, or None if the series is not linear.
+    """
+    if ts_metric.coef is None:
+        return None
+    return (row_weights @ ts_metric.coef) @ Optimizer.get_variable(
+        "weights"
+    ).var + float(row_weights @ ts_metric.offset)
+
+
+@timed("metric construction")
 def get_historical_min(ts_metric: Metric) -> Metric:
+    name = f"{ts_metric.name} (historical min)"
+    key = _aggregation_key("historical min", ts_metric)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
     metric = Metric(
-        name=f"{ts_metric.name} (historical min)",
+        name=name,
         desc=f"Historical minimum of {ts_metric.name}.",
         expr=cp.min(ts_metric.expr),
+        key=key,
+        arguments=ts_metric.arguments,
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
+@timed("metric construction")
 def get_historical_max(ts_metric: Metric) -> Metric:
+    name = f"{ts_metric.name} (historical max)"
+    key = _aggregation_key("historical max", ts_metric)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
     metric = Metric(
-        name=f"{ts_metric.name} (historical max)",
+        name=name,
         desc=f"Historical maximum of {ts_metric.name}.",
         expr=cp.max(ts_metric.expr),
+        key=key,
+        arguments=ts_metric.arguments,
+    )
+    Optimizer.update_metrics(metric)
+    return metric
+
+
+class PeakAnchoredDrawdown:
+    """Maximal drawdown as an epigraph variable bounded by peak-anchored cuts.
+
+    Max drawdown is the largest `(returns[s] - returns[t]) @ weights` over
+    peak/trough pairs s <= t. Instead of a running max over every day, only
+    the pairs that bind are kept: after each solve, the deepest episodes of
+    the current portfolio path that exceed the bound are added as cuts and
+    the (N-dimensional) problem is re-solved. At convergence the bound is
+    the exact maximal drawdown, so the optimum matches the cummax engine.
+    """
+
+    tol = 1e-7
+    cuts_per_round = 10
+
+    def __init__(self, name: str, returns: np.ndarray):
+        self.name = name
+        self.returns = returns
+        self.pairs = set()
+        self.bound = Variable(name=name, desc=f"Epigraph of {name}.", dim=())
+        Optimizer.update_variables(self.bound)
+        # the zero-depth episode (peak and trough on one day): without it the
+        # bound of a portfolio that never draws down could go negative
+        Optimizer.update_constraints(
+            Constraint(
+                name=f"{name} (non-negative)",
+                desc="Drawdown is at least zero.",
+                cons_expr=self.bound.var >= 0,
+            )
+        )
+        # seed with the worst episode of every ticker and of equal weights
+        paths = np.column_stack([returns, returns.mean(axis=1)])
+        for path in paths.T:
+            self._add_pairs(utils.get_drawdown_episodes(path, k=1))
+        self._update_cuts()
+
+    def _add_pairs(self, episodes: np.ndarray):
+        for peak, trough, _ in episodes:
+            if peak < trough:
+                self.pairs.add((int(peak), int(trough)))
+
+    def _update_cuts(self):
+        peaks, troughs = map(list, zip(*sorted(self.pairs)))
+        cut_matrix = self.returns[peaks] - self.returns[troughs]
+        Optimizer.update_constraints(
+            Constraint(
+                name=f"{self.name} (peak-anchored cuts)",
+                desc="Drawdown between anchored peaks and troughs is bounded by the maximal drawdown.",
+                cons_expr=cut_matrix @ Optimizer.get_variable("weights").var
+                <= self.bound.var,
+            )
+        )
+
+    def __call__(self) -> bool:
+        """Add the violated episodes of the current solution; return whether
+        any were added."""
+        path = self.returns @ Optimizer.get_variable("weights").var.value
+        episodes = utils.get_drawdown_episodes(path, k=self.cuts_per_round)
+        violated = episodes[episodes[:, 2] > self.bound.var.value + self.tol]
+        n_pairs = len(self.pairs)
+        self._add_pairs(violated)
+        if len(self.pairs) == n_pairs:
+            # converged: report the realized maximal drawdown
+            self.bound.var.value = max(episodes[0, 2], 0)
+            return False
+        self._update_cuts()
+        return True
+
+
+@timed("metric construction")
+def get_maximal_drawdown(
+    data, tickers, engine: str = "cummax", cpi: CPI = None
+) -> Metric:
+    """Historical maximum of drawdown.
+
+    Args:
+        engine: "cummax" builds the running max over every day; "anchored"
+            uses peak-anchored cutting planes (see `PeakAnchoredDrawdown`),
+            which keeps the problem N-dimensional on long histories.
+        cpi: monthly CPI: maximal drawdown of real return.
+    """
+    if engine == "cummax":
+        return get_historical_max(ts.get_drawdown(data, tickers, cpi))
+    if engine != "anchored":
+        raise Exception(f"Unknown drawdown engine {engine}, use {DRAWDOWN_ENGINES}.")
+    # named apart from the cummax metric, so both engines can share a problem
+    name = "drawdown (historical max, anchored)"
+    if cpi is not None:
+        name = f"real {name}"
+    key = (name, utils.get_fingerprint(data, tickers))
+    if cpi is not None:
+        key += (cpi.fingerprint(),)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    separator = PeakAnchoredDrawdown(
+        name,
+        utils.get_derived_array(
+            utils.get_percent_change_against_initial_state, data, tickers, cpi=cpi
+        ),
+    )
+    Optimizer.update_separators({name: separator})
+    metric = Metric(
+        name=name,
+        desc="Historical maximum of drawdown.",
+        expr=separator.bound.var,
+        key=key,
+        # same value as the cummax metric once separation converged (real
+        # metrics have no ex-post evaluation)
+        arguments={} if cpi else {"evaluated as": "drawdown (historical max)"},
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
+@timed("metric construction")
 def get_historical_avg(ts_metric: Metric) -> Metric:
+    name = f"{ts_metric.name} (historical average)"
+    key = _aggregation_key("historical average", ts_metric)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    length = ts_metric.expr.size
+    expr = compile_linear_aggregation(ts_metric, np.full(length, 1 / length))
     metric = Metric(
-        name=f"{ts_metric.name} (historical average)",
+        name=name,
         desc=f"Historical average of {ts_metric.name}.",
-        expr=cp.mean(ts_metric.expr),
+        expr=cp.mean(ts_metric.expr) if expr is None else expr,
+        key=key,
+        arguments=ts_metric.arguments,
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
+@timed("metric construction")
 def get_ema_weighted_avg(ts_metric: Metric, smoothing_window: int) -> Metric:
-    set_ema(ts_metric, window=smoothing_window)
+    name = f"{ts_metric.name} (exponential weighted average)"
+    key = _aggregation_key("exponential weighted average", ts_metric, smoothing_window)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    expr = compile_linear_aggregation(
+        ts_metric, utils.get_ema_weights(ts_metric.expr.size, smoothing_window)
+    )
+    if expr is None:
+        # non-linear series (e.g. drawdown): keep the recursive ema variables
+        expr = set_ema(ts_metric, window=smoothing_window)[-1]
     metric = Metric(
-        name=f"{ts_metric.name} (exponential weighted average)",
+        name=name,
         desc=f"Exponential moving average of {ts_metric.name} on return date.",
-        expr=Optimizer._optimizer_variables["ema"].var[-1],
+        expr=expr,
+        key=key,
+        arguments={**ts_metric.arguments, "smoothing_window": smoothing_window},
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
+@timed("metric construction")
 def get_final_point_value(ts_metric: Metric) -> Metric:
+    name = f"{ts_metric.name} (value on return date)"
+    key = _aggregation_key("value on return date", ts_metric)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    row_weights = np.zeros(ts_metric.expr.size)
+    row_weights[-1] = 1
+    expr = compile_linear_aggregation(ts_metric, row_weights)
     metric = Metric(
-        name=f"{ts_metric.name} (value on return date)",
+        name=name,
         desc=f"Value of {ts_metric.name} on return date.",
-        expr=ts_metric.expr[-1],
+        expr=ts_metric.expr[-1] if expr is None else expr,
+        key=key,
+        arguments=ts_metric.arguments,
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
-def get_percent_outperforming_days(ts_metric: Metric, threshold: float = 0) -> Metric:
-    metric = Metric(
-        name=f"{ts_metric.name} (% outperforming days)",
-        desc=f"% days where portfolio outperforms benchmark.",
-        expr=cp.sum(ts_metric.expr > threshold) / ts_metric.expr.size,
+class PercentDaysMetric(Metric):
+    """% of days a series is above (or below) a threshold.
+
+    Counting days is not convex, so `expr` is a formulation the solver can
+    handle, bounding the count from the side objectives and constraints push
+    it towards (outperforming days from below, underperforming days from
+    above):
+
+        surrogate: hinge bound, `min(1, x / margin)` averaged over days for
+            outperforming days and `max(0, 1 - x / margin)` for
+            underperforming days, with `x` the series less the threshold.
+            Convex, a T-dimensional LP. It is a bound over the whole range
+            of `x`, not only near the threshold: a day counts fully only at
+            least `margin` above the threshold, partially within `margin`,
+            and below the threshold it counts beyond its share in proportion
+            to its distance (negatively towards outperforming days, more than
+            one underperforming day). The solver thus also trades off how far
+            days fall below the threshold.
+        exact: one binary per day, tied to the series by a big-M constraint.
+            Needs a mixed-integer solver (see `mip_options`).
+
+    `get_value` counts the days on the solved series, so reports show the
+    realized % of days; `get_bound` is the value of `expr`.
+    """
+
+    # margin by which a day must clear the threshold in the exact backend,
+    # above the feasibility tolerance of mixed-integer solvers (1e-6 for
+    # HiGHS, which also backs SCIPY), so that counted days are not ties
+    tol = 1e-5
+
+    def __init__(
+        self,
+        name: str,
+        desc: str,
+        series: Metric,
+        threshold: float,
+        above: bool,
+        backend: str = "surrogate",
+        margin: float = None,
+        big_m: float = None,
+        key=None,
+    ):
+        if backend not in PERCENT_DAYS_BACKENDS:
+            raise Exception(
+                f"Unknown % days backend {backend}, use {PERCENT_DAYS_BACKENDS}."
+            )
+        self.series = series
+        self.threshold = threshold
+        self.above = above
+        self.margin, self.big_m = margin, big_m
+        x = series.expr - threshold
+        if backend == "surrogate":
+            margin = self.margin = margin or self._default_margin(series)
+            if above:
+                expr = cp.sum(cp.minimum(1, x / margin)) / x.size
+            else:
+                expr = cp.sum(cp.pos(1 - x / margin)) / x.size
+        else:
+            big_m = self.big_m = big_m or self._default_big_m(name, series, threshold)
+            indicators = Variable(
+                name=f"{name} indicators",
+                desc=f"Days counted by {name}.",
+                dim=x.size,
+                boolean=True,
+            )
+            Optimizer.update_variables(indicators)
+            # counted outperforming days must clear the threshold; uncounted
+            # underperforming days must too
+            counted = indicators.var if above else 1 - indicators.var
+            Optimizer.update_constraints(
+                Constraint(
+                    name=f"{name} (big-M)",
+                    desc=f"Tie the indicators of {name} to {series.name}.",
+                    cons_expr=x >= self.tol - big_m * (1 - counted),
+                )
+            )
+            expr = cp.sum(indicators.var) / x.size
+        super().__init__(name, desc, expr, key=key, arguments=series.arguments)
+
+    @staticmethod
+    def _default_margin(series: Metric) -> float:
+        """Standard deviation of the series for equal weights."""
+        if series.coef is None:
+            raise Exception(f"Pass a margin: {series.name} is not linear.")
+        equal_weights = np.full(series.coef.shape[1], 1 / series.coef.shape[1])
+        return float(np.std(series.coef @ equal_weights + series.offset)) or 1.0
+
+    @staticmethod
+    def _default_big_m(name: str, series: Metric, threshold: float) -> float:
+        """Largest shortfall below the threshold of any single-ticker series:
+        valid for long-only portfolios, whose series are convex combinations
+        of those. Portfolios with short positions have no such bound, as the
+        series is unbounded in the weights.
+
+        Raises:
+            Exception: The series is not linear, or positions are not kept
+                long.
+        """
+        if series.coef is None:
+            raise Exception(f"Pass big_m: {series.name} is not linear.")
+        if "keep long positions only" not in Optimizer.active()._optimizer_constraints:
+            raise Exception(
+                f"Pass big_m for {name}: the default is only valid for long-only "
+                "portfolios, register keep_long_positions_only first."
+            )
+        values = series.coef + series.offset[:, None]
+        return float(max(threshold - values.min(), 0)) + 2 * PercentDaysMetric.tol
+
+    def get_bound(self):
+        return super().get_value()
+
+    def get_value(self):
+        values = self.series.get_value()
+        if values is None:
+            return None
+        values = np.asarray(values)
+        if self.above:
+            return float(np.mean(values > self.threshold))
+        return float(np.mean(values < self.threshold))
+
+    def __str__(self):
+        return f"{super().__str__()}\nBound: {self.get_bound()}"
+
+
+def _percent_days(
+    aggregation: str,
+    desc: str,
+    ts_metric: Metric,
+    threshold: float,
+    above: bool,
+    backend: str,
+    margin: float,
+    big_m: float,
+) -> Metric:
+    name = f"{ts_metric.name} ({aggregation})"
+    key = _aggregation_key(aggregation, ts_metric, threshold, backend, margin, big_m)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    metric = PercentDaysMetric(
+        name=name,
+        desc=desc,
+        series=ts_metric,
+        threshold=threshold,
+        above=above,
+        backend=backend,
+        margin=margin,
+        big_m=big_m,
+        key=key,
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
-def get_percent_underperforming_days(ts_metric: Metric, threshold: float = 0) -> Metric:
-    metric = Metric(
-        name=f"{ts_metric.name} (% underperforming days)",
-        desc=f"% days where portfolio underperforms.",
-        expr=cp.sum(ts_metric.expr < threshold) / ts_metric.expr.size,
+@timed("metric construction")
+def get_percent_outperforming_days(
+    ts_metric: Metric,
+    threshold: float = 0,
+    backend: str = "surrogate",
+    margin: float = None,
+    big_m: float = None,
+) -> Metric:
+    """See `PercentDaysMetric` for the backends. `margin` defaults to the
+    standard deviation of the equal-weight series, `big_m` to a bound valid
+    for long-only portfolios (only once `keep_long_positions_only` is
+    registered)."""
+    return _percent_days(
+        "% outperforming days",
+        "% days where portfolio outperforms benchmark.",
+        ts_metric,
+        threshold,
+        True,
+        backend,
+        margin,
+        big_m,
     )
-    Optimizer.update_metrics(metric)
-    return metric
 
 
+@timed("metric construction")
+def get_percent_underperforming_days(
+    ts_metric: Metric,
+    threshold: float = 0,
+    backend: str = "surrogate",
+    margin: float = None,
+    big_m: float = None,
+) -> Metric:
+    """See `get_percent_outperforming_days`."""
+    return _percent_days(
+        "% underperforming days",
+        "% days where portfolio underperforms.",
+        ts_metric,
+        threshold,
+        False,
+        backend,
+        margin,
+        big_m,
+    )
+
+
+@timed("metric construction")
 def get_ema_deviation(ts_metric: Metric, smoothing_window: int) -> Metric:
-    set_ema(ts_metric, window=smoothing_window)
+    name = f"{ts_metric.name} (deviation from historical weighted average)"
+    key = _aggregation_key(
+        "deviation from historical weighted average", ts_metric, smoothing_window
+    )
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    ema = set_ema(ts_metric, window=smoothing_window)
     metric = Metric(
-        name=f"{ts_metric.name} (deviation from historical weighted average)",
+        name=name,
         desc=f"Standard deviation of {ts_metric.name} against the ema smoothing function.",
-        expr=cp.std(ts_metric - Optimizer._optimizer_variables["ema"].var),
+        expr=cp.std(ts_metric.expr - ema),
+        key=key,
+        arguments={**ts_metric.arguments, "smoothing_window": smoothing_window},
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
+@timed("metric construction")
 def get_portfolio_variance(cov_matrix: Metric) -> cp.Expression:
+    name = f"portfolio variance (classical method)"
+    key = _aggregation_key("portfolio variance", cov_matrix)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    weights = Optimizer.get_variable("weights").var
+    if isinstance(cov_matrix, ts.FactorCovarianceMetric):
+        # low rank plus diagonal: |loadings.T @ w|^2 + |idiosyncratic * w|^2,
+        # O(N * n_factors) instead of the O(N^2) quadratic form
+        expr = cp.sum_squares(cov_matrix.loadings.T @ weights) + cp.sum_squares(
+            cp.multiply(cov_matrix.idiosyncratic, weights)
+        )
+    else:
+        expr = cp.quad_form(weights, cov_matrix.expr)
     metric = Metric(
-        name=f"portfolio variance (classical method)",
+        name=name,
         desc=f"Quadratic form of portfolio covariance matrix.",
-        expr=cp.quad_form(
-            Optimizer._optimizer_variables["weights"].var, cov_matrix.expr
-        ),
+        expr=expr,
+        key=key,
     )
     Optimizer.update_metrics(metric)
     return metric
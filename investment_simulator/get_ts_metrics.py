@@ -1,62 +1,249 @@
-import cvxpy as cp
-from investment_simulator.optimizer_object import Metric, Optimizer
+import numpy as np
+from investment_simulator.optimizer_object import (
+    Constraint,
+    Metric,
+    Optimizer,
+    Variable,
+    timed,
+)
 from investment_simulator import utils
+from investment_simulator.inflation import CPI
 
 
-def get_simple_return(data, tickers) -> Metric:
+def real_name(name: str, cpi: CPI) -> str:
+    """Name of the real (inflation-adjusted) variant of an objective or
+    constraint, so nominal and real variants can be registered together."""
+    return name if cpi is None else f"{name} (real)"
+
+
+def real_desc(desc: str, cpi: CPI) -> str:
+    if cpi is None:
+        return desc
+    return f"{desc.replace('nominal', 'real')} Prices are deflated by CPI."
+
+
+def _key(name: str, data, tickers, cpi: CPI) -> tuple:
+    key = (name, utils.get_fingerprint(data, tickers))
+    return key if cpi is None else key + (cpi.fingerprint(),)
+
+
+@timed("metric construction")
+def get_simple_return(data, tickers, cpi: CPI = None) -> Metric:
+    """
+    Args:
+        cpi: monthly CPI: real return, on prices deflated to money of the
+            first date (the metric is then named "real simple return").
+    """
+    name = "simple return" if cpi is None else "real simple return"
+    key = _key(name, data, tickers, cpi)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    returns = utils.get_derived_array(
+        utils.get_percent_change_against_initial_state, data, tickers, cpi=cpi
+    )
     metric = Metric(
-        name="simple return",
-        desc="% nominal growth or loss against initial input price.",
-        expr=utils.get_percent_change_against_initial_state(data[tickers])
-        @ Optimizer._optimizer_variables["weights"].var,
+        name=name,
+        desc=real_desc("% nominal growth or loss against initial input price.", cpi),
+        expr=returns @ Optimizer.get_weights(tickers),
+        coef=returns,
+        offset=np.zeros(returns.shape[0]),
+        key=key,
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
-def get_dod_return(data, tickers) -> Metric:
+@timed("metric construction")
+def get_dod_return(data, tickers, cpi: CPI = None) -> Metric:
+    """See `get_simple_return` for `cpi`."""
+    name = "DoD return" if cpi is None else "real DoD return"
+    key = _key(name, data, tickers, cpi)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    returns = utils.get_derived_array(
+        utils.get_percent_change_over_time, data, tickers, cpi=cpi
+    )
     metric = Metric(
-        name="DoD return",
-        desc="% DoD change in portfolio return.",
-        expr=utils.get_percent_change_over_time(data[tickers])
-        @ Optimizer._optimizer_variables["weights"].var,
+        name=name,
+        desc=real_desc("% DoD change in portfolio return.", cpi),
+        expr=returns @ Optimizer.get_weights(tickers),
+        coef=returns,
+        offset=np.zeros(returns.shape[0]),
+        key=key,
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
-def get_return_against_benchmark(data, tickers, benchmark) -> Metric:
-    nominal_return = utils.get_percent_change_against_initial_state(data[tickers])
-    benchmark_return = utils.get_percent_change_against_initial_state(data[benchmark])
+@timed("metric construction")
+def get_return_against_benchmark(data, tickers, benchmark, cpi: CPI = None) -> Metric:
+    """See `get_simple_return` for `cpi`."""
+    name = f"return against {benchmark}"
+    name = name if cpi is None else f"real {name}"
+    key = _key(name, data, list(tickers) + [benchmark], cpi)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    nominal_return = utils.get_derived_array(
+        utils.get_percent_change_against_initial_state, data, tickers, cpi=cpi
+    )
+    benchmark_return = utils.get_derived_array(
+        utils.get_percent_change_against_initial_state, data, benchmark, cpi=cpi
+    ).ravel()
     metric = Metric(
-        name=f"return against {benchmark}",
-        desc=f"Nominal return minus benchmark return ({benchmark}).",
-        expr=nominal_return @ Optimizer._optimizer_variables["weights"].var
-        - benchmark_return,
+        name=name,
+        desc=real_desc(f"Nominal return minus benchmark return ({benchmark}).", cpi),
+        expr=nominal_return @ Optimizer.get_weights(tickers) - benchmark_return,
+        coef=nominal_return,
+        offset=-benchmark_return,
+        key=key,
+        arguments={"benchmark": benchmark},
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
-def get_drawdown(data, tickers) -> Metric:
-    nominal_portfolio_return = (
-        utils.get_percent_change_against_initial_state(data[tickers])
-        @ Optimizer._optimizer_variables["weights"].var
+class RunningPeak:
+    """Tighten the running-peak variable of drawdown after a solve.
+
+    Drawdown is formulated as `peak - return` with `peak >= return` and
+    `peak` non-decreasing (the epigraph cvxpy builds for `cummax`). Every
+    use of drawdown bounds it from above, so replacing `peak` by the exact
+    running max of the solved return keeps the solution feasible and
+    optimal, and makes reported drawdown values exact.
+    """
+
+    def __init__(self, peak: Variable, nominal_return: Metric):
+        self.peak = peak
+        self.nominal_return = nominal_return
+
+    def __call__(self) -> bool:
+        path = self.nominal_return.expr.value
+        if path is not None:
+            self.peak.var.value = np.maximum.accumulate(path)
+        return False
+
+
+@timed("metric construction")
+def get_drawdown(data, tickers, cpi: CPI = None) -> Metric:
+    """See `get_simple_return` for `cpi`."""
+    name = "drawdown" if cpi is None else "real drawdown"
+    key = _key(name, data, tickers, cpi)
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    nominal_return = get_simple_return(data, tickers, cpi)
+    # one running-peak variable shared by every aggregation of drawdown,
+    # instead of a separate cummax epigraph per objective / constraint
+    peak = Variable(
+        name=f"{name} peak",
+        desc="Running maximum of portfolio return.",
+        dim=nominal_return.expr.size,
+    )
+    Optimizer.update_variables(peak)
+    Optimizer.update_constraints(
+        Constraint(
+            name=f"{name} peak: above return",
+            desc="Running maximum is at least the portfolio return.",
+            cons_expr=peak.var >= nominal_return.expr,
+        )
     )
+    Optimizer.update_constraints(
+        Constraint(
+            name=f"{name} peak: non-decreasing",
+            desc="Running maximum never decreases.",
+            cons_expr=peak.var[1:] >= peak.var[:-1],
+        )
+    )
+    Optimizer.update_separators({f"{name} peak": RunningPeak(peak, nominal_return)})
     metric = Metric(
-        name="drawdown",
-        desc="% drop of portfolio value since the maximum-to-date.",
-        expr=cp.cummax(nominal_portfolio_return) - nominal_portfolio_return,
+        name=name,
+        desc=real_desc("% drop of portfolio value since the maximum-to-date.", cpi),
+        expr=peak.var - nominal_return.expr,
+        key=key,
     )
     Optimizer.update_metrics(metric)
     return metric
 
 
-def get_covariance_matrix(data, tickers) -> Metric:
-    metric = Metric(
-        name="covariance matrix",
-        desc="Covariance matrix of historical ticker prices.",
-        expr=utils.get_covariance_matrix(data[tickers]),
+COVARIANCE_METHODS = ("sample", "ledoit-wolf", "ewma", "factor")
+
+
+class FactorCovarianceMetric(Metric):
+    """Covariance matrix as a factor model, `loadings @ loadings.T +
+    diag(idiosyncratic ** 2)`. `expr` is the N x (n_factors + 1) matrix of
+    `utils.get_factor_model`."""
+
+    @property
+    def loadings(self) -> np.ndarray:
+        return self.expr[:, :-1]
+
+    @property
+    def idiosyncratic(self) -> np.ndarray:
+        return self.expr[:, -1]
+
+
+@timed("metric construction")
+def get_covariance_matrix(
+    data,
+    tickers,
+    method: str = "sample",
+    smoothing_window: int = 60,
+    n_factors: int = 5,
+    cpi: CPI = None,
+) -> Metric:
+    """
+    Args:
+        method: covariance estimator, one of `COVARIANCE_METHODS`:
+            "sample": sample covariance of DoD returns.
+            "ledoit-wolf": sample covariance with Ledoit-Wolf shrinkage.
+            "ewma": exponentially weighted, over `smoothing_window` days.
+            "factor": PCA model with `n_factors` factors, returned as a
+                `FactorCovarianceMetric` rather than an N x N matrix, so that
+                the portfolio variance is a sum of squares of factor
+                exposures.
+        cpi: monthly CPI: covariance of real DoD returns (the metric name
+            is then prefixed with "real").
+    """
+    if method == "sample":
+        name, func, args = "covariance matrix", utils.get_covariance_matrix, ()
+    elif method == "ledoit-wolf":
+        name, func, args = (
+            "covariance matrix (ledoit-wolf)",
+            utils.get_ledoit_wolf_covariance,
+            (),
+        )
+    elif method == "ewma":
+        name, func, args = (
+            "covariance matrix (ewma)",
+            utils.get_ewma_covariance,
+            (smoothing_window,),
+        )
+    elif method == "factor":
+        name, func, args = (
+            "covariance matrix (factor model)",
+            utils.get_factor_model,
+            (n_factors,),
+        )
+    else:
+        raise Exception(
+            f"Unknown covariance method {method}, expected one of {COVARIANCE_METHODS}."
+        )
+    name = name if cpi is None else f"real {name}"
+    # the matrix is paired with the weights in `get_portfolio_variance`
+    Optimizer.get_weights(tickers)
+    key = _key(name, data, tickers, cpi) + args
+    metric = Optimizer.get_metric(name, key)
+    if metric:
+        return metric
+    cls = FactorCovarianceMetric if method == "factor" else Metric
+    metric = cls(
+        name=name,
+        desc=real_desc("Covariance matrix of historical ticker prices.", cpi),
+        expr=utils.get_derived_array(func, data, tickers, *args, cpi=cpi),
+        key=key,
     )
     Optimizer.update_metrics(metric)
     return metric
@@ -0,0 +1,101 @@
+"""Monthly CPI and the deflator of real (inflation-adjusted) returns.
+
+CPI stays at monthly resolution: `CPI.deflator(dates)` maps each date to the
+CPI of its month (the latest published month for dates past the series) only
+when a real metric asks for it, and memoizes the result per date axis. Real
+metrics scale every row of prices by the deflator, one multiplication
+broadcast across all tickers, so prices are in money of the first date:
+
+    cpi = DataProcessor(min_date, max_date).retrieve_cpi()
+    so.maximize_return(sim.data, sim.tickers, cpi=cpi)
+"""
+
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import List
+
+from investment_simulator.dataset import to_days
+
+
+class CPI:
+
+    # date axes whose deflator is kept
+    max_cached = 32
+
+    def __init__(self, months: np.ndarray, values: np.ndarray):
+        """
+        Args:
+            months: first day of each month, as int64 days since 1970-01-01
+                (see `dataset.to_days`).
+            values: CPI of each month.
+        """
+        months = np.asarray(months, dtype=np.int64)
+        values = np.asarray(values, dtype=float)
+        order = np.argsort(months)
+        self.months = months[order]
+        self.values = values[order]
+        self._fingerprint = None
+        self._deflators = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __reduce__(self):
+        # pickled without the deflator cache, e.g. for worker processes
+        return CPI, (self.months, self.values)
+
+    @classmethod
+    def from_records(cls, records: List[dict]) -> "CPI":
+        """Parse the "data" records of an Alpha Vantage CPI response; months
+        without a numeric value are skipped."""
+        frame = pd.DataFrame.from_records(records)
+        values = pd.to_numeric(frame["value"], errors="coerce").to_numpy()
+        valid = ~np.isnan(values)
+        return cls(to_days(frame["date"].to_numpy()[valid]), values[valid])
+
+    def to_series(self) -> pd.Series:
+        return pd.Series(
+            self.values,
+            index=np.datetime_as_string(self.months.astype("datetime64[D]")),
+            name="CPI",
+        )
+
+    def fingerprint(self) -> str:
+        if self._fingerprint is None:
+            digest = hashlib.blake2b(digest_size=16)
+            digest.update(self.months.tobytes())
+            digest.update(self.values.tobytes())
+            self._fingerprint = digest.hexdigest()
+        return self._fingerprint
+
+    def deflator(self, dates) -> np.ndarray:
+        """CPI of the first date over CPI of each date: multiplying prices by
+        it turns them into money of the first date.
+
+        Args:
+            dates: ascending dates, as "%Y-%m-%d" strings or int64 days.
+
+        Raises:
+            Exception: A date precedes the CPI series.
+        """
+        days = np.asarray(dates)
+        if days.dtype != np.int64:
+            days = to_days(days)
+        key = hashlib.blake2b(days.tobytes(), digest_size=16).digest()
+        with self._lock:
+            if key in self._deflators:
+                self._deflators.move_to_end(key)
+                return self._deflators[key]
+        month = np.searchsorted(self.months, days, side="right") - 1
+        if len(month) and month[0] < 0:
+            first = np.datetime64(int(days[0]), "D")
+            raise Exception(f"No CPI data for {first}.")
+        levels = self.values[month]
+        deflator = levels[0] / levels if len(levels) else levels
+        deflator.setflags(write=False)
+        with self._lock:
+            self._deflators[key] = deflator
+            while len(self._deflators) > self.max_cached:
+                self._deflators.popitem(last=False)
+        return deflator
@@ -0,0 +1,181 @@
+"""Local HTTP stand-in for the Alpha Vantage query endpoint.
+
+Serves canned payloads so `DataRetriever` can be exercised offline:
+
+    with MockAlphaVantage({"SPY": daily_payload("SPY")}) as api:
+        DataRetriever(base_url=api.url).refresh(["SPY"])
+        api.requests  # queries received so far
+"""
+
+import json
+import threading
+import time
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Union
+from urllib.parse import parse_qsl, urlparse
+
+from investment_simulator.data_retriever import COMPACT_SIZE
+
+
+def daily_payload(
+    symbol: str, start: str = "2015-01-01", end: str = None, seed: int = 0
+) -> dict:
+    """Synthetic TIME_SERIES_DAILY payload on business days (latest first)."""
+    dates = pd.bdate_range(start, end or pd.Timestamp.today().normalize())
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(3e-4, 1e-2, size=len(dates)))
+    time_series = {
+        day: {
+            "1. open": f"{price:.4f}",
+            "2. high": f"{price * 1.005:.4f}",
+            "3. low": f"{price * 0.995:.4f}",
+            "4. close": f"{price:.4f}",
+            "5. volume": "1000000",
+        }
+        for day, price in zip(dates.strftime("%Y-%m-%d")[::-1], close[::-1])
+    }
+    return {
+        "Meta Data": {
+            "1. Information": "Daily Prices (open, high, low, close) and Volumes",
+            "2. Symbol": symbol,
+            "3. Last Refreshed": dates[-1].strftime("%Y-%m-%d"),
+        },
+        "Time Series (Daily)": time_series,
+    }
+
+
+def macro_payload(name: str, start: str = "2000-01-01", end: str = None) -> dict:
+    """Synthetic monthly CPI / INFLATION payload (latest first)."""
+    dates = pd.date_range(start, end or pd.Timestamp.today(), freq="MS")
+    values = 170 * 1.002 ** np.arange(len(dates))
+    return {
+        "name": name,
+        "interval": "monthly",
+        "unit": "index 1982-1984=100",
+        "data": [
+            {"date": day, "value": f"{value:.3f}"}
+            for day, value in zip(dates.strftime("%Y-%m-%d")[::-1], values[::-1])
+        ],
+    }
+
+
+def load_payloads(directory: Union[str, Path]) -> Dict[str, dict]:
+    """Load cached responses (e.g. DATA_DIR) as canned payloads, keyed by
+    symbol / dataset name."""
+    return {
+        path.stem: json.loads(path.read_text())
+        for path in Path(directory).glob("*.json")
+    }
+
+
+class MockAlphaVantage:
+
+    def __init__(
+        self,
+        payloads: Dict[str, dict] = None,
+        host: str = "127.0.0.1",
+        port: int = 0,
+        latency: float = 0,
+        requests_per_minute: float = None,
+    ):
+        """
+        Args:
+            payloads: symbol (for TIME_SERIES_DAILY) or function name (CPI,
+                INFLATION) to the full response payload.
+            port: 0 picks a free port.
+            latency: seconds to wait before answering each request.
+            requests_per_minute: quota; requests beyond it within a rolling
+                minute get Alpha Vantage's throttling "Note" response.
+        """
+        self.payloads = payloads if payloads is not None else {}
+        self.latency = latency
+        self.requests_per_minute = requests_per_minute
+        self.requests = []
+        self.throttled = 0
+        self._served_at = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _over_quota(self) -> bool:
+        if not self.requests_per_minute:
+            return False
+        with self._lock:
+            now = time.monotonic()
+            self._served_at = [t for t in self._served_at if now - t < 60]
+            if len(self._served_at) >= self.requests_per_minute:
+                self.throttled += 1
+                return True
+            self._served_at.append(now)
+            return False
+
+    def respond(self, query: Dict[str, str]) -> dict:
+        if self._over_quota():
+            return {
+                "Note": "Thank you for using Alpha Vantage! Our standard API call "
+                f"frequency is {self.requests_per_minute} calls per minute."
+            }
+        function = query.get("function")
+        if function == "TIME_SERIES_DAILY" and query.get("symbol") in self.payloads:
+            payload = self.payloads[query["symbol"]]
+            if query.get("outputsize", "compact") == "compact":
+                latest = sorted(payload["Time Series (Daily)"], reverse=True)
+                payload = dict(payload)
+                payload["Time Series (Daily)"] = {
+                    day: payload["Time Series (Daily)"][day]
+                    for day in latest[:COMPACT_SIZE]
+                }
+            return payload
+        if function in self.payloads:
+            return self.payloads[function]
+        return {"Error Message": f"Invalid API call. Unknown query: {query}"}
+
+    def status(self, query: Dict[str, str]) -> int:
+        """HTTP status of the response to `query`; Alpha Vantage answers
+        errors with 200 and a message, see `respond`."""
+        return 200
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                query = dict(parse_qsl(urlparse(self.path).query))
+                with mock._lock:
+                    mock.requests.append(query)
+                time.sleep(mock.latency)
+                body = json.dumps(mock.respond(query)).encode()
+                self.send_response(mock.status(query))
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
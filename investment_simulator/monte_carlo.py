@@ -0,0 +1,155 @@
+"""Block-bootstrap Monte Carlo stress tests of an allocation.
+
+Synthetic paths are built by resampling blocks of consecutive historical DoD
+returns (moving block bootstrap), which keeps short-range autocorrelation and
+the cross-sectional dependence between tickers. Paths are generated and
+evaluated as batched NumPy arrays, a chunk of paths at a time to bound
+memory, optionally spread over a process pool. Like the simulator, the
+allocation is bought at the start of a path and held without rebalancing.
+"""
+
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Union
+
+from investment_simulator import utils
+
+
+def block_bootstrap_indices(
+    n_obs: int,
+    n_paths: int,
+    horizon: int,
+    block_size: int,
+    rng: np.random.Generator,
+) -> np.ndarray:
+    """Row indices (n_paths x horizon) of concatenated random blocks of
+    `block_size` consecutive observations."""
+    block_size = min(block_size, n_obs)
+    n_blocks = -(-horizon // block_size)
+    starts = rng.integers(0, n_obs - block_size + 1, size=(n_paths, n_blocks))
+    indices = starts[:, :, None] + np.arange(block_size)
+    return indices.reshape(n_paths, -1)[:, :horizon]
+
+
+def evaluate_paths(value: np.ndarray, initial: float = 1.0) -> Dict[str, np.ndarray]:
+    """Per-path metrics of a batch of portfolio value paths (n_paths x
+    horizon) starting from `initial`."""
+    path = value / initial - 1
+    running_max = np.maximum(np.maximum.accumulate(path, axis=1), 0)
+    previous = np.concatenate(
+        (np.full((value.shape[0], 1), initial), value[:, :-1]), axis=1
+    )
+    return {
+        "final return": path[:, -1],
+        "max drawdown": np.max(running_max - path, axis=1),
+        "worst DoD return": np.min(value / previous - 1, axis=1),
+    }
+
+
+def _simulate_chunk(
+    dod_returns: np.ndarray,
+    weights: np.ndarray,
+    n_paths: int,
+    horizon: int,
+    block_size: int,
+    seed: np.random.SeedSequence,
+) -> Dict[str, np.ndarray]:
+    rng = np.random.default_rng(seed)
+    indices = block_bootstrap_indices(
+        dod_returns.shape[0], n_paths, horizon, block_size, rng
+    )
+    # buy and hold, as the simulator values allocations: each ticker compounds
+    # its own returns and the portfolio is worth their weighted sum
+    value = np.zeros((n_paths, horizon))
+    for column in np.flatnonzero(weights):
+        value += weights[column] * np.cumprod(
+            1 + dod_returns[:, column][indices], axis=1
+        )
+    return evaluate_paths(value, weights.sum())
+
+
+class MonteCarloSimulator:
+
+    def __init__(
+        self,
+        data: pd.DataFrame,
+        tickers: List[str],
+        block_size: int = 20,
+        horizon: int = None,
+        seed: int = None,
+    ):
+        """
+        Args:
+            data: historical prices in the `DataProcessor` layout.
+            block_size: length of resampled blocks, in trading days.
+            horizon: length of synthetic paths; defaults to the history length.
+            seed: seed for reproducible paths (independent of chunking and
+                the number of workers).
+        """
+        self.tickers = tickers
+        self.dod_returns = utils.get_derived_array(
+            utils.get_percent_change_over_time, data, tickers
+        )
+        self.block_size = block_size
+        self.horizon = horizon or self.dod_returns.shape[0]
+        self.seed = seed
+
+    def _weights(self, allocation: Union[np.ndarray, Dict[str, float]]) -> np.ndarray:
+        if isinstance(allocation, dict):
+            return np.array([allocation.get(ticker, 0.0) for ticker in self.tickers])
+        return np.asarray(allocation, dtype=float)
+
+    def simulate(
+        self,
+        allocation: Union[np.ndarray, Dict[str, float]],
+        n_paths: int = 10000,
+        chunk_size: int = 2000,
+        max_workers: int = None,
+    ) -> pd.DataFrame:
+        """Distribution of outcomes of holding `allocation` over synthetic paths.
+
+        Args:
+            allocation: weights in ticker order, or a {ticker: weight} dict
+                such as the output of `generate_allocation()`.
+            chunk_size: paths generated at once; peak memory is about
+                `chunk_size * horizon * 32` bytes per worker.
+            max_workers: run chunks on a process pool of this size; in the
+                current process if None.
+
+        Returns:
+            One row per path with final return, max drawdown and worst DoD
+            return of the allocation held without rebalancing.
+        """
+        if n_paths < 1 or chunk_size < 1:
+            raise Exception("n_paths and chunk_size must be at least 1.")
+        weights = self._weights(allocation)
+        sizes = [chunk_size] * (n_paths // chunk_size)
+        if n_paths % chunk_size:
+            sizes.append(n_paths % chunk_size)
+        seeds = np.random.SeedSequence(self.seed).spawn(len(sizes))
+        args = [
+            (self.dod_returns, weights, size, self.horizon, self.block_size, seed)
+            for size, seed in zip(sizes, seeds)
+        ]
+        if max_workers is None:
+            chunks = [_simulate_chunk(*arg) for arg in args]
+        else:
+            with ProcessPoolExecutor(max_workers=max_workers) as executor:
+                chunks = list(executor.map(_simulate_chunk, *zip(*args)))
+        return pd.DataFrame(
+            {
+                metric: np.concatenate([chunk[metric] for chunk in chunks])
+                for metric in chunks[0]
+            }
+        )
+
+    @staticmethod
+    def summarize(
+        results: pd.DataFrame, quantiles: List[float] = (0.01, 0.05, 0.5, 0.95, 0.99)
+    ) -> pd.DataFrame:
+        """Mean and quantiles of each metric across paths."""
+        summary = results.quantile(list(quantiles)).T
+        summary.columns = [f"q{q:g}" for q in quantiles]
+        summary.insert(0, "mean", results.mean())
+        return summary
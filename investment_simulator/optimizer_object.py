@@ -1,28 +1,81 @@
 """Optimizer class to solve convex optimization problems.
 
+Each `Optimizer` instance owns its own registry of objectives, constraints,
+variables and metrics. Helper modules (`set_objective`, `set_constraints`,
+`set_variables`, `get_ts_metrics`, `get_agg_metrics`) register into the
+optimizer that is active in the current context, so simulators built in
+different threads (or asyncio tasks) never share state.
+
 Public methods:
-    `add_variable`:
-    `add_objective`:
-    `add_constraint`:
-    `add_metric`:
+    `active`: return the optimizer active in the current context.
+    `activate`: make an optimizer instance the active one.
+    `get_variable`: look up a variable on the active optimizer.
+    `get_weights`: the portfolio weights, checked against the tickers.
+    `get_metric`: look up a metric built from the same inputs, for reuse.
+    `get_parameter`: look up a parameter on the active optimizer.
+    `update_variables`:
+    `update_parameters`:
+    `update_separators`:
+    `update_objectives`:
+    `update_constraints`:
+    `update_metrics`:
     `optimize`:
-    `save_result`:
+    `mip_options`: time limit and gap options of mixed-integer solvers.
+    `fingerprint`: hash of the registered problem, keys `solve_cache`.
+    `record_time`: add wall time to a phase in `timings`.
+    `problem_statistics`: dimensions and non-zeros of the solved problem.
+    `clear`:
+
+Helpers decorated with `timed` add their wall time to the `timings` of the
+active optimizer, so a slow run can be attributed to data load, metric
+construction, canonicalization or the solver.
 """
 
+import functools
+import hashlib
+import threading
+import time
+import warnings
+from contextvars import ContextVar
 import cvxpy as cp
 import numpy as np
-from typing import Union, Dict, List
+from typing import Callable, Hashable, Optional, Union, Dict, List
 
 
 class Metric:
 
     def __init__(
-        self, name: str, desc: str, expr: Union[np.number, np.ndarray, cp.Expression]
+        self,
+        name: str,
+        desc: str,
+        expr: Union[np.number, np.ndarray, cp.Expression],
+        coef: np.ndarray = None,
+        offset: np.ndarray = None,
+        key: Hashable = None,
+        arguments: dict = None,
     ):
+        """
+        Args:
+            coef, offset: set when the metric is a series linear in the
+                portfolio weights, i.e. `expr == coef @ weights + offset`.
+                Aggregations use them to fold the series into precomputed
+                coefficient vectors.
+            key: identifies what the metric was built from (data fingerprint,
+                tickers, arguments). A metric requested again with the same
+                key is reused instead of rebuilt, see `Optimizer.get_metric`.
+            arguments: arguments the metric was built with that an ex-post
+                evaluation of it needs, e.g. the benchmark or smoothing
+                window (see `InvestmentSimulator.generate_fidelity_report`).
+                Aggregations inherit the arguments of their series.
+        """
         self.name = name
         self.type = "metric"
         self.desc = desc
         self.expr = expr
+        self.coef = coef
+        self.offset = offset
+        self.key = key
+        self.arguments = arguments or {}
 
     def __call__(self):
         return self.get_value()
@@ -62,6 +115,26 @@ class Variable:
         )
 
 
+class Parameter:
+
+    def __init__(self, name, desc, value, dim=(), **kwargs):
+        self.name = name
+        self.type = "parameter"
+        self.desc = desc
+        self.param = cp.Parameter(name=name, shape=dim, value=value, **kwargs)
+
+    def __call__(self):
+        return self.param.value
+
+    def __str__(self):
+        return (
+            f"Name: {self.name}\n"
+            f"Type: {self.type}\n"
+            f"Description: {self.desc}\n"
+            f"Value: {self.param.value}"
+        )
+
+
 class Objective:
 
     def __init__(self, name: str, desc: str, obj_func: cp.Expression):
@@ -83,13 +156,28 @@ class Objective:
 
 
 class Constraint:
-    def __init__(self, name, desc, cons_expr: cp.Expression):
+    def __init__(
+        self, name, desc, cons_expr: cp.Expression, threshold: Parameter = None
+    ):
+        """
+        Args:
+            threshold: parameter the constraint is bounded by. `desc` then
+                formats its current value as `{threshold}`, so descriptions
+                follow `set_parameters` and sweeps.
+        """
         self.name = name
         self.type = "constraint"
-        self.desc = desc
+        self._desc = desc
         self.cons_expr = cons_expr
+        self.threshold = threshold
         self.dual_value = None
 
+    @property
+    def desc(self) -> str:
+        if self.threshold is None:
+            return self._desc
+        return self._desc.format(threshold=self.threshold())
+
     def __call__(self):
         return self.dual_value
 
@@ -102,70 +190,447 @@ class Constraint:
         )
 
 
+_active_optimizer: ContextVar["Optimizer"] = ContextVar(
+    "active_optimizer", default=None
+)
+# tokens of nested `with optimizer:` blocks in the current context
+_active_tokens: ContextVar[tuple] = ContextVar("active_tokens", default=())
+# phase being timed in the current context, so nested helpers count once
+_timed_phase: ContextVar[str] = ContextVar("timed_phase", default=None)
+
+
+def timed(phase: str):
+    """Decorator adding the wall time of a helper to `phase` in the timings of
+    the active optimizer. Calls nested in another timed call are not counted
+    again."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if _timed_phase.get() is not None:
+                return func(*args, **kwargs)
+            token = _timed_phase.set(phase)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                _timed_phase.reset(token)
+                optimizer = _active_optimizer.get()
+                if optimizer is not None:
+                    optimizer.record_time(phase, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def mip_options(solver: str, time_limit: float = None, mip_gap: float = None) -> dict:
+    """`cp.Problem.solve` options stopping a mixed-integer solve after
+    `time_limit` seconds or within a relative `mip_gap` of the optimum.
+
+    Raises:
+        Exception: The solver does not support the limit.
+    """
+    if solver == "SCIPY":
+        options = {"time_limit": time_limit, "mip_rel_gap": mip_gap}
+        return {"scipy_options": {k: v for k, v in options.items() if v is not None}}
+    if solver == "HIGHS":
+        options = {"time_limit": time_limit, "mip_rel_gap": mip_gap}
+        return {k: v for k, v in options.items() if v is not None}
+    if solver == "GUROBI":
+        options = {"TimeLimit": time_limit, "MIPGap": mip_gap}
+        return {k: v for k, v in options.items() if v is not None}
+    if solver == "CBC":
+        options = {"maximumSeconds": time_limit, "allowableFractionGap": mip_gap}
+        return {k: v for k, v in options.items() if v is not None}
+    if solver == "ECOS_BB" and time_limit is None:
+        return {"mi_rel_eps": mip_gap}
+    raise Exception(f"No time limit / MIP gap options for solver {solver}.")
+
+
 class Optimizer:
 
-    _optimizer_objectives = {}
-    _optimizer_constraints = {}
-    _optimizer_variables = {}
-    _optimizer_metrics = {}
+    max_separation_rounds = 100
 
     def __init__(self):
         self.problem = None
+        self._optimizer_objectives = {}
+        self._optimizer_constraints = {}
+        self._optimizer_variables = {}
+        self._optimizer_metrics = {}
+        self._optimizer_parameters = {}
+        # callables run after each solve: they add violated cutting planes and
+        # return True if they added any (`optimize` re-solves until none do),
+        # or tighten auxiliary variables of the solution and return False
+        self._optimizer_separators = {}
+        # bumped whenever the registry changes; the compiled problem is
+        # reused for as long as the revision it was built from is current
+        self._revision = 0
+        self._problem_revision = None
+        self._lock = threading.RLock()
+        # wall time in seconds per phase, and statistics of the last solve
+        self.timings = {}
+        self.solver_stats = {}
+        # outcome of the last `optimize`, whether solved or restored from
+        # `solve_cache` (then `problem` may not reflect it)
+        self.status = None
+        self.value = None
+        # optional cache of solutions keyed by `fingerprint`, see
+        # `solve_cache.SolveCache`
+        self.solve_cache = None
+        self.activate()
+
+    def __enter__(self):
+        token = _active_optimizer.set(self)
+        _active_tokens.set(_active_tokens.get() + (token,))
+        return self
+
+    def __exit__(self, *exc):
+        tokens = _active_tokens.get()
+        _active_tokens.set(tokens[:-1])
+        _active_optimizer.reset(tokens[-1])
+
+    def activate(self):
+        """Make this optimizer the target of helper functions in the current
+        thread / asyncio task."""
+        _active_optimizer.set(self)
+        return self
+
+    @classmethod
+    def active(cls) -> "Optimizer":
+        """Return the optimizer active in the current context.
+
+        Raises:
+            Exception: No optimizer has been activated in this context.
+        """
+        optimizer = _active_optimizer.get()
+        if optimizer is None:
+            raise Exception(
+                "No active optimizer in this context. Create a simulator or "
+                "call `activate()` / use `with sim:` first."
+            )
+        return optimizer
 
     def clear(self):
-        Optimizer._optimizer_objectives.clear()
-        Optimizer._optimizer_constraints.clear()
-        Optimizer._optimizer_variables.clear()
-        Optimizer._optimizer_metrics.clear()
+        with self._lock:
+            self._optimizer_objectives.clear()
+            self._optimizer_constraints.clear()
+            self._optimizer_variables.clear()
+            self._optimizer_metrics.clear()
+            self._optimizer_parameters.clear()
+            self._optimizer_separators.clear()
+            self.problem = None
+            self.timings.clear()
+            self.solver_stats = {}
+            self.status = None
+            self.value = None
+            self._revision += 1
+
+    def record_time(self, phase: str, seconds: float):
+        with self._lock:
+            self.timings[phase] = self.timings.get(phase, 0) + seconds
+
+    def _register(self, registry: dict, value):
+        with self._lock:
+            registry.update(value)
+            self._revision += 1
+
+    @classmethod
+    def get_variable(cls, name: str) -> Variable:
+        return cls.active()._optimizer_variables[name]
+
+    @classmethod
+    def get_weights(cls, tickers: List[str]) -> cp.Variable:
+        """Return the portfolio weights of the active optimizer, checked
+        against the tickers a metric is built for.
+
+        Raises:
+            Exception: The active optimizer has no weights, or holds weights
+                for other tickers (e.g. a helper was called with the data of
+                a simulator other than the active one).
+        """
+        weights = cls.active()._optimizer_variables.get("weights")
+        if weights is None:
+            raise Exception("The active optimizer has no weights, see `set_weights`.")
+        tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+        registered = getattr(weights, "tickers", None)
+        if registered is not None and registered != tickers:
+            raise Exception(
+                f"Tickers {tickers} do not match the weights of the active "
+                f"optimizer ({registered}). Helpers register into the most "
+                "recently constructed or activated simulator; select the "
+                "intended one with `with sim:` or `sim.activate()`."
+            )
+        return weights.var
+
+    @classmethod
+    def get_metric(cls, name: str, key: Hashable) -> Optional[Metric]:
+        """Return the registered metric `name` if it was built from `key`, so
+        objectives and constraints share one expression per series."""
+        metric = cls.active()._optimizer_metrics.get(name)
+        if metric is not None and key is not None and metric.key == key:
+            return metric
+        return None
+
+    @classmethod
+    def get_parameter(cls, name: str) -> Parameter:
+        return cls.active()._optimizer_parameters[name]
 
     @classmethod
     def update_objectives(cls, value: Union[Objective, Dict[str, Objective]]):
         if isinstance(value, Objective):
             value = {value.name: value}
-        Optimizer._optimizer_objectives.update(value)
+        optimizer = cls.active()
+        optimizer._register(optimizer._optimizer_objectives, value)
 
     @classmethod
     def update_constraints(cls, value: Union[Constraint, Dict[str, Constraint]]):
         if isinstance(value, Constraint):
             value = {value.name: value}
-        Optimizer._optimizer_constraints.update(value)
+        optimizer = cls.active()
+        optimizer._register(optimizer._optimizer_constraints, value)
 
     @classmethod
     def update_variables(cls, value: Union[Variable, Dict[str, Variable]]):
         """https://www.cvxpy.org/api_reference/cvxpy.expressions.html#variable"""
         if isinstance(value, Variable):
             value = {value.name: value}
-        Optimizer._optimizer_variables.update(value)
+        optimizer = cls.active()
+        optimizer._register(optimizer._optimizer_variables, value)
+
+    @classmethod
+    def update_parameters(cls, value: Union[Parameter, Dict[str, Parameter]]):
+        """https://www.cvxpy.org/api_reference/cvxpy.expressions.html#parameter"""
+        if isinstance(value, Parameter):
+            value = {value.name: value}
+        optimizer = cls.active()
+        optimizer._register(optimizer._optimizer_parameters, value)
+
+    @classmethod
+    def update_separators(cls, value: Dict[str, Callable[[], bool]]):
+        optimizer = cls.active()
+        optimizer._register(optimizer._optimizer_separators, value)
 
     @classmethod
     def update_metrics(cls, value: Union[Metric, Dict[str, Metric]]):
         if isinstance(value, Metric):
             value = {value.name: value}
-        Optimizer._optimizer_metrics.update(value)
+        optimizer = cls.active()
+        optimizer._register(optimizer._optimizer_metrics, value)
 
-    @classmethod
-    def update_dual_values(cls, lis_constraints: List[cp.Expression]):
+    def update_dual_values(self, lis_constraints: List[cp.Expression]):
         # assign dual values to constraints
         counter = 0
-        for c in Optimizer._optimizer_constraints:
-            Optimizer._optimizer_constraints[c].dual_value = lis_constraints[
+        for c in self._optimizer_constraints:
+            self._optimizer_constraints[c].dual_value = lis_constraints[
                 counter
             ].dual_value
             counter += 1
 
-    def optimize(self):
-        """Run the optimizer instance.
+    def set_parameters(self, values: Dict[str, float]):
+        """Update parameter values in place. The compiled problem is kept, so
+        the next `optimize` call only re-solves."""
+        with self._lock:
+            for name, value in values.items():
+                self._optimizer_parameters[name].param.value = value
+
+    def build_problem(self) -> cp.Problem:
+        """Return the problem for the current registry, reusing the cached
+        (and already canonicalized) problem when nothing has been registered
+        since it was built.
 
         Raises:
             Exception: Having multiple objectives is not allowed.
         """
-        # if multi-objective, raise Exception
-        if len(self._optimizer_objectives) > 1:
-            raise Exception("Having multiple objectives is not allowed.")
-        # input objective
-        objective = [v.obj_func for _, v in self._optimizer_objectives.items()][0]
-        constraints = [v.cons_expr for _, v in self._optimizer_constraints.items()]
-        # define and solve the problem
-        self.problem = cp.Problem(objective, constraints)
-        self.problem.solve()
-        self.update_dual_values(constraints)
+        with self._lock:
+            if self.problem is not None and self._problem_revision == self._revision:
+                return self.problem
+            # if multi-objective, raise Exception
+            if len(self._optimizer_objectives) > 1:
+                raise Exception("Having multiple objectives is not allowed.")
+            # input objective
+            objective = [v.obj_func for _, v in self._optimizer_objectives.items()][0]
+            constraints = [v.cons_expr for _, v in self._optimizer_constraints.items()]
+            self.problem = cp.Problem(objective, constraints)
+            self._problem_revision = self._revision
+            return self.problem
+
+    def fingerprint(self, solver: str = None, solver_options: dict = None):
+        """Hash of a canonical description of the registered problem: keys of
+        the metrics (which fingerprint the data they were built from), names
+        and descriptions of objectives and constraints, variable shapes,
+        parameter values and the solver with its options.
+
+        Returns:
+            None if a metric was registered without a key, i.e. from inputs
+            the registry cannot describe.
+        """
+        with self._lock:
+            if any(m.key is None for m in self._optimizer_metrics.values()):
+                return None
+            description = (
+                sorted(repr(m.key) for m in self._optimizer_metrics.values()),
+                sorted(
+                    (name, o.desc) for name, o in self._optimizer_objectives.items()
+                ),
+                sorted(
+                    (name, c.desc) for name, c in self._optimizer_constraints.items()
+                ),
+                sorted(
+                    (name, v.var.shape) for name, v in self._optimizer_variables.items()
+                ),
+                sorted(
+                    (name, np.asarray(p()).tolist())
+                    for name, p in self._optimizer_parameters.items()
+                ),
+                solver,
+                sorted((solver_options or {}).items()),
+            )
+            return hashlib.blake2b(
+                repr(description).encode(), digest_size=16
+            ).hexdigest()
+
+    def _solution(self) -> dict:
+        return {
+            "status": self.status,
+            "value": self.value,
+            "variables": {
+                name: None if v() is None else np.asarray(v()).tolist()
+                for name, v in self._optimizer_variables.items()
+            },
+            "duals": {
+                name: None if c() is None else np.asarray(c()).tolist()
+                for name, c in self._optimizer_constraints.items()
+            },
+            "solver_stats": self.solver_stats,
+        }
+
+    def _restore(self, solution: dict):
+        for name, value in solution["variables"].items():
+            self._optimizer_variables[name].var.value = (
+                None if value is None else np.asarray(value)
+            )
+        for name, dual in solution["duals"].items():
+            self._optimizer_constraints[name].dual_value = (
+                None if dual is None else np.asarray(dual)
+            )
+        self.status = solution["status"]
+        self.value = solution["value"]
+        self.solver_stats = dict(solution["solver_stats"], cache="hit")
+
+    def optimize(
+        self,
+        solver: str = None,
+        time_limit: float = None,
+        mip_gap: float = None,
+        **solver_options,
+    ):
+        """Run the optimizer instance.
+
+        The problem is compiled once and re-solved with warm start while only
+        parameter values change between calls. With a `solve_cache`, a
+        problem solved before (same data, objectives, constraints, parameter
+        values and solver) is restored from the cache without compiling or
+        solving it.
+
+        Args:
+            solver: name of an installed cvxpy solver, e.g. "ECOS" or
+                "CLARABEL". cvxpy picks one if None. Problems with boolean
+                variables (e.g. exact % days metrics) need a mixed-integer
+                one such as "SCIPY", "HIGHS" or "ECOS_BB".
+            time_limit, mip_gap: limits of a mixed-integer solve in seconds
+                and relative optimality gap, see `mip_options`.
+            solver_options: passed on to `cp.Problem.solve`, e.g. `max_iters`
+                or `verbose`.
+        """
+        if time_limit is not None or mip_gap is not None:
+            solver_options = {
+                **mip_options(solver, time_limit, mip_gap),
+                **solver_options,
+            }
+        with self._lock, self:
+            key = None
+            if self.solve_cache is not None:
+                start = time.perf_counter()
+                key = self.fingerprint(solver, solver_options)
+                solution = None if key is None else self.solve_cache.get(key)
+                self.record_time("solve cache", time.perf_counter() - start)
+                if solution is not None:
+                    self._restore(solution)
+                    return
+            rounds, iterations, converged = 0, 0, True
+            for _ in range(self.max_separation_rounds):
+                problem = self.build_problem()
+                start = time.perf_counter()
+                problem.solve(solver=solver, warm_start=True, **solver_options)
+                elapsed = time.perf_counter() - start
+                self.record_time("canonicalization", problem.compilation_time)
+                self.record_time("solver", elapsed - problem.compilation_time)
+                rounds += 1
+                iterations += problem.solver_stats.num_iters or 0
+                if problem.status not in ("optimal", "optimal_inaccurate"):
+                    break
+                start = time.perf_counter()
+                added = [separate() for separate in self._optimizer_separators.values()]
+                self.record_time("separation", time.perf_counter() - start)
+                converged = not any(added)
+                if converged:
+                    break
+            self.update_dual_values(problem.constraints)
+            self.status = problem.status
+            self.value = problem.value
+            if not converged:
+                # the last round still added cuts: the solution may violate
+                # the constraints they separate
+                self.status = "optimal_inaccurate"
+                warnings.warn(
+                    f"Separation did not converge in {self.max_separation_rounds} "
+                    "rounds; the solution may violate cutting-plane constraints."
+                )
+            self.solver_stats = {
+                "solver": problem.solver_stats.solver_name,
+                "status": problem.status,
+                "rounds": rounds,
+                "separation converged": converged,
+                "iterations": iterations,
+                "setup time": problem.solver_stats.setup_time,
+                "solve time": problem.solver_stats.solve_time,
+            }
+            if (
+                key is not None
+                and converged
+                and self.status
+                in (
+                    "optimal",
+                    "optimal_inaccurate",
+                )
+            ):
+                self.solve_cache.put(key, self._solution())
+
+    def problem_statistics(self) -> dict:
+        """Dimensions of the last solved problem, and of the matrices passed
+        to the solver after canonicalization with their non-zero counts.
+
+        Canonical data is fetched again from cvxpy, which is cheap for
+        parametrized problems but not free: call it once per solve.
+        """
+        with self._lock:
+            if (
+                self.problem is None
+                or not self.solver_stats
+                or self.solver_stats.get("cache") == "hit"
+            ):
+                return {}
+            size = self.problem.size_metrics
+            statistics = {
+                "variables": int(size.num_scalar_variables),
+                "equality constraints": int(size.num_scalar_eq_constr),
+                "inequality constraints": int(size.num_scalar_leq_constr),
+                "parameters": len(self.problem.parameters()),
+            }
+            data, _, _ = self.problem.get_problem_data(self.solver_stats["solver"])
+            for name, value in data.items():
+                if hasattr(value, "nnz"):
+                    statistics[f"{name} shape"] = [int(dim) for dim in value.shape]
+                    statistics[f"{name} nnz"] = int(value.nnz)
+            return statistics
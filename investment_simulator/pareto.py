@@ -0,0 +1,349 @@
+"""Multi-objective optimization: Pareto fronts and efficient frontiers.
+
+`Optimizer.optimize` solves one objective at a time. `ParetoFront` trades
+several objectives (recipe steps, see `recipe`) off against each other by
+scalarizing them over a grid:
+
+    weighted-sum: minimize the sum of the objectives (each turned into a
+        minimization and divided by its range over the front), weighted by
+        points of a simplex grid.
+    epsilon: minimize the first objective while bounding every other one,
+        with bounds on a grid between its best and worst value on the front.
+
+Weights and bounds are cvxpy parameters, so each worker process compiles the
+scalarized problem once and re-solves a contiguous chunk of grid points with
+warm start from its neighbour. The ranges come from the anchor points, where
+each objective is optimized alone.
+
+    front = ParetoFront(
+        tickers,
+        objectives=[("maximize_ema_return", {"smoothing_window": 100}),
+                    "minimize_maximal_drawdown"],
+        constraints=["keep_long_positions_only"],
+        data=data,
+    )
+    frontier = front.run()
+
+`ParetoFront.efficient_frontier` is the classic return vs variance preset.
+"""
+
+import os
+import cvxpy as cp
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from itertools import product
+from typing import List, Sequence
+
+from investment_simulator import set_constraints
+from investment_simulator import set_objective
+from investment_simulator.data_processor import DataProcessor
+from investment_simulator.optimizer_object import Constraint, Objective, Parameter
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.inflation import CPI
+from investment_simulator.recipe import Step, apply_step, is_real
+
+METHODS = ("weighted-sum", "epsilon")
+
+
+def _sense(objective: Objective) -> float:
+    """+1 for a minimization, -1 for a maximization."""
+    return 1.0 if isinstance(objective.obj_func, cp.Minimize) else -1.0
+
+
+def _build(data, tickers, objectives, constraints, method, cpi=None) -> tuple:
+    # imported here so worker processes only pay for it when solving
+    from investment_simulator.simulator import InvestmentSimulator
+
+    sim = InvestmentSimulator(tickers, data=data)
+    with sim:
+        for step in constraints:
+            apply_step(set_constraints, step, data, tickers, cpi)
+        registered = [
+            apply_step(set_objective, step, data, tickers, cpi) for step in objectives
+        ]
+        # the objectives only contribute expressions to the scalarized one
+        sim._optimizer_objectives.clear()
+        terms = [
+            _sense(objective) * objective.obj_func.args[0] for objective in registered
+        ]
+        coefficients = []
+        for objective in registered:
+            name = f"pareto weight: {objective.name}"
+            Optimizer.update_parameters(
+                Parameter(
+                    name=name,
+                    desc=f"Coefficient of '{objective.name}' in the weighted sum.",
+                    value=1.0,
+                    nonneg=True,
+                )
+            )
+            coefficients.append(Optimizer.get_parameter(name).param)
+        if method == "weighted-sum":
+            combined = sum(c * term for c, term in zip(coefficients, terms))
+        else:
+            combined = terms[0]
+            for objective, term in zip(registered[1:], terms[1:]):
+                name = f"pareto epsilon: {objective.name}"
+                Optimizer.update_parameters(
+                    Parameter(
+                        name=name,
+                        desc=f"Bound on '{objective.name}' (as a minimization).",
+                        value=0.0,
+                    )
+                )
+                Optimizer.update_constraints(
+                    Constraint(
+                        name=name,
+                        desc=f"Bound '{objective.name}' for the epsilon-constraint method.",
+                        cons_expr=term <= Optimizer.get_parameter(name).param,
+                    )
+                )
+        Optimizer.update_objectives(
+            Objective(
+                name=f"pareto {method}",
+                desc="Scalarization of: "
+                + ", ".join(objective.name for objective in registered),
+                obj_func=cp.Minimize(combined),
+            )
+        )
+    return sim, registered
+
+
+def _solve_point(sim, registered, tickers, parameters: dict, solver=None) -> dict:
+    sim.set_parameters(parameters)
+    sim.optimize(solver)
+    allocation = sim._optimizer_variables["weights"].var.value
+    row = {"status": sim.status}
+    for objective in registered:
+        value = objective.obj_func.args[0].value if allocation is not None else None
+        row[objective.name] = np.nan if value is None else float(value)
+    if allocation is None:
+        allocation = np.full(len(tickers), np.nan)
+    row.update(zip(tickers, allocation))
+    return row
+
+
+def _solve_chunk(chunk: dict) -> List[dict]:
+    """Solve a contiguous run of grid points on one compiled problem."""
+    sim, registered = _build(
+        chunk["data"],
+        chunk["tickers"],
+        chunk["objectives"],
+        chunk["constraints"],
+        chunk["method"],
+        chunk["cpi"],
+    )
+    names = [objective.name for objective in registered]
+    senses = [_sense(objective) for objective in registered]
+    rows = []
+    for point in chunk["points"]:
+        parameters = {}
+        if chunk["method"] == "weighted-sum":
+            for name, weight, scale in zip(names, point["grid"], chunk["scales"]):
+                parameters[f"pareto weight: {name}"] = weight / scale
+        else:
+            parameters[f"pareto weight: {names[0]}"] = 1.0
+            for name, sense, bound in zip(names[1:], senses[1:], point["grid"]):
+                parameters[f"pareto epsilon: {name}"] = sense * bound
+        row = {"point": point["point"]}
+        row.update(zip(chunk["columns"], point["grid"]))
+        row.update(
+            _solve_point(sim, registered, chunk["tickers"], parameters, chunk["solver"])
+        )
+        rows.append(row)
+    return rows
+
+
+def simplex_grid(n_objectives: int, points: int) -> List[tuple]:
+    """Weight vectors summing to 1 with `points` levels per objective, in
+    lexicographic order so that consecutive vectors are neighbours."""
+    levels = range(points)
+    return [
+        tuple(i / (points - 1) for i in combination)
+        for combination in product(levels, repeat=n_objectives)
+        if sum(combination) == points - 1
+    ]
+
+
+def dominated(values: np.ndarray) -> np.ndarray:
+    """Rows of `values` (to minimize, NaN for failed points) that another row
+    is at least as good as in every column and better in one."""
+    valid = ~np.isnan(values).any(axis=1)
+    result = ~valid
+    for i in np.flatnonzero(valid):
+        others = values[valid]
+        no_worse = np.all(others <= values[i], axis=1)
+        better = np.any(others < values[i], axis=1)
+        result[i] = np.any(no_worse & better)
+    return result
+
+
+class ParetoFront:
+
+    def __init__(
+        self,
+        tickers: List[str],
+        objectives: Sequence[Step],
+        constraints: Sequence[Step] = (),
+        method: str = "weighted-sum",
+        points: int = 11,
+        input_date: str = None,
+        output_date: str = None,
+        data: pd.DataFrame = None,
+        solver: str = None,
+        cpi: CPI = None,
+    ):
+        """
+        Args:
+            objectives: at least two `set_objective` recipe steps. With the
+                epsilon method the first one is optimized and the others are
+                bounded.
+            constraints: `set_constraints` recipe steps applied at every point.
+            method: "weighted-sum" or "epsilon".
+            points: grid levels per objective: weights from 0 to 1 for the
+                weighted sum, bounds from best to worst for epsilon (with
+                more than two objectives the grid is their product).
+            data: price data in the `DataProcessor` layout; retrieved for
+                `input_date` - `output_date` if not given.
+            solver: cvxpy solver of every point, see `Optimizer.optimize`.
+            cpi: monthly CPI of recipe steps asking for real returns; loaded
+                if not given and a step needs it.
+        """
+        if method not in METHODS:
+            raise Exception(f"Unknown method {method}, expected one of {METHODS}.")
+        if len(objectives) < 2:
+            raise Exception("A Pareto front needs at least two objectives.")
+        if points < 2:
+            raise Exception("A Pareto front needs at least two points per objective.")
+        self.tickers = tickers
+        self.objectives = list(objectives)
+        self.constraints = list(constraints)
+        self.method = method
+        self.points = points
+        self.solver = solver
+        if data is None:
+            dp = DataProcessor(input_date, output_date)
+            dp.retrieve_price(tickers)
+            dp.refresh_dataframe()
+            data = dp.data
+        self.data = data
+        if cpi is None and any(map(is_real, self.objectives + self.constraints)):
+            cpi = DataProcessor(input_date, output_date).retrieve_cpi()
+        self.cpi = cpi
+        self.anchors = None
+        self.frontier = None
+
+    @classmethod
+    def efficient_frontier(
+        cls,
+        tickers: List[str],
+        points: int = 20,
+        covariance: str = "sample",
+        constraints: Sequence[Step] = ("keep_long_positions_only",),
+        input_date: str = None,
+        output_date: str = None,
+        data: pd.DataFrame = None,
+        solver: str = None,
+    ) -> "ParetoFront":
+        """Classic mean-variance frontier: minimize portfolio variance
+        (`get_portfolio_variance` with the `covariance` estimator) for targets
+        of average day-over-day return between the minimum-variance and the
+        maximum-return portfolio."""
+        return cls(
+            tickers,
+            objectives=[
+                ("minimize_classical_volatility", {"method": covariance}),
+                "maximize_avg_dod_return",
+            ],
+            constraints=constraints,
+            method="epsilon",
+            points=points,
+            input_date=input_date,
+            output_date=output_date,
+            data=data,
+            solver=solver,
+        )
+
+    def _solve_anchors(self) -> pd.DataFrame:
+        """Payoff table: each objective optimized alone (as a weighted sum with
+        one non-zero weight, so the problem is compiled once), with the value
+        of every objective and the sense (+1 minimize, -1 maximize) of each."""
+        sim, registered = _build(
+            self.data,
+            self.tickers,
+            self.objectives,
+            self.constraints,
+            "weighted-sum",
+            self.cpi,
+        )
+        names = [objective.name for objective in registered]
+        rows = []
+        for i, name in enumerate(names):
+            parameters = {
+                f"pareto weight: {other}": float(i == j)
+                for j, other in enumerate(names)
+            }
+            row = {"anchor": name, "sense": _sense(registered[i])}
+            row.update(
+                _solve_point(sim, registered, self.tickers, parameters, self.solver)
+            )
+            if row["status"] not in ("optimal", "optimal_inaccurate"):
+                raise Exception(f"Could not optimize {name} alone: {row['status']}.")
+            rows.append(row)
+        return pd.DataFrame(rows).set_index("anchor")
+
+    def run(self, max_workers: int = None) -> pd.DataFrame:
+        """Solve the anchors, then the grid on a process pool.
+
+        Returns:
+            The frontier, one row per grid point: the weights (or bounds) of
+            the point, solver status, the value of each objective, whether
+            another point dominates it, and the allocation of each ticker.
+        """
+        self.anchors = self._solve_anchors()
+        names = list(self.anchors.index)
+        senses = self.anchors["sense"].to_numpy()
+        payoff = self.anchors[names].to_numpy() * senses
+        best, worst = np.diag(payoff), payoff.max(axis=0)
+        if self.method == "weighted-sum":
+            grid = simplex_grid(len(names), self.points)
+            columns = [f"weight {name}" for name in names]
+            scales = np.where(worst - best > 0, worst - best, 1.0)
+        else:
+            axes = [
+                senses[j] * np.linspace(best[j], worst[j], self.points)
+                for j in range(1, len(names))
+            ]
+            grid = [tuple(map(float, bounds)) for bounds in product(*axes)]
+            columns = [f"epsilon {name}" for name in names[1:]]
+            scales = None
+        points = [{"point": i, "grid": g} for i, g in enumerate(grid)]
+        n_chunks = min(max_workers or os.cpu_count() or 1, len(points))
+        chunks = [
+            {
+                "data": self.data,
+                "tickers": self.tickers,
+                "objectives": self.objectives,
+                "constraints": self.constraints,
+                "method": self.method,
+                "columns": columns,
+                "scales": scales,
+                "solver": self.solver,
+                "cpi": self.cpi,
+                "points": [points[i] for i in indices],
+            }
+            for indices in np.array_split(np.arange(len(points)), n_chunks)
+        ]
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            rows = [
+                row for chunk in executor.map(_solve_chunk, chunks) for row in chunk
+            ]
+        frontier = pd.DataFrame(rows).set_index("point")
+        frontier.insert(
+            frontier.columns.get_loc(names[-1]) + 1,
+            "dominated",
+            dominated(frontier[names].to_numpy() * senses),
+        )
+        self.frontier = frontier
+        return frontier
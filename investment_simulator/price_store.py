@@ -0,0 +1,98 @@
+"""Typed columnar store for daily price data.
+
+Each ticker is kept as one `.npy` file per column under `DATA_DIR/store/<ticker>/`:
+a sorted `date.npy` (datetime64[D]) plus float64 `open`, `high`, `low`, `close`
+and `volume`. Columns are memory-mapped on read, so selecting a column and a
+date range only slices the mapped arrays instead of parsing the raw response.
+"""
+
+import json
+import os
+import tempfile
+import numpy as np
+from pathlib import Path
+from typing import Tuple, Union
+
+from investment_simulator import DATA_DIR
+
+COLUMNS = {
+    "1. open": "open",
+    "2. high": "high",
+    "3. low": "low",
+    "4. close": "close",
+    "5. volume": "volume",
+}
+
+
+class PriceStore:
+
+    def __init__(self, root: Union[str, Path] = DATA_DIR / "store"):
+        self.root = Path(root)
+
+    def _path(self, ticker: str, column: str) -> Path:
+        return self.root / ticker / f"{column}.npy"
+
+    def _write_column(self, ticker: str, column: str, values: np.ndarray):
+        # write to a uniquely named temporary file (threads and worker
+        # processes may ingest the same ticker) and rename, so readers never
+        # see a partially written column
+        path = self._path(ticker, column)
+        fd, tmp_path = tempfile.mkstemp(
+            dir=path.parent, prefix=f".{column}.", suffix=".tmp"
+        )
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, values)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+    def has(self, ticker: str) -> bool:
+        return self._path(ticker, "date").exists()
+
+    def is_stale(self, ticker: str, raw_path: Union[str, Path]) -> bool:
+        """Whether the raw JSON response is newer than the ingested columns."""
+        raw_path = Path(raw_path)
+        if not self.has(ticker):
+            return True
+        if not raw_path.exists():
+            return False
+        return raw_path.stat().st_mtime > self._path(ticker, "date").stat().st_mtime
+
+    def ingest(self, ticker: str, time_series: dict):
+        """Convert an Alpha Vantage "Time Series (Daily)" payload to columns."""
+        (self.root / ticker).mkdir(parents=True, exist_ok=True)
+        dates = np.array(list(time_series), dtype="datetime64[D]")
+        order = np.argsort(dates)
+        rows = list(time_series.values())
+        for key, column in COLUMNS.items():
+            values = np.array([row.get(key, np.nan) for row in rows], dtype=float)
+            self._write_column(ticker, column, values[order])
+        # the date column is written last and marks the ingestion as complete
+        self._write_column(ticker, "date", dates[order])
+
+    def ingest_json(self, ticker: str, raw_path: Union[str, Path]):
+        with open(raw_path, "r") as f:
+            self.ingest(ticker, json.loads(f.read())["Time Series (Daily)"])
+
+    def read(
+        self,
+        ticker: str,
+        column: str = "close",
+        min_date: str = None,
+        max_date: str = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Return (dates, values) of one column within [min_date, max_date].
+
+        Both arrays are read-only views of the memory-mapped files; the date
+        range is resolved by binary search on the sorted date column.
+        """
+        dates = np.load(self._path(ticker, "date"), mmap_mode="r")
+        values = np.load(self._path(ticker, column), mmap_mode="r")
+        start, stop = 0, len(dates)
+        if min_date:
+            start = np.searchsorted(dates, np.datetime64(min_date, "D"), "left")
+        if max_date:
+            stop = np.searchsorted(dates, np.datetime64(max_date, "D"), "right")
+        return dates[start:stop], values[start:stop]
@@ -0,0 +1,76 @@
+"""Declarative objective / constraint recipes.
+
+A recipe names functions of `set_objective` and `set_constraints` with their
+keyword arguments, so the same problem can be rebuilt on other data (e.g. in
+worker processes). Each entry is either a function name or a
+`(name, kwargs)` pair; `data` and `tickers` are filled in from the simulator,
+and `"real": True` asks for the real-return variant on the recipe's CPI:
+
+    objective = ("maximize_ema_return", {"smoothing_window": 100})
+    constraints = [
+        "keep_long_positions_only",
+        ("cap_maximal_drawdown_at_threshold", {"threshold": 0.2, "real": True}),
+    ]
+"""
+
+import inspect
+from typing import Sequence, Tuple, Union
+
+from investment_simulator import set_constraints
+from investment_simulator import set_objective
+from investment_simulator.inflation import CPI
+from investment_simulator.optimizer_object import Optimizer
+
+Step = Union[str, Tuple[str, dict]]
+
+
+def parse_step(step: Step) -> Tuple[str, dict]:
+    if isinstance(step, str):
+        return step, {}
+    name, kwargs = step
+    return name, dict(kwargs or {})
+
+
+def is_real(step: Step) -> bool:
+    return bool(parse_step(step)[1].get("real"))
+
+
+def apply_step(module, step: Step, data, tickers, cpi: CPI = None):
+    name, kwargs = parse_step(step)
+    func = getattr(module, name, None)
+    # only the module's own public functions, not names it imports (e.g. cp)
+    if (
+        name.startswith("_")
+        or not inspect.isfunction(func)
+        or func.__module__ != module.__name__
+    ):
+        raise Exception(f"Unknown {module.__name__.split('.')[-1]} function {name}.")
+    parameters = inspect.signature(func).parameters
+    if kwargs.pop("real", False):
+        if "cpi" not in parameters:
+            raise Exception(f"{name} has no real-return variant.")
+        if cpi is None:
+            raise Exception(f"{name} asks for real returns, but no CPI was given.")
+        kwargs["cpi"] = cpi
+    if "data" in parameters:
+        kwargs["data"] = data
+    if "tickers" in parameters:
+        kwargs["tickers"] = tickers
+    return func(**kwargs)
+
+
+def apply_recipe(
+    optimizer: Optimizer,
+    data,
+    tickers,
+    objective: Step,
+    constraints: Sequence[Step] = (),
+    cpi: CPI = None,
+):
+    """Register the recipe's objective and constraints on `optimizer`.
+    Constraints go first, so that metrics of the objective can rely on them
+    (e.g. the default big-M of exact % days needs long positions only)."""
+    with optimizer:
+        for step in constraints:
+            apply_step(set_constraints, step, data, tickers, cpi)
+        apply_step(set_objective, objective, data, tickers, cpi)
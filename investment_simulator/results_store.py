@@ -0,0 +1,371 @@
+"""SQLite store of optimization runs.
+
+One database holds every run with its allocation, numeric metric values,
+parameter values, constraint duals and metric time series, indexed for
+lookup by ticker, date range and objective. Runs get a random key, so
+concurrent runs never collide, and writes are batched into transactions.
+
+Time series are stored as float64 blobs next to the run's dates (Parquet
+would need pyarrow, which is not a dependency) and exported one series at a
+time, so exports never hold more than one series in memory.
+
+    store = ResultsStore()
+    store.write([build_record(sim)])
+    runs = store.find_runs(tickers=["IVV"], objective="maximize return")
+    store.export_series("series.csv", runs["id"])
+"""
+
+import csv
+import json
+import sqlite3
+import uuid
+from contextlib import closing
+from datetime import datetime
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from typing import Iterable, Iterator, List, Union
+
+from investment_simulator import DATA_DIR
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    run_key TEXT NOT NULL UNIQUE,
+    created TEXT NOT NULL,
+    tickers TEXT NOT NULL,
+    min_date TEXT,
+    max_date TEXT,
+    objective TEXT,
+    status TEXT,
+    value REAL,
+    dates BLOB,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS runs_objective ON runs (objective);
+CREATE INDEX IF NOT EXISTS runs_dates ON runs (min_date, max_date);
+CREATE TABLE IF NOT EXISTS run_tickers (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    ticker TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS run_tickers_ticker ON run_tickers (ticker, run_id);
+CREATE TABLE IF NOT EXISTS allocations (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    ticker TEXT NOT NULL,
+    weight REAL
+);
+CREATE INDEX IF NOT EXISTS allocations_run ON allocations (run_id);
+CREATE TABLE IF NOT EXISTS metrics (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS metrics_run ON metrics (run_id, name);
+CREATE INDEX IF NOT EXISTS metrics_name ON metrics (name, value);
+CREATE TABLE IF NOT EXISTS parameters (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS parameters_run ON parameters (run_id);
+CREATE TABLE IF NOT EXISTS constraints (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    dual REAL,
+    duals BLOB
+);
+CREATE INDEX IF NOT EXISTS constraints_run ON constraints (run_id);
+CREATE TABLE IF NOT EXISTS series (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    name TEXT NOT NULL,
+    "values" BLOB NOT NULL
+);
+CREATE INDEX IF NOT EXISTS series_run ON series (run_id, name);
+"""
+
+
+def _scalar(value):
+    """`value` as a float if it is a single number, else None."""
+    if value is None:
+        return None
+    value = np.asarray(value, dtype=float)
+    return float(value) if value.size == 1 else None
+
+
+def build_record(simulator, details: dict = None) -> dict:
+    """Collect a solved simulator's results as a plain (picklable) record for
+    `ResultsStore.write`.
+
+    Scalar metrics become metric values; metrics with one value per day
+    (e.g. simple return, drawdown) become time series.
+
+    Args:
+        details: extra JSON-serializable information kept with the run, e.g.
+            the recipe it was built from. The report's statistics are added.
+    """
+    dates = np.asarray(simulator.data.index, dtype="datetime64[D]")
+    weights = simulator._optimizer_variables["weights"].var.value
+    metrics, series = {}, {}
+    for name, metric in simulator._optimizer_metrics.items():
+        value = metric.get_value()
+        if value is None or isinstance(metric.expr, np.ndarray):
+            # unsolved, or constant data such as the covariance matrix
+            continue
+        value = np.asarray(value, dtype=float)
+        if value.size == 1:
+            metrics[name] = float(value)
+        elif value.ndim == 1 and len(dates) - 1 <= len(value) <= len(dates):
+            series[name] = value
+    constraints = {}
+    for name, constraint in simulator._optimizer_constraints.items():
+        dual = constraint.dual_value
+        constraints[name] = None if dual is None else np.asarray(dual, dtype=float)
+    objectives = list(simulator._optimizer_objectives)
+    details = dict(details or {})
+    details.setdefault("statistics", simulator.report.get("statistics", {}))
+    return {
+        "run_key": uuid.uuid4().hex,
+        "created": datetime.now().isoformat(),
+        "tickers": list(simulator.tickers),
+        "min_date": str(dates[0]) if len(dates) else None,
+        "max_date": str(dates[-1]) if len(dates) else None,
+        "objective": objectives[0] if objectives else None,
+        "status": simulator.status,
+        "value": _scalar(simulator.value),
+        "dates": dates.astype(np.int64),
+        "allocation": (
+            {} if weights is None else dict(zip(simulator.tickers, map(float, weights)))
+        ),
+        "metrics": metrics,
+        "parameters": {
+            name: _scalar(parameter())
+            for name, parameter in simulator._optimizer_parameters.items()
+        },
+        "constraints": constraints,
+        "series": series,
+        "details": details,
+    }
+
+
+class ResultsStore:
+
+    def __init__(
+        self,
+        path: Union[str, Path] = DATA_DIR / "output" / "results.sqlite",
+        timeout: float = 30,
+    ):
+        """
+        Args:
+            timeout: seconds to wait for another process's write transaction.
+        """
+        self.path = Path(path)
+        self.timeout = timeout
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with closing(self._connect()) as connection:
+            # write-ahead log: readers do not block the writer and vice versa
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        # one connection per call, so the store can be shared across threads
+        # and used from worker processes
+        return sqlite3.connect(self.path, timeout=self.timeout)
+
+    def _insert(self, connection: sqlite3.Connection, record: dict) -> int:
+        dual_rows = []
+        for name, dual in record["constraints"].items():
+            scalar = None if dual is None else _scalar(dual)
+            blob = None if dual is None or scalar is not None else dual.tobytes()
+            dual_rows.append((name, scalar, blob))
+        cursor = connection.execute(
+            "INSERT INTO runs (run_key, created, tickers, min_date, max_date, "
+            "objective, status, value, dates, details) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (
+                record["run_key"],
+                record["created"],
+                ",".join(record["tickers"]),
+                record["min_date"],
+                record["max_date"],
+                record["objective"],
+                record["status"],
+                record["value"],
+                np.asarray(record["dates"], dtype=np.int64).tobytes(),
+                json.dumps(record["details"], default=str),
+            ),
+        )
+        run_id = cursor.lastrowid
+        connection.executemany(
+            "INSERT INTO run_tickers VALUES (?, ?)",
+            [(run_id, ticker) for ticker in record["tickers"]],
+        )
+        for table, values in (
+            ("allocations", record["allocation"]),
+            ("metrics", record["metrics"]),
+            ("parameters", record["parameters"]),
+        ):
+            connection.executemany(
+                f"INSERT INTO {table} VALUES (?, ?, ?)",
+                [(run_id, name, value) for name, value in values.items()],
+            )
+        connection.executemany(
+            "INSERT INTO constraints VALUES (?, ?, ?, ?)",
+            [(run_id,) + row for row in dual_rows],
+        )
+        connection.executemany(
+            "INSERT INTO series VALUES (?, ?, ?)",
+            [
+                (run_id, name, np.asarray(values, dtype=float).tobytes())
+                for name, values in record["series"].items()
+            ],
+        )
+        return run_id
+
+    def write(self, records: Iterable[dict], batch_size: int = 500) -> List[int]:
+        """Insert records from `build_record`, `batch_size` runs per
+        transaction: a failing batch is rolled back as a whole.
+
+        Returns:
+            Ids of the inserted runs.
+        """
+        run_ids = []
+        with closing(self._connect()) as connection:
+            batch = []
+            for record in records:
+                batch.append(record)
+                if len(batch) == batch_size:
+                    with connection:
+                        run_ids += [self._insert(connection, r) for r in batch]
+                    batch = []
+            if batch:
+                with connection:
+                    run_ids += [self._insert(connection, r) for r in batch]
+        return run_ids
+
+    def _query(self, sql: str, parameters=()) -> pd.DataFrame:
+        with closing(self._connect()) as connection:
+            return pd.read_sql_query(sql, connection, params=list(parameters))
+
+    def find_runs(
+        self,
+        tickers: Iterable[str] = None,
+        min_date: str = None,
+        max_date: str = None,
+        objective: str = None,
+        status: str = None,
+        limit: int = None,
+    ) -> pd.DataFrame:
+        """Runs (newest first) over all of `tickers`, on data within
+        [min_date, max_date], optimizing `objective`."""
+        clauses, parameters = [], []
+        if tickers:
+            tickers = list(tickers)
+            clauses.append(
+                "id IN (SELECT run_id FROM run_tickers WHERE ticker IN "
+                f"({', '.join('?' * len(tickers))}) "
+                "GROUP BY run_id HAVING COUNT(DISTINCT ticker) = ?)"
+            )
+            parameters += tickers + [len(tickers)]
+        for clause, value in (
+            ("min_date >= ?", min_date),
+            ("max_date <= ?", max_date),
+            ("objective = ?", objective),
+            ("status = ?", status),
+        ):
+            if value is not None:
+                clauses.append(clause)
+                parameters.append(value)
+        sql = (
+            "SELECT id, run_key, created, tickers, min_date, max_date, objective, "
+            "status, value FROM runs"
+        )
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY id DESC"
+        if limit is not None:
+            sql += " LIMIT ?"
+            parameters.append(limit)
+        return self._query(sql, parameters)
+
+    def _run_table(self, table: str, columns: str, run_ids: Iterable[int]):
+        run_ids = [int(run_id) for run_id in run_ids]
+        return self._query(
+            f"SELECT run_id, {columns} FROM {table} "
+            f"WHERE run_id IN ({', '.join('?' * len(run_ids))})",
+            run_ids,
+        )
+
+    def allocations(self, run_ids: Iterable[int]) -> pd.DataFrame:
+        """One row per run, one column per ticker."""
+        table = self._run_table("allocations", "ticker, weight", run_ids)
+        return table.pivot(index="run_id", columns="ticker", values="weight")
+
+    def metrics(self, run_ids: Iterable[int]) -> pd.DataFrame:
+        """One row per run, one column per scalar metric."""
+        table = self._run_table("metrics", "name, value", run_ids)
+        return table.pivot(index="run_id", columns="name", values="value")
+
+    def parameters(self, run_ids: Iterable[int]) -> pd.DataFrame:
+        table = self._run_table("parameters", "name, value", run_ids)
+        return table.pivot(index="run_id", columns="name", values="value")
+
+    def duals(self, run_ids: Iterable[int]) -> pd.DataFrame:
+        """Scalar constraint duals; duals of vector constraints (one per day
+        or ticker) are kept as float64 blobs in the `duals` column."""
+        table = self._run_table("constraints", "name, dual", run_ids)
+        return table.pivot(index="run_id", columns="name", values="dual")
+
+    def iter_series(
+        self, run_ids: Iterable[int] = None, names: Iterable[str] = None
+    ) -> Iterator[pd.DataFrame]:
+        """Yield one metric time series at a time, as a frame of run id,
+        metric name, date and value. Series one day shorter than the data
+        (DoD returns) are dated from the second day."""
+        clauses, parameters = [], []
+        if run_ids is not None:
+            run_ids = [int(run_id) for run_id in run_ids]
+            clauses.append(f"series.run_id IN ({', '.join('?' * len(run_ids))})")
+            parameters += run_ids
+        if names is not None:
+            names = list(names)
+            clauses.append(f"series.name IN ({', '.join('?' * len(names))})")
+            parameters += names
+        sql = (
+            'SELECT series.run_id, series.name, series."values", runs.dates '
+            "FROM series JOIN runs ON runs.id = series.run_id"
+        )
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY series.run_id, series.name"
+        with closing(self._connect()) as connection:
+            for run_id, name, values, dates in connection.execute(sql, parameters):
+                values = np.frombuffer(values, dtype=float)
+                dates = np.frombuffer(dates, dtype=np.int64)[-len(values) :]
+                yield pd.DataFrame(
+                    {
+                        "run_id": run_id,
+                        "name": name,
+                        "date": np.datetime_as_string(dates.astype("datetime64[D]")),
+                        "value": values,
+                    }
+                )
+
+    def export_series(
+        self,
+        path: Union[str, Path],
+        run_ids: Iterable[int] = None,
+        names: Iterable[str] = None,
+    ) -> int:
+        """Stream metric time series to a CSV file (run_id, name, date, value).
+
+        Returns:
+            Number of rows written.
+        """
+        rows = 0
+        with open(path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["run_id", "name", "date", "value"])
+            for frame in self.iter_series(run_ids, names):
+                writer.writerows(frame.itertuples(index=False, name=None))
+                rows += len(frame)
+        return rows
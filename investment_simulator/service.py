@@ -0,0 +1,687 @@
+"""Long-running optimization service.
+
+Notebooks submit optimization jobs (tickers, dates and an objective /
+constraint recipe, see `recipe`) over local HTTP or a Unix socket instead of
+importing cvxpy, loading data and solving in their own process:
+
+    python -m investment_simulator.service --port 8765 --workers 4
+
+    client = ServiceClient("http://127.0.0.1:8765")
+    job = client.submit(
+        ["IVV", "QQQ"],
+        objective=("maximize_ema_return", {"smoothing_window": 100}),
+        constraints=["keep_long_positions_only"],
+        input_date="2020-01-01",
+    )
+    report = client.wait(job)["result"]
+
+Jobs wait in a bounded queue and run on a fixed pool of worker processes.
+Workers are long-lived: cvxpy is imported once, and each keeps the price data
+(and CPI) of its recent jobs in memory, so repeated jobs on the same tickers
+and dates skip data loading until the cached files are refreshed. A job is cancelled, or times out, by terminating
+the worker running it, which is then replaced.
+
+Endpoints (JSON bodies and responses):
+
+    POST /jobs              submit a job, 202 with its id (503 if the queue
+                            is full)
+    GET /jobs/<id>[?wait=s] the job, waiting up to s seconds for it to finish
+    DELETE /jobs/<id>       cancel a queued or running job
+    GET /stats              throughput, latency and queue counters
+    GET /health
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from multiprocessing.connection import wait as wait_connections
+from typing import List, Sequence
+from urllib.parse import parse_qsl, urlparse
+import numpy as np
+
+from investment_simulator import DATA_DIR
+from investment_simulator.recipe import Step, is_real
+
+FINISHED = ("done", "failed", "cancelled", "timeout")
+
+# price frames and CPI series each worker keeps in memory, with the revision
+# (see `_revision`) of the files they were loaded from
+_HOT_ENTRIES = 16
+_hot_data = OrderedDict()
+_hot_cpi = {}
+
+
+class QueueFull(Exception):
+    pass
+
+
+def _jsonable(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    return str(value)
+
+
+def _revision(names: Sequence[str]) -> tuple:
+    """Modification times of the cached responses of `names` (None if not
+    cached yet), so that in-memory data is reloaded once they are refreshed."""
+    revision = []
+    for name in names:
+        try:
+            revision.append((DATA_DIR / f"{name}.json").stat().st_mtime_ns)
+        except FileNotFoundError:
+            revision.append(None)
+    return tuple(revision)
+
+
+def _load_data(tickers: tuple, input_date, output_date, alignment):
+    from investment_simulator.data_processor import DataProcessor
+
+    key = (tickers, input_date, output_date, json.dumps(alignment, sort_keys=True))
+    if key in _hot_data and _hot_data[key][0] == _revision(tickers):
+        _hot_data.move_to_end(key)
+        return _hot_data[key][1], True
+    dp = DataProcessor(input_date, output_date, alignment=alignment)
+    dp.retrieve_price(list(tickers))
+    dp.refresh_dataframe()
+    # the revision after loading, which downloads missing tickers
+    _hot_data[key] = (_revision(tickers), dp.data)
+    _hot_data.move_to_end(key)
+    while len(_hot_data) > _HOT_ENTRIES:
+        _hot_data.popitem(last=False)
+    return dp.data, False
+
+
+def _load_cpi(input_date, output_date):
+    from investment_simulator.data_processor import DataProcessor
+
+    key = (input_date, output_date)
+    if key not in _hot_cpi or _hot_cpi[key][0] != _revision(["CPI"]):
+        cpi = DataProcessor(input_date, output_date).retrieve_cpi()
+        _hot_cpi[key] = (_revision(["CPI"]), cpi)
+    return _hot_cpi[key][1]
+
+
+def run_job(spec: dict) -> dict:
+    """Solve one job in the current process.
+
+    Returns:
+        The simulator report (see `InvestmentSimulator.generate_report`),
+        without allocation, metrics and constraints if no solution was found.
+    """
+    # imported here so the service process itself never loads cvxpy
+    from investment_simulator.recipe import apply_recipe
+    from investment_simulator.simulator import InvestmentSimulator
+
+    tickers = list(spec["tickers"])
+    start = time.perf_counter()
+    data, hot = _load_data(
+        tuple(tickers + [t for t in spec["benchmarks"] if t not in tickers]),
+        spec["input_date"],
+        spec["output_date"],
+        spec["alignment"],
+    )
+    load = time.perf_counter() - start
+    cpi = None
+    if any(map(is_real, [spec["objective"], *spec["constraints"]])):
+        cpi = _load_cpi(spec["input_date"], spec["output_date"])
+    sim = InvestmentSimulator(
+        tickers,
+        spec["input_date"],
+        spec["output_date"],
+        data=data,
+        frequency=spec["frequency"],
+        representative_days=spec["representative_days"],
+        cpi=cpi,
+    )
+    sim.record_time("data load", load)
+    apply_recipe(sim, sim.data, tickers, spec["objective"], spec["constraints"], cpi)
+    sim.optimize(spec["solver"])
+    if sim._optimizer_variables["weights"].var.value is None:
+        report = dict(sim.report, status=sim.status)
+    else:
+        sim.generate_report()
+        report = sim.report
+    report["data"] = {
+        "hot": hot,
+        "start": data.index[0],
+        "end": data.index[-1],
+        "days": len(sim.data),
+    }
+    # round-trip so the report only holds plain JSON types
+    return json.loads(json.dumps(report, default=_jsonable))
+
+
+def _worker_main(connection):
+    """Serve jobs received on `connection` until it sends None."""
+    # the service handles interrupts and terminates its workers itself
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    while True:
+        message = connection.recv()
+        if message is None:
+            break
+        job_id, spec = message
+        try:
+            connection.send((job_id, "done", run_job(spec)))
+        except Exception as e:
+            connection.send((job_id, "failed", f"{type(e).__name__}: {e}"))
+
+
+def parse_job(body: dict) -> dict:
+    """Validate a submitted job and fill in defaults.
+
+    Raises:
+        Exception: The job has no tickers or objective, or unknown fields.
+    """
+    fields = {
+        "tickers": None,
+        "objective": None,
+        "constraints": [],
+        "input_date": None,
+        "output_date": None,
+        "benchmarks": [],
+        "alignment": "inner",
+        "frequency": None,
+        "representative_days": None,
+        "solver": None,
+        "timeout": None,
+    }
+    unknown = set(body) - set(fields)
+    if unknown:
+        raise Exception(f"Unknown job fields: {sorted(unknown)}.")
+    spec = dict(fields, **body)
+    if not spec["tickers"] or not isinstance(spec["tickers"], list):
+        raise Exception("A job needs a list of tickers.")
+    if not spec["objective"]:
+        raise Exception("A job needs an objective.")
+    # recipe steps arrive as JSON lists
+    to_step = lambda step: step if isinstance(step, str) else tuple(step)
+    spec["objective"] = to_step(spec["objective"])
+    spec["constraints"] = [to_step(step) for step in spec["constraints"]]
+    return spec
+
+
+class _Worker:
+
+    def __init__(self, context):
+        self.connection, child = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child,), daemon=True)
+        self.process.start()
+        child.close()
+        self.job = None
+
+    def stop(self, terminate: bool = False):
+        if not terminate:
+            try:
+                self.connection.send(None)
+            except OSError:
+                pass
+            self.process.join(5)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join()
+        self.connection.close()
+
+
+class OptimizationService:
+
+    def __init__(
+        self,
+        host: str = "127.0.0.1",
+        port: int = 8765,
+        unix_socket: str = None,
+        workers: int = None,
+        max_queue: int = 100,
+        timeout: float = 300,
+        max_finished: int = 1000,
+    ):
+        """
+        Args:
+            port: 0 picks a free port. Ignored with `unix_socket`.
+            unix_socket: serve on this socket path instead of TCP.
+            workers: worker processes, defaults to the number of CPUs.
+            max_queue: jobs waiting for a worker; submissions beyond it are
+                rejected.
+            timeout: default seconds a job may run, once started.
+            max_finished: finished jobs kept for lookup, oldest dropped first.
+        """
+        self.unix_socket = unix_socket
+        self.n_workers = workers or os.cpu_count() or 1
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.queue = deque()
+        self.counters = {
+            "submitted": 0,
+            "rejected": 0,
+            "done": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "timeout": 0,
+            "worker restarts": 0,
+        }
+        self.latencies = deque(maxlen=1000)
+        self._finished_at = deque(maxlen=1000)
+        self._started = time.monotonic()
+        self._changed = threading.Condition()
+        self._stopping = False
+        # forked from a clean server process with the simulator preloaded, so
+        # workers start fast and never inherit the service's threads
+        self._context = multiprocessing.get_context("forkserver")
+        self._context.set_forkserver_preload(["investment_simulator.simulator"])
+        self._workers = []
+        self._dispatcher = None
+        if unix_socket is None:
+            self._server = ThreadingHTTPServer((host, port), self._handler())
+        else:
+            if os.path.exists(unix_socket):
+                os.unlink(unix_socket)
+            self._server = _ThreadingUnixHTTPServer(unix_socket, self._handler())
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        if self.unix_socket is not None:
+            return f"unix://{self.unix_socket}"
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    # jobs
+
+    def submit(self, body: dict) -> dict:
+        """Queue a job.
+
+        Raises:
+            Exception: The job is invalid, or the queue is full.
+        """
+        spec = parse_job(body)
+        with self._changed:
+            if len(self.queue) >= self.max_queue:
+                self.counters["rejected"] += 1
+                raise QueueFull(f"Queue is full ({self.max_queue} jobs).")
+            job = {
+                "id": uuid.uuid4().hex,
+                "status": "queued",
+                "submitted": time.time(),
+                "started": None,
+                "finished": None,
+                "spec": spec,
+                "result": None,
+                "error": None,
+            }
+            self.jobs[job["id"]] = job
+            self.queue.append(job["id"])
+            self.counters["submitted"] += 1
+            self._changed.notify_all()
+        return self.view(job["id"])
+
+    def view(self, job_id: str, wait: float = 0) -> dict:
+        """The job's current state, waiting up to `wait` seconds for it to
+        finish. None for unknown jobs."""
+        deadline = time.monotonic() + wait
+        with self._changed:
+            while True:
+                job = self.jobs.get(job_id)
+                if job is None:
+                    return None
+                remaining = deadline - time.monotonic()
+                if job["status"] in FINISHED or remaining <= 0:
+                    return dict(job)
+                self._changed.wait(remaining)
+
+    def cancel(self, job_id: str) -> dict:
+        """Cancel a queued job, or a running one by terminating its worker.
+        Finished jobs are left as they are. None for unknown jobs."""
+        with self._changed:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if job["status"] == "queued":
+                self.queue.remove(job_id)
+                self._finish(job, "cancelled", error="Cancelled while queued.")
+            elif job["status"] == "running":
+                for i, worker in enumerate(self._workers):
+                    if worker.job == job_id:
+                        self._replace(i)
+                self._finish(job, "cancelled", error="Cancelled while running.")
+            return dict(job)
+
+    def stats(self) -> dict:
+        with self._changed:
+            now = time.monotonic()
+            uptime = now - self._started
+            recent = [t for t in self._finished_at if now - t <= 60]
+            latencies = np.array(self.latencies, dtype=float)
+            running = sum(worker.job is not None for worker in self._workers)
+            stats = {
+                "uptime": uptime,
+                "workers": self.n_workers,
+                "running": running,
+                "queued": len(self.queue),
+                **self.counters,
+                "throughput": {
+                    "overall": self.counters["done"] / uptime if uptime else 0.0,
+                    "last minute": len(recent) / min(60.0, uptime) if uptime else 0.0,
+                },
+                "latency": {},
+            }
+        for phase in ("queue", "run", "total"):
+            if len(latencies):
+                column = latencies[:, ("queue", "run", "total").index(phase)]
+                stats["latency"][phase] = {
+                    "mean": float(column.mean()),
+                    "p50": float(np.percentile(column, 50)),
+                    "p95": float(np.percentile(column, 95)),
+                    "max": float(column.max()),
+                }
+        return stats
+
+    def _finish(self, job: dict, status: str, result=None, error=None):
+        # callers hold self._changed
+        job["status"] = status
+        job["finished"] = time.time()
+        job["result"] = result
+        job["error"] = error
+        self.counters[status] += 1
+        if status == "done":
+            started = job["started"]
+            self.latencies.append(
+                (
+                    started - job["submitted"],
+                    job["finished"] - started,
+                    job["finished"] - job["submitted"],
+                )
+            )
+            self._finished_at.append(time.monotonic())
+        finished = [i for i, j in self.jobs.items() if j["status"] in FINISHED]
+        for old in finished[: max(0, len(finished) - self.max_finished)]:
+            del self.jobs[old]
+        self._changed.notify_all()
+
+    # worker pool
+
+    def _replace(self, i: int):
+        """Terminate worker `i` (abandoning its job) and start a fresh one."""
+        self._workers[i].stop(terminate=True)
+        self._workers[i] = _Worker(self._context)
+        self.counters["worker restarts"] += 1
+
+    def _dispatch(self):
+        while True:
+            with self._changed:
+                if self._stopping:
+                    return
+                now = time.time()
+                for i, worker in enumerate(self._workers):
+                    job = self.jobs.get(worker.job)
+                    if job is None:
+                        continue
+                    timeout = job["spec"]["timeout"] or self.timeout
+                    if now - job["started"] > timeout:
+                        self._replace(i)
+                        self._finish(job, "timeout", error=f"Ran over {timeout}s.")
+                for worker in self._workers:
+                    if worker.job is None and self.queue:
+                        job = self.jobs[self.queue.popleft()]
+                        job["status"] = "running"
+                        job["started"] = time.time()
+                        worker.job = job["id"]
+                        worker.connection.send((job["id"], job["spec"]))
+                busy = [w.connection for w in self._workers if w.job is not None]
+            # wake up for results, and at least every 100ms for timeouts and
+            # new jobs
+            try:
+                ready = wait_connections(busy, timeout=0.1) if busy else []
+            except (OSError, ValueError):
+                # a worker was replaced (and its pipe closed) meanwhile
+                ready = []
+            for connection in ready:
+                try:
+                    job_id, status, outcome = connection.recv()
+                except (EOFError, OSError):
+                    continue
+                with self._changed:
+                    job = self.jobs.get(job_id)
+                    for worker in self._workers:
+                        if worker.connection is connection and worker.job == job_id:
+                            worker.job = None
+                    if job is None or job["status"] != "running":
+                        continue
+                    if status == "done":
+                        self._finish(job, "done", result=outcome)
+                    else:
+                        self._finish(job, "failed", error=outcome)
+            if not busy:
+                with self._changed:
+                    if not self.queue and not self._stopping:
+                        self._changed.wait(0.1)
+            self._revive()
+
+    def _revive(self):
+        """Replace workers that died (e.g. killed by the OOM killer)."""
+        with self._changed:
+            for i, worker in enumerate(self._workers):
+                if not worker.process.is_alive() and not self._stopping:
+                    job = self.jobs.get(worker.job)
+                    self._replace(i)
+                    if job is not None and job["status"] == "running":
+                        self._finish(job, "failed", error="Worker process died.")
+
+    # HTTP
+
+    def _handler(self):
+        service = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _respond(self, code: int, payload):
+                body = json.dumps(payload, default=_jsonable).encode()
+                self.send_response(code)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _job_id(self) -> str:
+                parts = urlparse(self.path).path.strip("/").split("/")
+                return parts[1] if len(parts) == 2 and parts[0] == "jobs" else None
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                if url.path == "/health":
+                    return self._respond(200, {"status": "ok"})
+                if url.path == "/stats":
+                    return self._respond(200, service.stats())
+                job_id = self._job_id()
+                if job_id is None:
+                    return self._respond(404, {"error": f"Unknown path {url.path}."})
+                query = dict(parse_qsl(url.query))
+                job = service.view(job_id, float(query.get("wait", 0)))
+                if job is None:
+                    return self._respond(404, {"error": f"Unknown job {job_id}."})
+                self._respond(200, job)
+
+            def do_POST(self):
+                if urlparse(self.path).path != "/jobs":
+                    return self._respond(404, {"error": f"Unknown path {self.path}."})
+                try:
+                    length = int(self.headers.get("Content-Length", 0))
+                    job = service.submit(json.loads(self.rfile.read(length)))
+                except QueueFull as e:
+                    return self._respond(503, {"error": str(e)})
+                except Exception as e:
+                    return self._respond(400, {"error": str(e)})
+                self._respond(202, job)
+
+            def do_DELETE(self):
+                job_id = self._job_id()
+                job = None if job_id is None else service.cancel(job_id)
+                if job is None:
+                    return self._respond(404, {"error": f"Unknown job {job_id}."})
+                self._respond(200, job)
+
+            def address_string(self):
+                # Unix socket clients have no address
+                return str(self.client_address[0]) if self.client_address else ""
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._workers = [_Worker(self._context) for _ in range(self.n_workers)]
+        self._dispatcher = threading.Thread(target=self._dispatch, daemon=True)
+        self._dispatcher.start()
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        with self._changed:
+            self._stopping = True
+            self._changed.notify_all()
+        self._dispatcher.join()
+        for worker in self._workers:
+            # running jobs are abandoned
+            worker.stop(terminate=worker.job is not None)
+        if self.unix_socket is not None and os.path.exists(self.unix_socket):
+            os.unlink(self.unix_socket)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+class _ThreadingUnixHTTPServer(
+    socketserver.ThreadingMixIn, socketserver.UnixStreamServer
+):
+    daemon_threads = True
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+
+    def __init__(self, path: str, timeout: float = None):
+        super().__init__("localhost", timeout=timeout)
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.path)
+
+
+class ServiceClient:
+
+    def __init__(self, url: str = "http://127.0.0.1:8765", timeout: float = 600):
+        """
+        Args:
+            url: "http://host:port", or "unix:///path/to/socket".
+            timeout: seconds to wait for each response.
+        """
+        self.url = urlparse(url)
+        self.timeout = timeout
+
+    def _request(self, method: str, path: str, body: dict = None) -> dict:
+        if self.url.scheme == "unix":
+            connection = _UnixHTTPConnection(self.url.path, self.timeout)
+        else:
+            connection = http.client.HTTPConnection(
+                self.url.hostname, self.url.port, timeout=self.timeout
+            )
+        try:
+            payload = None if body is None else json.dumps(body)
+            headers = {"Content-Type": "application/json"} if body is not None else {}
+            connection.request(method, path, payload, headers)
+            response = connection.getresponse()
+            result = json.loads(response.read())
+        finally:
+            connection.close()
+        if response.status >= 400:
+            raise Exception(f"{method} {path} failed ({response.status}): {result}")
+        return result
+
+    def submit(
+        self,
+        tickers: List[str],
+        objective: Step,
+        constraints: Sequence[Step] = (),
+        input_date: str = None,
+        output_date: str = None,
+        **options,
+    ) -> str:
+        """Queue a job and return its id. `options` are the other job fields:
+        benchmarks (extra tickers loaded for benchmark objectives), alignment,
+        frequency, representative_days, solver and timeout."""
+        job = {
+            "tickers": list(tickers),
+            "objective": objective,
+            "constraints": list(constraints),
+            "input_date": input_date,
+            "output_date": output_date,
+            **options,
+        }
+        return self._request("POST", "/jobs", job)["id"]
+
+    def get(self, job_id: str, wait: float = 0) -> dict:
+        return self._request("GET", f"/jobs/{job_id}?wait={wait}")
+
+    def wait(self, job_id: str, poll: float = 30) -> dict:
+        """Block until the job finishes, and return it."""
+        while True:
+            job = self.get(job_id, wait=poll)
+            if job["status"] in FINISHED:
+                return job
+
+    def cancel(self, job_id: str) -> dict:
+        return self._request("DELETE", f"/jobs/{job_id}")
+
+    def stats(self) -> dict:
+        return self._request("GET", "/stats")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="serve on this socket path instead")
+    parser.add_argument("--workers", type=int, help="defaults to the CPU count")
+    parser.add_argument("--max-queue", type=int, default=100)
+    parser.add_argument("--timeout", type=float, default=300, help="seconds per job")
+    args = parser.parse_args()
+    service = OptimizationService(
+        args.host,
+        args.port,
+        args.unix_socket,
+        args.workers,
+        args.max_queue,
+        args.timeout,
+    )
+    stopped = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stopped.set())
+    with service:
+        print(f"Serving on {service.url} with {service.n_workers} workers\n")
+        try:
+            stopped.wait()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,237 +1,314 @@
+from typing import Callable
+import cvxpy as cp
 from investment_simulator import get_ts_metrics as ts
 from investment_simulator import get_agg_metrics as agg
+from investment_simulator.inflation import CPI
 from investment_simulator.optimizer_object import Constraint, Optimizer
+from investment_simulator.set_variables import set_threshold
 
 
 def keep_long_positions_only() -> Constraint:
     constraint = Constraint(
         name=f"keep long positions only",
         desc=f"Keep long positions only.",
-        cons_expr=Optimizer._optimizer_variables["weights"].var >= 0,
+        cons_expr=Optimizer.get_variable("weights").var >= 0,
     )
     Optimizer.update_constraints(constraint)
     return constraint
 
 
-def keep_return_above_threshold(data, tickers, threshold: float) -> Constraint:
-    nominal_return = ts.get_simple_return(data, tickers)
-    final_return = agg.get_final_point_value(nominal_return)
+def _threshold_constraint(
+    name: str,
+    desc: str,
+    threshold: float,
+    cons_expr: Callable[[cp.Parameter], cp.Expression],
+    cpi: CPI,
+) -> Constraint:
+    """Register constraint `name`, bounded by a threshold parameter of the
+    same name (see `set_threshold`). The name holds no value, so it stays true
+    when sweeps change the threshold, but tells constraints of a kind apart
+    (benchmark, smoothing window); `desc` shows the current value through
+    `{threshold}`.
+
+    Args:
+        cons_expr: builds the constraint from the threshold parameter.
+    """
+    name = ts.real_name(name, cpi)
+    parameter = set_threshold(name, threshold)
     constraint = Constraint(
-        name=f"keep return above {threshold:.2%}",
-        desc=f"Ensure nominal return exceeds {threshold:.2%} on output date.",
-        cons_expr=final_return.expr >= threshold,
+        name=name,
+        desc=ts.real_desc(desc, cpi),
+        cons_expr=cons_expr(parameter.param),
+        threshold=parameter,
     )
     Optimizer.update_constraints(constraint)
     return constraint
 
 
-def keep_avg_return_above_threshold(data, tickers, threshold: float) -> Constraint:
-    nominal_return = ts.get_simple_return(data, tickers)
+def keep_return_above_threshold(
+    data, tickers, threshold: float, cpi: CPI = None
+) -> Constraint:
+    nominal_return = ts.get_simple_return(data, tickers, cpi=cpi)
+    final_return = agg.get_final_point_value(nominal_return)
+    return _threshold_constraint(
+        "keep return above threshold",
+        "Ensure nominal return exceeds {threshold:.2%} on output date.",
+        threshold,
+        lambda bound: final_return.expr >= bound,
+        cpi,
+    )
+
+
+def keep_avg_return_above_threshold(
+    data, tickers, threshold: float, cpi: CPI = None
+) -> Constraint:
+    nominal_return = ts.get_simple_return(data, tickers, cpi=cpi)
     avg_return = agg.get_historical_avg(nominal_return)
-    constraint = Constraint(
-        name=f"keep average return above {threshold:.2%}",
-        desc=f"Ensure average historical return (arithmetic mean) exceeds {threshold:.2%}.",
-        cons_expr=avg_return.expr >= threshold,
+    return _threshold_constraint(
+        "keep average return above threshold",
+        "Ensure average historical return (arithmetic mean) exceeds {threshold:.2%}.",
+        threshold,
+        lambda bound: avg_return.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_ema_return_above_threshold(
-    data, tickers, smoothing_window: int, threshold: float
+    data, tickers, smoothing_window: int, threshold: float, cpi: CPI = None
 ) -> Constraint:
-    nominal_return = ts.get_simple_return(data, tickers)
+    nominal_return = ts.get_simple_return(data, tickers, cpi=cpi)
     ema_return = agg.get_ema_weighted_avg(nominal_return, smoothing_window)
-    constraint = Constraint(
-        name=f"keep ema return above {threshold:.2%}",
-        desc=f"Ensure the exponential moving average of nominal return exceeds {threshold:.2%}.",
-        cons_expr=ema_return.expr >= threshold,
+    return _threshold_constraint(
+        f"keep ema return above threshold (smoothing window {smoothing_window})",
+        "Ensure the exponential moving average of nominal return exceeds {threshold:.2%}.",
+        threshold,
+        lambda bound: ema_return.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
-def keep_avg_dod_return_above_threshold(data, tickers, threshold: float) -> Constraint:
-    dod_return = ts.get_dod_return(data, tickers)
+def keep_avg_dod_return_above_threshold(
+    data, tickers, threshold: float, cpi: CPI = None
+) -> Constraint:
+    dod_return = ts.get_dod_return(data, tickers, cpi=cpi)
     avg_return = agg.get_historical_avg(dod_return)
-    constraint = Constraint(
-        name=f"keep dod return above {threshold:.2%}",
-        desc=f"Ensure average day-over-day return exceeds {threshold:.2%}",
-        cons_expr=avg_return.expr >= threshold,
+    return _threshold_constraint(
+        "keep dod return above threshold",
+        "Ensure average day-over-day return exceeds {threshold:.2%}",
+        threshold,
+        lambda bound: avg_return.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_ema_dod_return_above_threshold(
-    data, tickers, smoothing_window: int, threshold: float
+    data, tickers, smoothing_window: int, threshold: float, cpi: CPI = None
 ) -> Constraint:
-    dod_return = ts.get_dod_return(data, tickers)
+    dod_return = ts.get_dod_return(data, tickers, cpi=cpi)
     ema_return = agg.get_ema_weighted_avg(dod_return, smoothing_window)
-    constraint = Constraint(
-        name=f"keep ema dod return above {threshold:.2%}",
-        desc=f"Ensure the exponential moving average of day-over-day return exceeds {threshold:.2%}.",
-        cons_expr=ema_return.expr >= threshold,
+    return _threshold_constraint(
+        f"keep ema dod return above threshold (smoothing window {smoothing_window})",
+        "Ensure the exponential moving average of day-over-day return exceeds {threshold:.2%}.",
+        threshold,
+        lambda bound: ema_return.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_return_against_benchmark_above_threshold(
-    data, tickers, benchmark, threshold: float
+    data, tickers, benchmark, threshold: float, cpi: CPI = None
 ) -> Constraint:
-    delta = ts.get_return_against_benchmark(data, tickers, benchmark)
+    delta = ts.get_return_against_benchmark(data, tickers, benchmark, cpi=cpi)
     final_return = agg.get_final_point_value(delta)
-    constraint = Constraint(
-        name=f"keep return against {benchmark} above {threshold:.2%}",
-        desc=f"Ensure the nominal return on output date is {threshold:.2%} greater than benchmark return ({benchmark})",
-        cons_expr=final_return.expr >= threshold,
+    return _threshold_constraint(
+        f"keep return against {benchmark} above threshold",
+        f"Ensure the nominal return on output date is {{threshold:.2%}} greater than benchmark return ({benchmark})",
+        threshold,
+        lambda bound: final_return.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_avg_return_against_benchmark_above_threshold(
-    data, tickers, benchmark, threshold: float
+    data, tickers, benchmark, threshold: float, cpi: CPI = None
 ) -> Constraint:
-    delta = ts.get_return_against_benchmark(data, tickers, benchmark)
+    delta = ts.get_return_against_benchmark(data, tickers, benchmark, cpi=cpi)
     avg_return = agg.get_historical_avg(delta)
-    constraint = Constraint(
-        name=f"keep average return against {benchmark} above {threshold:.2%}",
-        desc=f"Ensure the nominal return (arithmetic mean) is {threshold:.2%} greater than benchmark return ({benchmark}) on average.",
-        cons_expr=avg_return.expr >= threshold,
+    return _threshold_constraint(
+        f"keep average return against {benchmark} above threshold",
+        f"Ensure the nominal return (arithmetic mean) is {{threshold:.2%}} greater than benchmark return ({benchmark}) on average.",
+        threshold,
+        lambda bound: avg_return.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_ema_return_against_benchmark_above_threshold(
-    data, tickers, smoothing_window: int, benchmark, threshold: float
+    data, tickers, smoothing_window: int, benchmark, threshold: float, cpi: CPI = None
 ) -> Constraint:
-    delta = ts.get_return_against_benchmark(data, tickers, benchmark)
+    delta = ts.get_return_against_benchmark(data, tickers, benchmark, cpi=cpi)
     final_return = agg.get_ema_weighted_avg(delta, smoothing_window)
-    constraint = Constraint(
-        name=f"keep ema return against {benchmark} above {threshold:.2%}",
-        desc=f"Ensure the exponential moving average of return against benchmark (nominal return minus benchmark return) exceeds {threshold:.2%}.",
-        cons_expr=final_return.expr >= threshold,
+    return _threshold_constraint(
+        f"keep ema return against {benchmark} above threshold "
+        f"(smoothing window {smoothing_window})",
+        "Ensure the exponential moving average of return against benchmark (nominal return minus benchmark return) exceeds {threshold:.2%}.",
+        threshold,
+        lambda bound: final_return.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_percent_outperforming_days_above_threshold(
-    data, tickers, benchmark, threshold: float
+    data,
+    tickers,
+    benchmark,
+    threshold: float,
+    backend: str = "surrogate",
+    margin: float = None,
+    big_m: float = None,
+    cpi: CPI = None,
 ) -> Constraint:
-    delta = ts.get_return_against_benchmark(data, tickers, benchmark)
-    percent_days = agg.get_percent_outperforming_days(delta)
-    constraint = Constraint(
-        name=f"keep % outperforming days above {threshold:.2%} (return against {benchmark})",
-        desc=f"Ensure % days where nominal return outperforms benchmark return ({benchmark}) exceeds {threshold:.2%}.",
-        cons_expr=percent_days.expr >= threshold,
+    """See `get_agg_metrics.PercentDaysMetric` for the backends; `margin`
+    applies to the surrogate one and `big_m` to the exact one."""
+    delta = ts.get_return_against_benchmark(data, tickers, benchmark, cpi=cpi)
+    percent_days = agg.get_percent_outperforming_days(
+        delta, backend=backend, margin=margin, big_m=big_m
+    )
+    return _threshold_constraint(
+        f"keep % outperforming days above threshold (return against {benchmark})",
+        f"Ensure % days where nominal return outperforms benchmark return ({benchmark}) exceeds {{threshold:.2%}}.",
+        threshold,
+        lambda bound: percent_days.expr >= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
-def cap_maximal_loss_at_threshold(data, tickers, threshold: float) -> Constraint:
-    nominal_return = ts.get_simple_return(data, tickers)
+def cap_maximal_loss_at_threshold(
+    data, tickers, threshold: float, cpi: CPI = None
+) -> Constraint:
+    nominal_return = ts.get_simple_return(data, tickers, cpi=cpi)
     min_return = agg.get_historical_min(nominal_return)
-    constraint = Constraint(
-        name=f"cap maximal loss at {threshold:.2%}",
-        desc=f"Ensure maximal loss does not exceed {threshold:.2%}.",
-        cons_expr=min_return.expr >= -threshold,
+    return _threshold_constraint(
+        "cap maximal loss at threshold",
+        "Ensure maximal loss does not exceed {threshold:.2%}.",
+        threshold,
+        lambda bound: min_return.expr >= -bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
-def cap_maximal_dod_loss_at_threshold(data, tickers, threshold: float) -> Constraint:
-    dod_return = ts.get_dod_return(data, tickers)
+def cap_maximal_dod_loss_at_threshold(
+    data, tickers, threshold: float, cpi: CPI = None
+) -> Constraint:
+    dod_return = ts.get_dod_return(data, tickers, cpi=cpi)
     min_dod_return = agg.get_historical_min(dod_return)
-    constraint = Constraint(
-        name=f"cap maximal single-day loss at {threshold:.2%}",
-        desc=f"Ensure maximal single-day loss does not exceed {threshold:.2%}.",
-        cons_expr=min_dod_return.expr >= -threshold,
+    return _threshold_constraint(
+        "cap maximal single-day loss at threshold",
+        "Ensure maximal single-day loss does not exceed {threshold:.2%}.",
+        threshold,
+        lambda bound: min_dod_return.expr >= -bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
-def cap_maximal_drawdown_at_threshold(data, tickers, threshold: float) -> Constraint:
-    drawdown = ts.get_drawdown(data, tickers)
-    max_drawdown = agg.get_historical_max(drawdown)
-    constraint = Constraint(
-        name=f"cap maximal drawdown at {threshold:.2%}",
-        desc=f"Ensure maximal drawdown does not exceed {threshold:.2%}.",
-        cons_expr=max_drawdown.expr <= threshold,
+def cap_maximal_drawdown_at_threshold(
+    data, tickers, threshold: float, engine: str = "cummax", cpi: CPI = None
+) -> Constraint:
+    max_drawdown = agg.get_maximal_drawdown(data, tickers, engine=engine, cpi=cpi)
+    return _threshold_constraint(
+        "cap maximal drawdown at threshold",
+        "Ensure maximal drawdown does not exceed {threshold:.2%}.",
+        threshold,
+        lambda bound: max_drawdown.expr <= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
-def cap_avg_drawdown_at_threshold(data, tickers, threshold: float) -> Constraint:
-    drawdown = ts.get_drawdown(data, tickers)
+def cap_avg_drawdown_at_threshold(
+    data, tickers, threshold: float, cpi: CPI = None
+) -> Constraint:
+    drawdown = ts.get_drawdown(data, tickers, cpi=cpi)
     avg_drawdown = agg.get_historical_avg(drawdown)
-    constraint = Constraint(
-        name=f"cap average drawdown at {threshold:.2%}",
-        desc=f"Ensure average drawdown does not exceed {threshold:.2%}.",
-        cons_expr=avg_drawdown.expr <= threshold,
+    return _threshold_constraint(
+        "cap average drawdown at threshold",
+        "Ensure average drawdown does not exceed {threshold:.2%}.",
+        threshold,
+        lambda bound: avg_drawdown.expr <= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def cap_ema_drawdown_at_threshold(
-    data, tickers, smoothing_window: int, threshold: float
+    data, tickers, smoothing_window: int, threshold: float, cpi: CPI = None
 ) -> Constraint:
-    drawdown = ts.get_drawdown(data, tickers)
+    drawdown = ts.get_drawdown(data, tickers, cpi=cpi)
     ema_drawdown = agg.get_ema_weighted_avg(drawdown, smoothing_window)
-    constraint = Constraint(
-        name=f"cap ema drawdown at {threshold:.2%}",
-        desc=f"Ensure the exponential moving average of drawdown does not exceed {threshold:.2%}.",
-        cons_expr=ema_drawdown.expr <= threshold,
+    return _threshold_constraint(
+        f"cap ema drawdown at threshold (smoothing window {smoothing_window})",
+        "Ensure the exponential moving average of drawdown does not exceed {threshold:.2%}.",
+        threshold,
+        lambda bound: ema_drawdown.expr <= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def cap_percent_underperforming_days_at_threshold(
-    data, tickers, benchmark, threshold: float
+    data,
+    tickers,
+    benchmark,
+    threshold: float,
+    backend: str = "surrogate",
+    margin: float = None,
+    big_m: float = None,
+    cpi: CPI = None,
 ) -> Constraint:
-    delta = ts.get_return_against_benchmark(data, tickers, benchmark)
-    percent_days = agg.get_percent_underperforming_days(delta)
-    constraint = Constraint(
-        name=f"cap % underperforming days (return against {benchmark})",
-        desc=f"Ensure the % days where nominal return underperforms against benchmark return does not exceed {threshold:.2%}.",
-        cons_expr=percent_days.expr <= threshold,
+    """See `get_agg_metrics.PercentDaysMetric` for the backends; `margin`
+    applies to the surrogate one and `big_m` to the exact one."""
+    delta = ts.get_return_against_benchmark(data, tickers, benchmark, cpi=cpi)
+    percent_days = agg.get_percent_underperforming_days(
+        delta, backend=backend, margin=margin, big_m=big_m
+    )
+    return _threshold_constraint(
+        f"cap % underperforming days at threshold (return against {benchmark})",
+        "Ensure the % days where nominal return underperforms against benchmark return does not exceed {threshold:.2%}.",
+        threshold,
+        lambda bound: percent_days.expr <= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_ema_deviation_below_threshold(
-    data, tickers, smoothing_window: int, threshold: float
+    data, tickers, smoothing_window: int, threshold: float, cpi: CPI = None
 ) -> Constraint:
-    nominal_return = ts.get_simple_return(data, tickers)
+    nominal_return = ts.get_simple_return(data, tickers, cpi=cpi)
     ema_deviation = agg.get_ema_deviation(nominal_return, smoothing_window)
-    constraint = Constraint(
-        name=f"keep ema deviation below {threshold:.2%}",
-        desc=f"Ensure the degree to which nominal return deviates from exponential moving average does not exceed {threshold:.2%}.",
-        cons_expr=ema_deviation.expr <= threshold,
+    return _threshold_constraint(
+        f"keep ema deviation below threshold (smoothing window {smoothing_window})",
+        "Ensure the degree to which nominal return deviates from exponential moving average does not exceed {threshold:.2%}.",
+        threshold,
+        lambda bound: ema_deviation.expr <= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
 
 
 def keep_portfolio_variance_below_threshold(
-    data, tickers, threshold: float
+    data,
+    tickers,
+    threshold: float,
+    method: str = "sample",
+    smoothing_window: int = 60,
+    n_factors: int = 5,
+    cpi: CPI = None,
 ) -> Constraint:
-    covariance_matrix = ts.get_covariance_matrix(data, tickers)
+    """See `get_ts_metrics.get_covariance_matrix` for the estimators."""
+    covariance_matrix = ts.get_covariance_matrix(
+        data, tickers, method, smoothing_window, n_factors, cpi=cpi
+    )
     volatility = agg.get_portfolio_variance(covariance_matrix)
-    constraint = Constraint(
-        name=f"keep portfolio variance below {threshold:.2%}",
-        desc=f"Ensure total portfolio variance (quadratic form of covariance) does not exceed {threshold}.",
-        cons_expr=volatility.expr <= threshold,
+    return _threshold_constraint(
+        f"keep portfolio variance below threshold ({method} covariance)",
+        "Ensure total portfolio variance (quadratic form of covariance) does not exceed {threshold:g}.",
+        threshold,
+        lambda bound: volatility.expr <= bound,
+        cpi,
     )
-    Optimizer.update_constraints(constraint)
-    return constraint
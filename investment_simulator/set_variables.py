@@ -3,64 +3,84 @@ from typing import List
 from investment_simulator.optimizer_object import (
     Constraint,
     Metric,
+    Parameter,
     Variable,
     Optimizer,
 )
 
 
 def set_weights(tickers: List[str]):
-    weights = Optimizer._optimizer_metrics.get("weights")
-    if not weights:
+    weights = Optimizer.active()._optimizer_variables.get("weights")
+    if weights:
+        Optimizer.get_weights(tickers)
+    else:
         # add weights optimizer
-        Optimizer.update_variables(
-            Variable(
-                name="weights",
-                desc="Portfolio allocation % for each ticker",
-                dim=len(tickers),
-            )
+        weights = Variable(
+            name="weights",
+            desc="Portfolio allocation % for each ticker",
+            dim=len(tickers),
         )
+        # checked by `Optimizer.get_weights` whenever a metric is built
+        weights.tickers = list(tickers)
+        Optimizer.update_variables(weights)
         # ensure portfolio shares sum to 100%
         Optimizer.update_constraints(
             Constraint(
                 name="sum(shares)==1",
                 desc="ensure portfolio shares sum to 100%",
-                cons_expr=cp.sum(Optimizer._optimizer_variables["weights"].var) == 1,
+                cons_expr=cp.sum(Optimizer.get_variable("weights").var) == 1,
             )
         )
 
 
-def set_ema(return_metric: Metric, window: int):
-    ema = Optimizer._optimizer_metrics.get("ema")
+def set_threshold(name: str, threshold: float) -> Parameter:
+    # register the threshold of a constraint as a parameter named after the
+    # constraint, which carries no value (e.g. "cap maximal drawdown at
+    # threshold"), so sweeps can update it without recompiling
+    Optimizer.update_parameters(
+        Parameter(
+            name=name,
+            desc=f"Threshold of constraint '{name}'.",
+            value=threshold,
+        )
+    )
+    return Optimizer.get_parameter(name)
+
+
+def set_ema(return_metric: Metric, window: int) -> cp.Variable:
+    # one ema variable per series and window, so several ema metrics can
+    # share a problem
+    name = f"ema: {return_metric.name}, {window}"
+    ema = Optimizer.active()._optimizer_variables.get(name)
     if not ema:
         # add ema variables to optimizer
         Optimizer.update_variables(
             Variable(
-                name="ema",
-                desc="Exponential moving average of portfolio return",
+                name=name,
+                desc=f"Exponential moving average of {return_metric.name}",
                 dim=return_metric.expr.size,
             )
         )
         # define constraints for ema variables
         alpha = 2 / (window + 1)
-        base_case = (
-            Optimizer._optimizer_variables["ema"].var[0] == return_metric.expr[0]
-        )
+        base_case = Optimizer.get_variable(name).var[0] == return_metric.expr[0]
         Optimizer.update_constraints(
             Constraint(
-                name="Recursively assign ema: base case",
+                name=f"Recursively assign {name}: base case",
                 desc="Assign first value of ema to be the first value of the time series.",
                 cons_expr=base_case,
             )
         )
         recursive_case = (
-            Optimizer._optimizer_variables["ema"].var[1:]
+            Optimizer.get_variable(name).var[1:]
             == alpha * return_metric.expr[1:]
-            + (1 - alpha) * Optimizer._optimizer_variables["ema"].var[:-1]
+            + (1 - alpha) * Optimizer.get_variable(name).var[:-1]
         )
         Optimizer.update_constraints(
             Constraint(
-                name="recursively assign ema: recursive case",
+                name=f"recursively assign {name}: recursive case",
                 desc="Assign each subsequent value of ema to be a weighted average of the current value and the previous ema.",
                 cons_expr=recursive_case,
             )
         )
+    return Optimizer.get_variable(name).var
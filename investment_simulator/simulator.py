@@ -1,12 +1,16 @@
 import re
-from datetime import datetime
-import json
+from itertools import product
+import time
+import numpy as np
 import pandas as pd
-from typing import List
-from investment_simulator import DATA_DIR
+from typing import Dict, Iterable, List, Tuple, Union
 from investment_simulator.data_processor import DataProcessor
+from investment_simulator.evaluate import PER_PERIOD_SERIES, BatchEvaluator
+from investment_simulator.inflation import CPI
 from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.results_store import ResultsStore, build_record
 from investment_simulator.set_variables import set_weights
+from investment_simulator.solve_cache import SolveCache
 
 
 class InvestmentSimulator(Optimizer):
@@ -16,15 +20,62 @@ class InvestmentSimulator(Optimizer):
         tickers: List[str],
         input_date: str = None,
         output_date: str = None,
+        data: pd.DataFrame = None,
+        frequency: str = None,
+        representative_days: Union[int, List[str]] = None,
+        alignment: Union[str, int, Dict[str, Union[str, int]]] = "inner",
+        solve_cache: SolveCache = None,
+        cpi: CPI = None,
     ):
+        """
+        Args:
+            data: price data already in the `DataProcessor` layout (dates as
+                index, one column per ticker). Skips data retrieval, e.g. for
+                slices of a dataset loaded once.
+            frequency: optimize on prices resampled to this pandas period
+                (e.g. "W" or "M"), keeping the last trading day of each
+                period. Much smaller problems over long histories.
+            representative_days: optimize on a subset of days instead: either
+                explicit dates, or a number of buckets from each of which the
+                highest and lowest close of every ticker is kept, so that
+                peaks and troughs driving drawdowns survive the reduction.
+            alignment: missing-data policy of retrieved tickers, see
+                `DataProcessor`.
+            solve_cache: restore problems solved before from this cache
+                instead of solving them again, see `SolveCache`.
+            cpi: monthly CPI for real-return metrics. Loaded on first use of
+                `sim.cpi` if not given.
+
+        With a reduced time axis, `data` holds the reduced prices and
+        `full_data` the daily ones; the report then gets a "fidelity" section
+        comparing the allocation's metrics on both.
+        """
         super().__init__()
+        self.solve_cache = solve_cache
         set_weights(tickers)
         self.tickers = tickers
         self.input_date = input_date
         self.output_date = output_date
-        self.data = self._retrieve_data()
+        self.frequency = frequency
+        self.representative_days = representative_days
+        self.alignment = alignment
+        self._cpi = cpi
+        start = time.perf_counter()
+        self.full_data = self._retrieve_data() if data is None else data
+        self.data = self._reduce_time_axis(self.full_data)
+        self.record_time("data load", time.perf_counter() - start)
         self.report = self._initialize_report()
 
+    def clear(self):
+        """Clear registered objectives, constraints and metrics, keeping the
+        simulator ready for the next problem on the same tickers."""
+        data_load = self.timings.get("data load")
+        super().clear()
+        if data_load is not None:
+            self.record_time("data load", data_load)
+        with self:
+            set_weights(self.tickers)
+
     def _initialize_report(self):
         return {
             "status": None,
@@ -34,15 +85,117 @@ class InvestmentSimulator(Optimizer):
             "allocation": {},
             "metrics": {},
             "constraints": {},
+            "parameters": {},
+            "statistics": {},
         }
 
     def _retrieve_data(self) -> pd.DataFrame:
-        dp = DataProcessor(self.input_date, self.output_date)
+        dp = DataProcessor(self.input_date, self.output_date, alignment=self.alignment)
         dp.retrieve_price(self.tickers)
-        dp.retrieve_cpi()
         dp.refresh_dataframe()
         return dp.data
 
+    @property
+    def cpi(self) -> CPI:
+        """Monthly CPI, e.g. `so.maximize_return(sim.data, sim.tickers,
+        cpi=sim.cpi)` for real returns. Loaded once, on first use."""
+        if self._cpi is None:
+            dp = DataProcessor(self.input_date, self.output_date)
+            self._cpi = dp.retrieve_cpi()
+        return self._cpi
+
+    @property
+    def is_reduced(self) -> bool:
+        return self.frequency is not None or self.representative_days is not None
+
+    def _reduce_time_axis(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Rows of `data` kept for optimization. The first and last day are
+        always kept, so returns are measured from the same initial state and
+        up to the same return date as on the full series."""
+        if not self.is_reduced:
+            return data
+        if self.frequency is not None and self.representative_days is not None:
+            raise Exception("Use either frequency or representative_days, not both.")
+        length = len(data)
+        keep = {0, length - 1}
+        if self.frequency is not None:
+            periods = pd.to_datetime(data.index).to_period(self.frequency)
+            is_last = np.append(periods[1:] != periods[:-1], True)
+            keep.update(np.flatnonzero(is_last))
+        elif isinstance(self.representative_days, int):
+            prices = data[self.tickers].to_numpy()
+            # missing prices of ragged tickers never mark a peak or trough
+            highs = np.where(np.isnan(prices), -np.inf, prices)
+            lows = np.where(np.isnan(prices), np.inf, prices)
+            for bucket in np.array_split(np.arange(length), self.representative_days):
+                if len(bucket):
+                    keep.update(bucket[highs[bucket].argmax(axis=0)])
+                    keep.update(bucket[lows[bucket].argmin(axis=0)])
+        else:
+            missing = set(self.representative_days) - set(data.index)
+            if missing:
+                raise Exception(f"Dates not in data: {sorted(missing)}.")
+            keep.update(data.index.get_indexer(self.representative_days))
+        return data.iloc[sorted(keep)]
+
+    def _evaluate_reduced_and_full(
+        self, weights: np.ndarray, benchmark: str, window: int
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        scale = len(self.full_data) / len(self.data)
+        return tuple(
+            BatchEvaluator(
+                data,
+                self.tickers,
+                smoothing_window=window and max(1, round(window * factor)),
+                benchmark=benchmark,
+            ).evaluate(weights)
+            for data, factor in ((self.data, 1), (self.full_data, scale))
+        )
+
+    def generate_fidelity_report(self) -> dict:
+        """Re-evaluate the allocation on the full daily series.
+
+        Metrics registered on the reduced problem are recomputed with
+        `BatchEvaluator` on both the reduced and the daily prices, each with
+        the benchmark and smoothing window it was built with; "drift" is the
+        daily value minus the reduced one. Only horizon-level metrics
+        (returns, drawdown and return against a benchmark, measured from the
+        initial state) are compared: per-period ones (see
+        `PER_PERIOD_SERIES`) would compare e.g. weekly with daily returns.
+        Smoothing windows are counted in reduced periods, so they are scaled
+        to days (rounded, at least one) for the daily series.
+        """
+        weights = self._optimizer_variables["weights"].var.value
+        if weights is None:
+            return {}
+        evaluations = {}
+        metrics = {}
+        for name, metric in self._optimizer_metrics.items():
+            group = (
+                metric.arguments.get("benchmark"),
+                metric.arguments.get("smoothing_window"),
+            )
+            if group not in evaluations:
+                evaluations[group] = self._evaluate_reduced_and_full(weights, *group)
+            reduced, full = evaluations[group]
+            name = metric.arguments.get("evaluated as", name)
+            if name in reduced and not name.startswith(PER_PERIOD_SERIES):
+                metrics[name] = (reduced[name].iloc[0], full[name].iloc[0])
+        if not metrics:
+            reduced, full = self._evaluate_reduced_and_full(weights, None, None)
+            metrics = {
+                name: (reduced[name].iloc[0], full[name].iloc[0])
+                for name in reduced
+                if not name.startswith(PER_PERIOD_SERIES)
+            }
+        return {
+            "days": {"reduced": len(self.data), "full": len(self.full_data)},
+            "metrics": {
+                name: {"reduced": reduced, "full": full, "drift": full - reduced}
+                for name, (reduced, full) in metrics.items()
+            },
+        }
+
     def generate_allocation(self):
         allocation = self._optimizer_variables["weights"].var.value
         allocation_dic = {}
@@ -52,9 +205,9 @@ class InvestmentSimulator(Optimizer):
         return allocation_dic
 
     def generate_report(self):
-        self.report["status"] = self.problem.status
+        self.report["status"] = self.status
         self.report["tickers"] = self.tickers
-        self.report["value"] = self.problem.value
+        self.report["value"] = self.value
         self.report["allocation"] = self.generate_allocation()
         for obj in self._optimizer_objectives:
             self.report["objective"] = str(self._optimizer_objectives[obj])
@@ -63,8 +216,57 @@ class InvestmentSimulator(Optimizer):
                 self.report["metrics"][met] = str(self._optimizer_metrics[met])
         for con in self._optimizer_constraints:
             self.report["constraints"][con] = str(self._optimizer_constraints[con])
+        for par in self._optimizer_parameters:
+            self.report["parameters"][par] = self._optimizer_parameters[par]()
+        self.report["statistics"] = {
+            "timings": dict(self.timings),
+            "solver": dict(self.solver_stats),
+            "problem": self.problem_statistics(),
+        }
+        if self.is_reduced:
+            self.report["fidelity"] = self.generate_fidelity_report()
+
+    def sweep(self, grid: Dict[str, Iterable[float]]) -> pd.DataFrame:
+        """Re-solve the registered problem over a grid of parameter values.
+
+        The problem is compiled once; each grid point only updates parameter
+        values and re-solves with warm start. Parameter values are restored
+        once the sweep is done.
+
+        Args:
+            grid: parameter name (e.g. the name of a threshold constraint) to
+                the values to try. Multiple parameters are swept over their
+                cartesian product.
+
+        Returns:
+            One row per grid point with parameter values, solver status,
+            objective value and the allocation of each ticker.
+        """
+        names = list(grid)
+        original = {name: self._optimizer_parameters[name]() for name in names}
+        rows = []
+        try:
+            for values in product(*grid.values()):
+                self.set_parameters(dict(zip(names, values)))
+                self.optimize()
+                allocation = self._optimizer_variables["weights"].var.value
+                if allocation is None:
+                    allocation = np.full(len(self.tickers), np.nan)
+                row = dict(zip(names, values))
+                row["status"] = self.status
+                row["value"] = self.value
+                row.update(zip(self.tickers, allocation))
+                rows.append(row)
+        finally:
+            self.set_parameters(original)
+        return pd.DataFrame(rows)
+
+    def save_report(self, store: ResultsStore = None) -> int:
+        """Save optimized results to a `ResultsStore` (by default
+        `DATA_DIR/output/results.sqlite`), after `generate_report`.
 
-    def save_report(self):
-        """Save optimized results."""
-        with open(f"{DATA_DIR}/output/{datetime.now()}.json", "w") as f:
-            f.write(json.dumps(self.report, indent=4))
+        Returns:
+            Id of the run in the store.
+        """
+        store = ResultsStore() if store is None else store
+        return store.write([build_record(self)])[0]
@@ -0,0 +1,113 @@
+"""Cache of solved optimization problems.
+
+Solutions are keyed by `Optimizer.fingerprint`, which hashes the keys of the
+registered metrics (and with them fingerprints of the data slices they were
+built from), the objective, constraint and variable names, the parameter
+values and the solver. A hit restores the variable values, constraint duals,
+status and objective value without compiling or solving the problem; metric
+values follow from the restored variables. Since the data is part of the key,
+updated prices key new entries rather than invalidating old ones.
+
+Entries are kept in memory up to `max_entries` (least recently used evicted
+first) and written as JSON under `DATA_DIR/cache/solves/`, so they survive
+the process. A cache can be shared by threads, and its directory by
+processes.
+
+    sim = InvestmentSimulator(tickers, solve_cache=SolveCache())
+"""
+
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Union
+
+from investment_simulator import DATA_DIR
+
+
+class SolveCache:
+
+    def __init__(
+        self,
+        root: Union[str, Path] = DATA_DIR / "cache" / "solves",
+        max_entries: int = 256,
+    ):
+        """
+        Args:
+            root: directory of the disk entries, None to keep entries in
+                memory only.
+            max_entries: number of solutions kept in memory.
+        """
+        self.root = None if root is None else Path(root)
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.root / f"{key}.json"
+
+    def _load(self, key: str) -> Optional[dict]:
+        if self.root is None:
+            return None
+        try:
+            with open(self._path(key), "r") as f:
+                return json.loads(f.read())
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+
+    def _remember(self, key: str, entry: dict):
+        # callers hold `_lock`
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def get(self, key: str) -> Optional[dict]:
+        """The cached solution of `key`, None on a miss."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            entry = self._load(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+            self.hits += 1
+        return entry["solution"]
+
+    def put(self, key: str, solution: dict):
+        """Cache a solution, see `Optimizer._solution` for its layout."""
+        entry = {"solution": solution}
+        with self._lock:
+            self._remember(key, entry)
+        if self.root is not None:
+            # write to a temporary file and rename, so concurrent readers
+            # never see a partially written entry
+            self.root.mkdir(parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.root, prefix=f".{key}.")
+            try:
+                with os.fdopen(fd, "w") as f:
+                    f.write(json.dumps(entry, default=float))
+                os.replace(tmp_path, self._path(key))
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+    def discard(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.root is not None:
+            self._path(key).unlink(missing_ok=True)
+
+    def clear(self):
+        """Drop every entry, in memory and on disk."""
+        with self._lock:
+            self._entries.clear()
+        if self.root is not None and self.root.exists():
+            for path in self.root.glob("*.json"):
+                path.unlink(missing_ok=True)
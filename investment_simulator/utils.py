@@ -1,31 +1,297 @@
+import hashlib
+import threading
+from collections import OrderedDict
 import numpy as np
 import pandas as pd
+from sklearn.covariance import LedoitWolf
+from investment_simulator.dataset import Dataset, to_days
+from investment_simulator.inflation import CPI
+from typing import Callable, Dict, Hashable, List, Union
 
 
-def get_initial_array(sorted_df: pd.DataFrame) -> np.ndarray:
-    return sorted_df.iloc[0, :].to_numpy()
+def get_initial_array(sorted_df: Union[pd.DataFrame, Dataset]) -> np.ndarray:
+    """First value of each column; for ragged columns (missing until the
+    ticker's first observation) the first observed value."""
+    values = sorted_df.to_numpy()
+    initial = values[0]
+    if not np.isnan(initial).any():
+        return initial
+    first = np.argmax(~np.isnan(values), axis=0)
+    return values[first, np.arange(values.shape[1])]
 
 
-def get_final_array(sorted_df: pd.DataFrame) -> np.ndarray:
-    return sorted_df.iloc[-1, :].to_numpy()
+def mask_missing(returns: np.ndarray) -> np.ndarray:
+    """Zero returns where prices are missing, i.e. before a ragged ticker's
+    first observation: money allocated to it earns nothing until then."""
+    returns[np.isnan(returns)] = 0
+    return returns
+
+
+def get_final_array(sorted_df: Union[pd.DataFrame, Dataset]) -> np.ndarray:
+    return sorted_df.to_numpy()[-1]
 
 
-def get_percent_change_against_initial_state(sorted_df: pd.DataFrame) -> np.ndarray:
+def get_percent_change_against_initial_state(
+    sorted_df: Union[pd.DataFrame, Dataset]
+) -> np.ndarray:
     initial_value = get_initial_array(sorted_df)
     returns = (sorted_df.to_numpy() - initial_value) / initial_value
-    return returns
+    return mask_missing(returns)
 
 
-def get_percent_change_over_time(sorted_df: pd.DataFrame) -> np.ndarray:
-    return np.diff(sorted_df.to_numpy(), axis=0) / sorted_df.to_numpy()[:-1, :]
+def get_percent_change_over_time(sorted_df: Union[pd.DataFrame, Dataset]) -> np.ndarray:
+    values = sorted_df.to_numpy()
+    return mask_missing(np.diff(values, axis=0) / values[:-1, :])
 
 
-def get_covariance_matrix(sorted_df: pd.DataFrame) -> np.ndarray:
+def get_covariance_matrix(sorted_df: Union[pd.DataFrame, Dataset]) -> np.ndarray:
     dod_returns = get_percent_change_over_time(sorted_df).T
     return np.cov(dod_returns)
 
 
+def get_ledoit_wolf_covariance(sorted_df: Union[pd.DataFrame, Dataset]) -> np.ndarray:
+    """Sample covariance of DoD returns shrunk towards a scaled identity;
+    well-conditioned even when tickers outnumber days."""
+    dod_returns = get_percent_change_over_time(sorted_df)
+    return LedoitWolf().fit(dod_returns).covariance_
+
+
+def get_ewma_covariance(
+    sorted_df: Union[pd.DataFrame, Dataset], window: int
+) -> np.ndarray:
+    """Covariance of DoD returns with weights decaying by `1 - 2 / (window + 1)`
+    per day into the past, so recent days count more."""
+    dod_returns = get_percent_change_over_time(sorted_df)
+    alpha = 2 / (window + 1)
+    weights = (1 - alpha) ** np.arange(len(dod_returns) - 1, -1, -1, dtype=float)
+    weights /= weights.sum()
+    centered = dod_returns - weights @ dod_returns
+    return centered.T @ (centered * weights[:, None])
+
+
+def get_factor_model(
+    sorted_df: Union[pd.DataFrame, Dataset], n_factors: int
+) -> np.ndarray:
+    """Statistical (PCA) factor model of the covariance of DoD returns,
+    `loadings @ loadings.T + diag(idiosyncratic ** 2)`.
+
+    Returns:
+        N x (n_factors + 1) array: the loadings on the `n_factors` leading
+        principal components, then the idiosyncratic volatility of each
+        ticker.
+    """
+    dod_returns = get_percent_change_over_time(sorted_df)
+    centered = (dod_returns - dod_returns.mean(axis=0)) / np.sqrt(len(dod_returns) - 1)
+    _, singular_values, components = np.linalg.svd(centered, full_matrices=False)
+    n_factors = min(n_factors, len(singular_values))
+    loadings = components[:n_factors].T * singular_values[:n_factors]
+    residual = np.sum(centered**2, axis=0) - np.sum(loadings**2, axis=1)
+    return np.column_stack([loadings, np.sqrt(np.maximum(residual, 0))])
+
+
 def inflation_rate(cpi_data: pd.DataFrame) -> np.ndarray:
     initial_cpi = get_initial_array(cpi_data)
     inflation = (cpi_data - initial_cpi) / initial_cpi
     return inflation
+
+
+def deflate(sorted_df: Union[pd.DataFrame, Dataset], cpi: CPI) -> Dataset:
+    """Prices in money of the first date: every row scaled by the CPI
+    deflator of its date, broadcast across tickers."""
+    if isinstance(sorted_df, Dataset):
+        values, dates, tickers = sorted_df.values, sorted_df.dates, sorted_df.tickers
+    else:
+        values = sorted_df.to_numpy(dtype=float)
+        dates, tickers = to_days(sorted_df.index), list(sorted_df.columns)
+    return Dataset(values * cpi.deflator(dates)[:, None], dates, tickers)
+
+
+def get_ema_weights(length: int, window: int) -> np.ndarray:
+    """Weights `c` such that `c @ x` is the last value of the exponential moving
+    average of `x` (seeded with `x[0]`), with smoothing `2 / (window + 1)`."""
+    alpha = 2 / (window + 1)
+    weights = alpha * (1 - alpha) ** np.arange(length - 1, -1, -1, dtype=float)
+    weights[0] = (1 - alpha) ** (length - 1)
+    return weights
+
+
+def get_drawdown_episodes(path: np.ndarray, k: int = 1) -> np.ndarray:
+    """Return the `k` deepest drawdown episodes of a return path, one per
+    running peak, as rows of (peak index, trough index, depth)."""
+    running_max = np.maximum.accumulate(path)
+    drawdown = running_max - path
+    positions = np.arange(path.size)
+    peak = np.maximum.accumulate(np.where(path >= running_max, positions, 0))
+    order = np.argsort(-drawdown, kind="stable")
+    # deepest trough for each running peak
+    _, first = np.unique(peak[order], return_index=True)
+    troughs = order[first]
+    troughs = troughs[np.argsort(-drawdown[troughs], kind="stable")][:k]
+    return np.column_stack([peak[troughs], troughs, drawdown[troughs]])
+
+
+ALIGNMENT_POLICIES = ("inner", "ragged")
+
+
+def align_frames(
+    frames: List[pd.DataFrame],
+    policy: Union[str, int] = "inner",
+    policies: Dict[str, Union[str, int]] = None,
+) -> pd.DataFrame:
+    """Align frames on the union of their date indexes in a single pass, then
+    apply each column's missing-data policy:
+
+        "inner": drop dates where the column is missing.
+        k (int): forward-fill up to k consecutive missing dates, then drop
+            dates still missing.
+        "ragged": keep dates before the column's first observation, as NaN
+            (returns are masked to 0 there, see `mask_missing`); drop later
+            missing dates.
+
+    Args:
+        policy: policy of columns not in `policies`.
+        policies: policy per column (ticker).
+    """
+    # factorize all dates at once (hashing, no repeated joins), then write
+    # each frame into its rows of the union: one copy of every value
+    codes, dates = pd.factorize(np.concatenate([f.index.to_numpy() for f in frames]))
+    order = np.argsort(dates)
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+    index = pd.Index(dates[order])
+    columns = [column for frame in frames for column in frame.columns]
+    values = np.full((len(index), len(columns)), np.nan)
+    start, position = 0, 0
+    for frame in frames:
+        rows = rank[codes[start : start + len(frame)]]
+        values[rows, position : position + frame.shape[1]] = frame.to_numpy(dtype=float)
+        start += len(frame)
+        position += frame.shape[1]
+    data = pd.DataFrame(values, index=index, columns=columns)
+    policies = {column: (policies or {}).get(column, policy) for column in data.columns}
+    for column, value in policies.items():
+        if value not in ALIGNMENT_POLICIES and not (
+            isinstance(value, int) and value >= 0
+        ):
+            raise Exception(
+                f"Unknown alignment policy {value} for {column}, expected one of "
+                f"{ALIGNMENT_POLICIES} or a forward-fill limit in days."
+            )
+    limits = {}
+    for column, value in policies.items():
+        if isinstance(value, int) and value > 0:
+            limits.setdefault(value, []).append(column)
+    for limit, columns in limits.items():
+        data[columns] = data[columns].ffill(limit=limit)
+    missing = data.isna().to_numpy()
+    ragged = np.array([policies[column] == "ragged" for column in data.columns])
+    if ragged.any():
+        started = np.logical_or.accumulate(~missing, axis=0)
+        missing = missing & (started | ~ragged)
+    return data[~missing.any(axis=1)]
+
+
+def get_fingerprint(
+    data: Union[pd.DataFrame, Dataset], tickers: Union[str, List[str]]
+) -> str:
+    """Content hash of the `tickers` columns of `data`, including the dates.
+
+    Memoized for a `Dataset`, whose prices are read-only. A DataFrame can be
+    edited in place, so it is hashed on every call (about 2 ms for 50 tickers
+    x 5000 days); wrap large panels in a `Dataset` to skip that."""
+    if isinstance(data, Dataset):
+        return data.fingerprint(tickers)
+    tickers = [tickers] if isinstance(tickers, str) else tickers
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(repr((list(tickers), len(data))).encode())
+    digest.update(to_days(data.index.to_numpy()).tobytes())
+    for ticker in tickers:
+        digest.update(np.ascontiguousarray(data[ticker].to_numpy(float)).tobytes())
+    return digest.hexdigest()
+
+
+class DerivedSeriesCache:
+    """Thread-safe LRU cache of arrays derived from price data, bounded by the
+    total size of the cached arrays."""
+
+    def __init__(self, max_bytes: int = 256 * 2**20):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, compute: Callable[[], np.ndarray]) -> np.ndarray:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        value = compute()
+        # cached arrays are shared between callers
+        value.setflags(write=False)
+        with self._lock:
+            if key not in self._entries and value.nbytes <= self.max_bytes:
+                self._entries[key] = value
+                self._bytes += value.nbytes
+                while self._bytes > self.max_bytes:
+                    _, evicted = self._entries.popitem(last=False)
+                    self._bytes -= evicted.nbytes
+                    self.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.hits = self.misses = self.evictions = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+
+derived_series_cache = DerivedSeriesCache()
+
+
+def get_derived_array(
+    func: Callable[..., np.ndarray],
+    data: Union[pd.DataFrame, Dataset],
+    tickers: Union[str, List[str]],
+    *args: Hashable,
+    cpi: CPI = None,
+) -> np.ndarray:
+    """Return `func(data[tickers], *args)` from `derived_series_cache`.
+
+    Entries are keyed by the function and its extra arguments, a fingerprint
+    of the selected data, the ticker tuple and the date range, so repeated
+    metrics on the same data share one read-only array instead of
+    recomputing it. With `cpi`, `func` gets the deflated prices (see
+    `deflate`) and the entry is keyed by the CPI series as well.
+    """
+    tickers = [tickers] if isinstance(tickers, str) else list(tickers)
+    dates = data.dates if isinstance(data, Dataset) else data.index
+    key = (
+        func.__name__,
+        get_fingerprint(data, tickers),
+        tuple(tickers),
+        (dates[0], dates[-1]) if len(data) else None,
+    ) + args
+    if cpi is None:
+        return derived_series_cache.get(key, lambda: func(data[tickers], *args))
+    key += ("real", cpi.fingerprint())
+    return derived_series_cache.get(
+        key, lambda: func(deflate(data[tickers], cpi), *args)
+    )
@@ -0,0 +1,19 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+def synthetic_panel(n_tickers: int = 5, n_days: int = 300, seed: int = 0):
+    """Geometric random walks in the `DataProcessor` layout."""
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(3e-4, 1e-2, size=(n_days, n_tickers))
+    prices = 100 * np.cumprod(1 + returns, axis=0)
+    dates = pd.bdate_range("2015-01-01", periods=n_days).strftime("%Y-%m-%d")
+    return pd.DataFrame(
+        prices, index=dates, columns=[f"T{i}" for i in range(n_tickers)]
+    )
+
+
+@pytest.fixture
+def panel():
+    return synthetic_panel()
@@ -0,0 +1,23 @@
+import pytest
+
+from investment_simulator.backtest import WalkForwardBacktest
+
+
+def _backtest(panel, **kwargs) -> WalkForwardBacktest:
+    return WalkForwardBacktest(
+        ["T0", "T1"], "maximize_return", train_window=100, data=panel, **kwargs
+    )
+
+
+def test_step_beyond_the_test_window_is_rejected(panel):
+    with pytest.raises(Exception, match="exceeds the test window"):
+        _backtest(panel, test_window=20, step=30)
+
+
+@pytest.mark.parametrize("step", [None, 10])
+def test_test_windows_cover_every_day_after_training(panel, step):
+    folds = _backtest(panel, test_window=20, step=step).folds()
+    held = set()
+    for fold in folds:
+        held.update(fold["test"].index[1 : (step or 20) + 1])
+    assert held == set(panel.index[100:])
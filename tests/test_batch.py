@@ -0,0 +1,109 @@
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from investment_simulator.batch import load_spec, recorded_runs
+from investment_simulator.mock_api import daily_payload
+
+SPEC = """
+defaults:
+  input_date: 2019-01-01
+  output_date: "2019-12-31"
+  constraints: [keep_long_positions_only]
+simulations:
+  - name: ema
+    tickers: [AAA, BBB]
+    objective: {maximize_ema_return: {smoothing_window: 20}}
+  - tickers: [AAA, BBB]
+    objective: minimize_maximal_drawdown
+    constraints:
+      - keep_long_positions_only
+      - [cap_maximal_loss_at_threshold, {threshold: 0.5}]
+"""
+
+
+def test_spec_defaults_and_step_forms(tmp_path):
+    path = tmp_path / "spec.yaml"
+    path.write_text(SPEC)
+    ema, drawdown = load_spec(path)
+    assert ema["name"] == "ema" and drawdown["name"] is None
+    assert ema["job"]["input_date"] == "2019-01-01"
+    assert ema["job"]["objective"] == ("maximize_ema_return", {"smoothing_window": 20})
+    assert ema["job"]["constraints"] == ["keep_long_positions_only"]
+    assert drawdown["job"]["constraints"][1] == (
+        "cap_maximal_loss_at_threshold",
+        {"threshold": 0.5},
+    )
+    # the same simulations as JSON have the same keys
+    spec = {
+        "simulations": [
+            {
+                "name": "ema",
+                "tickers": ["AAA", "BBB"],
+                "input_date": "2019-01-01",
+                "output_date": "2019-12-31",
+                "objective": ["maximize_ema_return", {"smoothing_window": 20}],
+                "constraints": ["keep_long_positions_only"],
+            }
+        ]
+    }
+    (tmp_path / "spec.json").write_text(json.dumps(spec))
+    assert load_spec(tmp_path / "spec.json")[0]["key"] == ema["key"]
+
+
+def test_invalid_simulations_are_named(tmp_path):
+    path = tmp_path / "spec.json"
+    path.write_text(json.dumps({"simulations": [{"name": "x", "tickers": ["A"]}]}))
+    with pytest.raises(Exception, match="Simulation x: A job needs an objective"):
+        load_spec(path)
+    path.write_text(json.dumps({"simulations": []}))
+    with pytest.raises(Exception, match="has no simulations"):
+        load_spec(path)
+
+
+def test_partial_last_line_is_dropped(tmp_path):
+    path = tmp_path / "runs.jsonl"
+    done = {"key": "a", "error": None}
+    failed = {"key": "b", "error": "Exception: no"}
+    path.write_text(json.dumps(done) + "\n" + json.dumps(failed) + '\n{"key": "c", ')
+    assert set(recorded_runs(path)) == {"a", "b"}
+    assert path.read_text().count("\n") == 2
+    assert set(recorded_runs(path, retry_failed=True)) == {"a"}
+
+
+def _batch(tmp_path, *args: str) -> subprocess.CompletedProcess:
+    # workers read prices from the data directory in the environment
+    env = dict(os.environ, INVESTMENT_SIMULATOR_DATA_DIR=str(tmp_path))
+    return subprocess.run(
+        [sys.executable, "-m", "investment_simulator.batch", *args],
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+
+
+def test_batch_runs_resume_from_the_output(tmp_path):
+    for seed, ticker in enumerate(["AAA", "BBB"]):
+        payload = daily_payload(ticker, "2019-01-01", "2019-12-31", seed=seed)
+        (tmp_path / f"{ticker}.json").write_text(json.dumps(payload))
+    spec = tmp_path / "spec.yaml"
+    spec.write_text(
+        SPEC + "  - tickers: [AAA, BBB]\n    objective: maximize_happiness\n"
+    )
+    output = tmp_path / "runs.jsonl"
+    completed = _batch(tmp_path, str(spec), "--output", str(output), "--workers", "2")
+    # one simulation fails, so the batch does
+    assert completed.returncode == 1, completed.stderr
+    records = [json.loads(line) for line in output.read_text().splitlines()]
+    statuses = sorted(record["status"] for record in records)
+    assert statuses == ["failed", "optimal", "optimal"]
+    days = [r["result"]["data"]["days"] for r in records if r["error"] is None]
+    assert days == [len(payload["Time Series (Daily)"])] * 2
+    completed = _batch(tmp_path, str(spec), "--output", str(output))
+    assert "0 runs to go, 3 recorded" in completed.stderr
+    completed = _batch(tmp_path, str(spec), "--output", str(output), "--retry-failed")
+    assert "1 runs to go, 2 recorded" in completed.stderr
+    assert len(output.read_text().splitlines()) == 4
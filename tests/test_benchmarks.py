@@ -0,0 +1,44 @@
+import inspect
+import json
+import os
+import subprocess
+import sys
+
+from investment_simulator import REPO_DIR
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+
+
+def _suite(*args: str) -> str:
+    env = dict(os.environ, PYTHONPATH=str(REPO_DIR))
+    completed = subprocess.run(
+        [sys.executable, "benchmarks/suite.py", *args],
+        cwd=REPO_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return completed.stdout
+
+
+def _functions(module) -> set:
+    return {
+        name
+        for name, func in inspect.getmembers(module, inspect.isfunction)
+        if func.__module__ == module.__name__ and not name.startswith("_")
+    }
+
+
+def test_suite_runs_every_objective_and_constraint(tmp_path):
+    output = tmp_path / "results.json"
+    _suite("--tickers", "3", "--days", "80", "--no-memory", "--output", str(output))
+    results = json.loads(output.read_text())["results"]
+    assert {row["status"] for row in results} == {"optimal"}
+    assert {row["objective"] for row in results} == _functions(so)
+    constraints = {name for row in results for name in row["constraints"]}
+    # long positions only is part of every case
+    assert constraints == _functions(sc) - {"keep_long_positions_only"}
+    assert all(row["build_s"] >= 0 and row["solver_s"] >= 0 for row in results)
+    table = _suite("--compare", str(output), str(output))
+    assert "total_s ratio" in table
@@ -0,0 +1,180 @@
+import json
+from datetime import date
+
+import pytest
+import requests
+
+from investment_simulator import data_retriever
+from investment_simulator.data_retriever import DataRetriever
+from investment_simulator.mock_api import MockAlphaVantage, daily_payload, macro_payload
+
+TODAY = date(2024, 6, 28)
+
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_retriever, "DATA_DIR", tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def api():
+    payloads = {
+        "SPY": daily_payload("SPY", end=TODAY.isoformat()),
+        "CPI": macro_payload("CPI"),
+        "INFLATION": macro_payload("INFLATION"),
+    }
+    with MockAlphaVantage(payloads) as api:
+        yield api
+
+
+def _cache_without_latest(data_dir, payload: dict, days: int):
+    cached = dict(payload)
+    cached["Time Series (Daily)"] = dict(
+        list(payload["Time Series (Daily)"].items())[days:]
+    )
+    (data_dir / "SPY.json").write_text(json.dumps(cached))
+
+
+def _series(data_dir) -> dict:
+    return json.loads((data_dir / "SPY.json").read_text())["Time Series (Daily)"]
+
+
+def test_refresh_downloads_missing_ticker(data_dir, api):
+    retriever = DataRetriever(base_url=api.url)
+    assert retriever.refresh_price_data("SPY", TODAY) == "full"
+    assert api.requests[-1]["outputsize"] == "full"
+    assert _series(data_dir) == api.payloads["SPY"]["Time Series (Daily)"]
+
+
+def test_refresh_merges_compact_window(data_dir, api):
+    _cache_without_latest(data_dir, api.payloads["SPY"], 10)
+    retriever = DataRetriever(base_url=api.url)
+    assert retriever.refresh_price_data("SPY", TODAY) == "compact"
+    assert api.requests[-1]["outputsize"] == "compact"
+    series = _series(data_dir)
+    assert series == api.payloads["SPY"]["Time Series (Daily)"]
+    # latest first, like Alpha Vantage responses
+    assert list(series) == sorted(series, reverse=True)
+
+
+def test_refresh_skips_up_to_date_and_refetches_long_gaps(data_dir, api):
+    retriever = DataRetriever(base_url=api.url)
+    _cache_without_latest(data_dir, api.payloads["SPY"], 0)
+    assert retriever.refresh_price_data("SPY", TODAY) == "skipped"
+    assert not api.requests
+    _cache_without_latest(data_dir, api.payloads["SPY"], 150)
+    assert retriever.refresh_price_data("SPY", TODAY) == "full"
+
+
+def test_refresh_refetches_macro_datasets_once_stale(data_dir, api):
+    retriever = DataRetriever(base_url=api.url)
+    first = retriever.refresh(["SPY"], TODAY)
+    assert first == {"SPY": "full", "CPI": "full", "INFLATION": "full"}
+    second = retriever.refresh(["SPY"], TODAY)
+    assert second == {"SPY": "skipped", "CPI": "skipped", "INFLATION": "skipped"}
+    assert len(api.requests) == 3
+
+
+def test_refresh_returns_the_exception_of_a_failing_dataset(data_dir, api):
+    del api.payloads["CPI"]
+    result = DataRetriever(base_url=api.url).refresh(["SPY"], TODAY)
+    assert result["SPY"] == "full"
+    assert result["INFLATION"] == "full"
+    assert isinstance(result["CPI"], Exception)
+    assert (data_dir / "SPY.json").exists()
+
+
+class FlakyAlphaVantage(MockAlphaVantage):
+    """Answers the first `throttled_calls` requests with a quota message."""
+
+    def __init__(self, payloads, throttled_calls: int):
+        super().__init__(payloads)
+        self.throttled_calls = throttled_calls
+
+    def respond(self, query):
+        if len(self.requests) <= self.throttled_calls:
+            return {
+                "Information": "Thank you for using Alpha Vantage! Our standard "
+                "API rate limit is 25 requests per day."
+            }
+        return super().respond(query)
+
+
+def test_throttled_requests_are_retried(data_dir):
+    payloads = {"SPY": daily_payload("SPY", end=TODAY.isoformat())}
+    with FlakyAlphaVantage(payloads, throttled_calls=2) as api:
+        retriever = DataRetriever(base_url=api.url, backoff=0.01)
+        assert retriever.get_price_data_bulk(["SPY"]) == {"SPY": None}
+        assert len(api.requests) == 3
+    assert _series(data_dir) == payloads["SPY"]["Time Series (Daily)"]
+
+
+def test_throttling_gives_up_after_max_retries(data_dir):
+    with FlakyAlphaVantage({}, throttled_calls=10) as api:
+        retriever = DataRetriever(base_url=api.url, max_retries=2, backoff=0.01)
+        with pytest.raises(Exception, match="Throttled"):
+            retriever.get_price_data("SPY")
+        assert len(api.requests) == 3
+
+
+def test_mock_quota_is_retried(data_dir):
+    payloads = {"SPY": daily_payload("SPY", end=TODAY.isoformat())}
+    with MockAlphaVantage(payloads, requests_per_minute=1) as api:
+        retriever = DataRetriever(base_url=api.url, max_retries=1, backoff=0.01)
+        retriever.get_price_data("SPY")
+        with pytest.raises(Exception, match="Throttled"):
+            retriever.get_price_data("SPY")
+        assert api.throttled == 2
+
+
+@pytest.mark.parametrize(
+    "message",
+    [
+        {"Information": "The **demo** API key is for demo purposes only."},
+        {
+            "Information": "Thank you for using Alpha Vantage! This is a premium endpoint."
+        },
+        {"Error Message": "Invalid API call."},
+    ],
+)
+def test_permanent_errors_fail_fast(data_dir, message):
+    with MockAlphaVantage({"SPY": message}) as api:
+        retriever = DataRetriever(base_url=api.url, backoff=10)
+        with pytest.raises(Exception, match="failed"):
+            retriever.get_price_data("SPY")
+        assert len(api.requests) == 1
+
+
+class FailingAlphaVantage(MockAlphaVantage):
+    """Answers the first `failed_calls` requests with HTTP `status`."""
+
+    def __init__(self, payloads, status: int, failed_calls: int):
+        super().__init__(payloads)
+        self.failed_status = status
+        self.failed_calls = failed_calls
+
+    def status(self, query):
+        if len(self.requests) <= self.failed_calls:
+            return self.failed_status
+        return super().status(query)
+
+
+@pytest.mark.parametrize("status", [429, 500, 503])
+def test_transient_http_errors_are_retried(data_dir, status):
+    payloads = {"SPY": daily_payload("SPY", end=TODAY.isoformat())}
+    with FailingAlphaVantage(payloads, status, failed_calls=2) as api:
+        retriever = DataRetriever(base_url=api.url, backoff=0.01)
+        retriever.get_price_data("SPY")
+        assert len(api.requests) == 3
+    assert _series(data_dir) == payloads["SPY"]["Time Series (Daily)"]
+
+
+@pytest.mark.parametrize("status", [400, 401, 403, 404])
+def test_client_http_errors_fail_fast(data_dir, status):
+    payloads = {"SPY": daily_payload("SPY", end=TODAY.isoformat())}
+    with FailingAlphaVantage(payloads, status, failed_calls=10) as api:
+        retriever = DataRetriever(base_url=api.url, backoff=10)
+        with pytest.raises(requests.HTTPError, match=str(status)):
+            retriever.get_price_data("SPY")
+        assert len(api.requests) == 1
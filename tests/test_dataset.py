@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.dataset import Dataset
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.set_variables import set_weights
+
+
+def test_round_trip_and_read_only(panel):
+    dataset = Dataset.from_frame(panel)
+    pd.testing.assert_frame_equal(dataset.to_frame(), panel, check_index_type=False)
+    assert not dataset.values.flags.writeable
+    # the frame keeps its own, writable prices
+    panel.iloc[0, 0] += 1
+    assert dataset.values[0, 0] == panel.iloc[0, 0] - 1
+
+
+def test_slices_are_views(panel):
+    dataset = Dataset.from_frame(panel)
+    for tickers in (["T1", "T2", "T3"], ["T0", "T2", "T4"], "T3"):
+        subset = dataset[tickers]
+        assert np.shares_memory(subset.values, dataset.values)
+        np.testing.assert_array_equal(
+            subset.to_numpy(), panel[list(subset.tickers)].to_numpy()
+        )
+    # unevenly spaced columns are copied
+    subset = dataset[["T0", "T1", "T3"]]
+    assert not np.shares_memory(subset.values, dataset.values)
+    np.testing.assert_array_equal(subset.values, panel[["T0", "T1", "T3"]].to_numpy())
+    window = dataset.between(panel.index[10], panel.index[20])
+    assert np.shares_memory(window.values, dataset.values)
+    assert list(window.index) == list(panel.index[10:21])
+    with pytest.raises(KeyError, match="T9"):
+        dataset[["T0", "T9"]]
+
+
+def test_fingerprints_follow_the_content(panel):
+    dataset = Dataset.from_frame(panel)
+    fingerprint = dataset.fingerprint(["T0", "T1"])
+    assert Dataset.from_frame(panel.copy()).fingerprint(["T0", "T1"]) == fingerprint
+    assert dataset[["T0", "T1"]].fingerprint(["T0", "T1"]) == fingerprint
+    assert dataset.fingerprint(["T1", "T0"]) != fingerprint
+    assert dataset.between(panel.index[1]).fingerprint(["T0", "T1"]) != fingerprint
+
+
+def test_problems_on_a_dataset_match_the_frame(panel):
+    values = []
+    for data in (panel, Dataset.from_frame(panel)):
+        tickers = list(panel.columns[1:])
+        optimizer = Optimizer()
+        with optimizer:
+            set_weights(tickers)
+            sc.keep_long_positions_only()
+            sc.cap_maximal_drawdown_at_threshold(data, tickers, 0.2)
+            so.maximize_ema_return_against_benchmark(data, tickers, "T0", 20)
+        optimizer.optimize()
+        assert optimizer.status == "optimal"
+        values.append(optimizer.value)
+    assert values[0] == pytest.approx(values[1], rel=1e-6)
@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from investment_simulator import get_agg_metrics as agg
+from investment_simulator import get_ts_metrics as ts
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.set_variables import set_weights
+from investment_simulator.solve_cache import SolveCache
+from investment_simulator.simulator import InvestmentSimulator
+from conftest import synthetic_panel
+
+
+def _realized_drawdown(data, weights) -> float:
+    path = (data.to_numpy() / data.to_numpy()[0] - 1) @ weights
+    return np.max(np.maximum.accumulate(path) - path)
+
+
+def test_unconverged_separation_is_not_optimal():
+    data = synthetic_panel(20, 1500)
+    sim = InvestmentSimulator(
+        list(data.columns), data=data, solve_cache=SolveCache(root=None)
+    )
+    sim.max_separation_rounds = 1
+    so.maximize_return(sim.data, sim.tickers)
+    sc.keep_long_positions_only()
+    sc.cap_maximal_drawdown_at_threshold(sim.data, sim.tickers, 0.08, "anchored")
+    with pytest.warns(UserWarning, match="Separation did not converge"):
+        sim.optimize()
+    weights = sim._optimizer_variables["weights"].var.value
+    assert _realized_drawdown(data, weights) > 0.08 + 1e-4
+    assert sim.status == "optimal_inaccurate"
+    assert not sim.solver_stats["separation converged"]
+    assert not sim.solve_cache._entries
+
+
+def test_anchored_engine_converges_to_cap(panel):
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(list(panel.columns))
+        so.maximize_return(panel, list(panel.columns))
+        sc.keep_long_positions_only()
+        sc.cap_maximal_drawdown_at_threshold(
+            panel, list(panel.columns), 0.15, "anchored"
+        )
+    optimizer.optimize()
+    weights = optimizer._optimizer_variables["weights"].var.value
+    assert optimizer.status == "optimal"
+    assert optimizer.solver_stats["separation converged"]
+    assert _realized_drawdown(panel, weights) <= 0.15 + 1e-4
+
+
+def test_drawdown_engines_register_separate_metrics(panel):
+    tickers = list(panel.columns)
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(tickers)
+        so.minimize_maximal_drawdown(panel, tickers, engine="cummax")
+        sc.cap_maximal_drawdown_at_threshold(panel, tickers, 0.5, "anchored")
+    assert "drawdown (historical max)" in optimizer._optimizer_metrics
+    assert "drawdown (historical max, anchored)" in optimizer._optimizer_metrics
+    optimizer.optimize()
+    metrics = optimizer._optimizer_metrics
+    assert optimizer.status == "optimal"
+    assert np.isclose(
+        metrics["drawdown (historical max)"].expr.value,
+        metrics["drawdown (historical max, anchored)"].expr.value,
+        atol=1e-5,
+    )
+
+
+@pytest.mark.parametrize("engine", ["cummax", "anchored"])
+def test_drawdown_of_a_non_decreasing_path_is_zero(panel, engine):
+    data = panel.copy()
+    data["UP"] = np.linspace(100, 150, len(data))
+    sim = InvestmentSimulator(list(data.columns), data=data)
+    so.minimize_maximal_drawdown(sim.data, sim.tickers, engine=engine)
+    sc.keep_long_positions_only()
+    sim.optimize()
+    assert sim.status == "optimal"
+    assert np.isclose(sim.value, 0, atol=1e-6)
+
+
+def test_objectives_and_constraints_share_one_drawdown(panel):
+    tickers = list(panel.columns)
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(tickers)
+        sc.keep_long_positions_only()
+        so.minimize_avg_drawdown(panel, tickers)
+        sc.cap_maximal_drawdown_at_threshold(panel, tickers, 0.3)
+        sc.cap_avg_drawdown_at_threshold(panel, tickers, 0.2)
+        drawdown = ts.get_drawdown(panel, tickers)
+        assert agg.get_historical_avg(drawdown) is (
+            optimizer._optimizer_metrics["drawdown (historical average)"]
+        )
+    variables = optimizer._optimizer_variables
+    assert [name for name in variables if name.endswith("peak")] == ["drawdown peak"]
+    optimizer.optimize()
+    assert optimizer.status == "optimal"
+    # the post-solve hook makes the reported drawdown exact
+    weights = variables["weights"].var.value
+    path = (panel.to_numpy() / panel.to_numpy()[0] - 1) @ weights
+    metrics = optimizer._optimizer_metrics
+    assert np.isclose(
+        metrics["drawdown (historical average)"].expr.value,
+        np.mean(np.maximum.accumulate(path) - path),
+    )
+    assert np.isclose(
+        metrics["drawdown (historical max)"].expr.value,
+        _realized_drawdown(panel, weights),
+    )
+
+
+def test_metrics_are_rebuilt_for_other_data(panel):
+    tickers = list(panel.columns)
+    with Optimizer():
+        set_weights(tickers)
+        simple_return = ts.get_simple_return(panel, tickers)
+        assert ts.get_simple_return(panel.copy(), tickers) is simple_return
+        changed = panel.copy()
+        changed.iloc[-1] *= 1.1
+        assert ts.get_simple_return(changed, tickers) is not simple_return
@@ -0,0 +1,59 @@
+import numpy as np
+import pytest
+
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.evaluate import BatchEvaluator, random_weights
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.set_variables import set_weights
+
+
+def test_columns_match_the_solved_metrics(panel):
+    tickers = ["T1", "T2", "T3", "T4"]
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(tickers)
+        sc.keep_long_positions_only()
+        so.minimize_classical_volatility(panel, tickers)
+        sc.keep_ema_return_against_benchmark_above_threshold(
+            panel, tickers, 20, "T0", -0.05
+        )
+        sc.keep_avg_return_above_threshold(panel, tickers, 0.01)
+        sc.cap_maximal_drawdown_at_threshold(panel, tickers, 0.3)
+    optimizer.optimize()
+    assert optimizer.status == "optimal"
+    weights = optimizer._optimizer_variables["weights"].var.value
+    evaluated = BatchEvaluator(
+        panel, tickers, smoothing_window=20, benchmark="T0"
+    ).evaluate(weights)
+    for name in [
+        "portfolio variance (classical method)",
+        "return against T0 (exponential weighted average)",
+        "simple return (historical average)",
+        "drawdown (historical max)",
+    ]:
+        solved = optimizer._optimizer_metrics[name].expr.value
+        assert evaluated[name].iloc[0] == pytest.approx(solved, rel=1e-6), name
+
+
+def test_chunks_do_not_change_the_result(panel):
+    weights = random_weights(50, panel.shape[1], seed=0)
+    whole = BatchEvaluator(panel, list(panel.columns), 10, "T0").evaluate(weights)
+    chunked = BatchEvaluator(
+        panel, list(panel.columns), 10, "T0", max_bytes=8 * 8 * len(panel) * 7
+    ).evaluate(weights)
+    assert len(whole) == 50
+    np.testing.assert_allclose(chunked.to_numpy(), whole.to_numpy())
+    assert list(chunked.columns) == list(whole.columns)
+
+
+def test_random_weights_are_long_only_and_fully_invested():
+    weights = random_weights(1000, 4, seed=1)
+    assert weights.shape == (1000, 4)
+    assert np.all(weights >= 0)
+    np.testing.assert_allclose(weights.sum(axis=1), 1)
+
+
+def test_weights_must_match_the_tickers(panel):
+    with pytest.raises(Exception, match="Expected 5 weights per portfolio, got 3"):
+        BatchEvaluator(panel, list(panel.columns)).evaluate(np.ones(3) / 3)
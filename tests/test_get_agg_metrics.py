@@ -0,0 +1,159 @@
+import numpy as np
+import pytest
+from investment_simulator import get_agg_metrics as agg
+from investment_simulator import get_ts_metrics as ts
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.recipe import apply_recipe
+from investment_simulator.set_variables import set_weights
+from conftest import synthetic_panel
+
+
+def _min_variance(data, method: str, n_factors: int = 5) -> Optimizer:
+    tickers = list(data.columns)
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(tickers)
+        sc.keep_long_positions_only()
+        so.minimize_classical_volatility(data, tickers, method, n_factors=n_factors)
+    optimizer.optimize()
+    return optimizer
+
+
+def test_factor_model_is_detected_by_type(panel):
+    tickers = list(panel.columns)
+    with Optimizer():
+        set_weights(tickers)
+        sample = ts.get_covariance_matrix(panel, tickers, "sample")
+        factor = ts.get_covariance_matrix(panel, tickers, "factor", n_factors=2)
+        # a name is a display label, not the structure of the matrix
+        factor.name = "renamed"
+        variance = agg.get_portfolio_variance(factor)
+    assert not isinstance(sample, ts.FactorCovarianceMetric)
+    assert isinstance(factor, ts.FactorCovarianceMetric)
+    assert factor.loadings.shape == (len(tickers), 2)
+    assert "quad_form" not in str(variance.expr)
+
+
+def test_full_rank_factor_model_matches_sample(panel):
+    # with as many factors as tickers the model reproduces the covariance
+    sample = _min_variance(panel, "sample")
+    factor = _min_variance(panel, "factor", n_factors=panel.shape[1])
+    assert sample.status == factor.status == "optimal"
+    assert np.isclose(sample.value, factor.value, rtol=1e-4)
+
+
+def _percent_days(data, objective, constraints=("keep_long_positions_only",)):
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(list(data.columns[1:]))
+    apply_recipe(optimizer, data, list(data.columns[1:]), objective, constraints)
+    return optimizer
+
+
+def test_surrogate_bounds_the_count_over_the_whole_range(panel):
+    for name, above in (
+        ("maximize_percent_outperforming_days", True),
+        ("minimize_underperforming_days", False),
+    ):
+        optimizer = _percent_days(panel, (name, {"benchmark": "T0"}))
+        optimizer.optimize()
+        (metric,) = [m for m in optimizer._optimizer_metrics.values() if "% " in m.name]
+        # a bound from the side the solver pushes, also below the threshold
+        if above:
+            assert metric.get_bound() <= metric.get_value() + 1e-6
+        else:
+            assert metric.get_bound() >= metric.get_value() - 1e-6
+
+
+def test_exact_default_big_m_needs_long_positions_only():
+    data = synthetic_panel(n_days=60)
+    tickers = list(data.columns[1:])
+    with Optimizer():
+        set_weights(tickers)
+        with pytest.raises(Exception, match="Pass big_m"):
+            so.maximize_percent_outperforming_days(data, tickers, "T0", "exact")
+        # an explicit big_m is the caller's bound to vouch for
+        so.maximize_percent_outperforming_days(data, tickers, "T0", "exact", big_m=1)
+
+
+@pytest.mark.parametrize(
+    "step",
+    [
+        ("maximize_percent_outperforming_days", {"benchmark": "T0"}),
+        ("minimize_days_with_loss", {"threshold": 0}),
+        ("minimize_underperforming_days", {"benchmark": "T0"}),
+        (
+            "keep_percent_outperforming_days_above_threshold",
+            {"benchmark": "T0", "threshold": 0.5},
+        ),
+        (
+            "cap_percent_underperforming_days_at_threshold",
+            {"benchmark": "T0", "threshold": 0.5},
+        ),
+    ],
+)
+def test_surrogate_margin_is_passed_through(panel, step):
+    name, arguments = step
+    step = (name, {**arguments, "margin": 0.05})
+    if name.startswith(("keep", "cap")):
+        optimizer = _percent_days(panel, ("maximize_return", {}), [step])
+    else:
+        optimizer = _percent_days(panel, step)
+    (metric,) = [m for m in optimizer._optimizer_metrics.values() if "% " in m.name]
+    assert metric.margin == 0.05
+
+
+def test_exact_backend_in_a_recipe():
+    data = synthetic_panel(n_days=60)
+    objective = (
+        "maximize_percent_outperforming_days",
+        {"benchmark": "T0", "backend": "exact"},
+    )
+    optimizer = _percent_days(data, objective)
+    optimizer.optimize("HIGHS")
+    assert optimizer.status == "optimal"
+    (metric,) = [m for m in optimizer._optimizer_metrics.values() if "% " in m.name]
+    assert np.isclose(metric.get_bound(), metric.get_value())
+
+
+def _ema(series: np.ndarray, window: int) -> np.ndarray:
+    alpha = 2 / (window + 1)
+    ema = np.empty_like(series)
+    ema[0] = series[0]
+    for t in range(1, len(series)):
+        ema[t] = alpha * series[t] + (1 - alpha) * ema[t - 1]
+    return ema
+
+
+def test_linear_aggregations_fold_into_weight_coefficients(panel):
+    tickers = ["T1", "T2", "T3"]
+    weights = np.array([0.2, 0.3, 0.5])
+    with Optimizer() as optimizer:
+        set_weights(tickers)
+        delta = ts.get_return_against_benchmark(panel, tickers, "T0")
+        ema = agg.get_ema_weighted_avg(delta, 10)
+        avg = agg.get_historical_avg(delta)
+        final = agg.get_final_point_value(delta)
+    # no recursive ema variables, only the weights
+    assert list(optimizer._optimizer_variables) == ["weights"]
+    assert ema.expr.size == 1
+    optimizer._optimizer_variables["weights"].var.value = weights
+    prices = panel.to_numpy()
+    returns = prices / prices[0] - 1
+    series = returns[:, 1:4] @ weights - returns[:, 0]
+    assert np.isclose(ema.expr.value, _ema(series, 10)[-1])
+    assert np.isclose(avg.expr.value, series.mean())
+    assert np.isclose(final.expr.value, series[-1])
+
+
+def test_non_linear_series_keep_the_recursive_ema(panel):
+    tickers = list(panel.columns)
+    with Optimizer() as optimizer:
+        set_weights(tickers)
+        sc.keep_long_positions_only()
+        so.minimize_ema_drawdown(panel, tickers, 10)
+    assert "ema: drawdown, 10" in optimizer._optimizer_variables
+    optimizer.optimize()
+    assert optimizer.status == "optimal"
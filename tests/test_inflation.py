@@ -0,0 +1,66 @@
+import json
+
+import numpy as np
+import pytest
+
+from investment_simulator import data_processor
+from investment_simulator import get_ts_metrics as ts
+from investment_simulator.dataset import to_days
+from investment_simulator.inflation import CPI
+from investment_simulator.mock_api import daily_payload, macro_payload
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.price_store import PriceStore
+from investment_simulator.set_variables import set_weights
+from investment_simulator.simulator import InvestmentSimulator
+
+
+def _cpi(end: str) -> CPI:
+    return CPI.from_records(macro_payload("CPI", "2014-01-01", end)["data"])
+
+
+def test_deflator_uses_the_cpi_of_each_month():
+    cpi = _cpi("2015-03-01")
+    dates = ["2015-01-02", "2015-01-30", "2015-02-02", "2015-03-31", "2015-06-01"]
+    deflator = cpi.deflator(dates)
+    levels = cpi.to_series()[["2015-01-01", "2015-01-01", "2015-02-01"]].to_numpy()
+    np.testing.assert_allclose(deflator[:3], levels[0] / levels)
+    # dates past the series keep the latest published month
+    assert deflator[3] == deflator[4]
+    assert deflator[4] == pytest.approx(levels[0] / cpi.values[-1])
+    assert cpi.deflator(to_days(dates)) is deflator
+    assert not deflator.flags.writeable
+    with pytest.raises(Exception, match="No CPI data for 2013-12-31"):
+        cpi.deflator(["2013-12-31"])
+
+
+def test_real_returns_are_returns_of_deflated_prices(panel):
+    cpi = _cpi("2017-01-01")
+    tickers = list(panel.columns)
+    with Optimizer() as optimizer:
+        set_weights(tickers)
+        nominal = ts.get_simple_return(panel, tickers)
+        real = ts.get_simple_return(panel, tickers, cpi=cpi)
+    assert (nominal.name, real.name) == ("simple return", "real simple return")
+    assert {"simple return", "real simple return"} <= set(optimizer._optimizer_metrics)
+    prices = panel.to_numpy() * cpi.deflator(panel.index)[:, None]
+    np.testing.assert_allclose(real.coef, prices / prices[0] - 1)
+
+
+def test_cpi_is_not_merged_into_the_prices(tmp_path, monkeypatch):
+    monkeypatch.setattr(data_processor, "DATA_DIR", tmp_path)
+    monkeypatch.setattr(
+        data_processor, "PriceStore", lambda: PriceStore(tmp_path / "store")
+    )
+    for ticker in ("AAA", "BBB"):
+        payload = daily_payload(ticker, "2019-01-01", "2019-12-31")
+        (tmp_path / f"{ticker}.json").write_text(json.dumps(payload))
+    # CPI is published with a lag: prices go past its last month
+    (tmp_path / "CPI.json").write_text(
+        json.dumps(macro_payload("CPI", "2018-01-01", "2019-10-01"))
+    )
+    sim = InvestmentSimulator(["AAA", "BBB"], "2019-01-01", "2019-12-31")
+    assert list(sim.data.columns) == ["AAA", "BBB"]
+    assert sim.data.index[-1] == "2019-12-31"
+    assert isinstance(sim.cpi, CPI)
+    assert sim.cpi.to_series().index[-1] == "2019-10-01"
+    assert sim.cpi is sim.cpi
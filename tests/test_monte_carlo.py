@@ -0,0 +1,45 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from conftest import synthetic_panel
+from investment_simulator.monte_carlo import MonteCarloSimulator
+
+
+def test_allocations_are_held_without_rebalancing():
+    # constant daily returns make every bootstrap path the same, with the
+    # closed-form value w0 * 1.01^t + w1 * 0.995^t
+    index = synthetic_panel(n_days=101).index
+    days = np.arange(len(index))
+    data = pd.DataFrame({"T0": 1.01**days, "T1": 0.995**days}, index=index) * 100
+    mc = MonteCarloSimulator(data, ["T0", "T1"], horizon=50, seed=0)
+    results = mc.simulate({"T0": 0.5, "T1": 0.5}, n_paths=10)
+    value = 0.5 * 1.01 ** np.arange(51) + 0.5 * 0.995 ** np.arange(51)
+    np.testing.assert_allclose(results["final return"], value[-1] - 1)
+    np.testing.assert_allclose(results["max drawdown"], 0, atol=1e-12)
+    np.testing.assert_allclose(
+        results["worst DoD return"], np.min(value[1:] / value[:-1]) - 1
+    )
+
+
+def test_mean_final_return_matches_independent_draws():
+    # with blocks of one day, paths draw DoD returns independently, so the
+    # expected final growth is the mean daily growth to the power horizon
+    data = synthetic_panel(n_tickers=1, n_days=251, seed=3)
+    mc = MonteCarloSimulator(data, ["T0"], block_size=1, horizon=20, seed=7)
+    results = mc.simulate([1.0], n_paths=20000, chunk_size=3000)
+    dod = data["T0"].pct_change().dropna().to_numpy()
+    expected = np.mean(1 + dod) ** 20 - 1
+    standard_error = results["final return"].std() / np.sqrt(len(results))
+    assert len(results) == 20000
+    assert abs(results["final return"].mean() - expected) < 4 * standard_error
+
+
+def test_paths_are_reproducible_and_validated(panel):
+    mc = MonteCarloSimulator(panel, ["T0", "T1"], horizon=30, seed=1)
+    first = mc.simulate([0.6, 0.4], n_paths=500, chunk_size=200)
+    pd.testing.assert_frame_equal(
+        first, mc.simulate([0.6, 0.4], n_paths=500, chunk_size=200)
+    )
+    with pytest.raises(Exception, match="at least 1"):
+        mc.simulate([0.6, 0.4], n_paths=0)
@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+from investment_simulator.pareto import ParetoFront, dominated, simplex_grid
+
+
+def test_simplex_grid_and_dominance():
+    grid = simplex_grid(3, 3)
+    assert len(grid) == 6
+    assert all(np.isclose(sum(weights), 1) for weights in grid)
+    values = np.array([[1.0, 2.0], [2.0, 1.0], [2.0, 2.0], [np.nan, 0.0]])
+    assert list(dominated(values)) == [False, False, True, True]
+
+
+def test_weighted_sum_front_spans_the_anchors(panel):
+    tickers = list(panel.columns[1:])
+    names = ["maximize average return", "minimize maximal drawdown"]
+    front = ParetoFront(
+        tickers,
+        ["maximize_avg_return", "minimize_maximal_drawdown"],
+        ["keep_long_positions_only"],
+        points=4,
+        data=panel,
+    )
+    frontier = front.run(max_workers=2)
+    assert len(frontier) == 4
+    assert set(frontier["status"]) == {"optimal"}
+    assert not frontier["dominated"].any()
+    np.testing.assert_allclose(frontier[tickers].sum(axis=1), 1, atol=1e-6)
+    # more weight on return trades drawdown for return
+    assert frontier[names[0]].is_monotonic_increasing
+    assert frontier[names[1]].is_monotonic_increasing
+    np.testing.assert_allclose(
+        frontier[names].iloc[[-1, 0]].to_numpy(),
+        front.anchors[names].to_numpy(),
+        rtol=1e-4,
+    )
+
+
+def test_efficient_frontier_meets_its_return_targets(panel):
+    front = ParetoFront.efficient_frontier(list(panel.columns), points=5, data=panel)
+    frontier = front.run(max_workers=2).sort_values("maximize average DoD return")
+    assert set(frontier["status"]) == {"optimal"}
+    targets = frontier["epsilon maximize average DoD return"]
+    assert np.all(frontier["maximize average DoD return"] >= targets - 1e-7)
+    variance = frontier["minimize classical volatility"].to_numpy()
+    assert np.all(np.diff(variance) >= -1e-9)
+
+
+def test_invalid_fronts_are_rejected(panel):
+    tickers = list(panel.columns)
+    with pytest.raises(Exception, match="at least two objectives"):
+        ParetoFront(tickers, ["maximize_return"], data=panel)
+    with pytest.raises(Exception, match="Unknown method"):
+        ParetoFront(
+            tickers, ["maximize_return", "minimize_maximal_drawdown"], method="x"
+        )
@@ -0,0 +1,73 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from investment_simulator import data_processor
+from investment_simulator.data_processor import DataProcessor
+from investment_simulator.mock_api import daily_payload
+from investment_simulator.price_store import PriceStore
+
+
+def test_threads_can_ingest_the_same_ticker(tmp_path):
+    store = PriceStore(tmp_path)
+    time_series = daily_payload("SPY", end="2024-06-28")["Time Series (Daily)"]
+    with ThreadPoolExecutor(8) as pool:
+        list(pool.map(lambda _: store.ingest("SPY", time_series), range(16)))
+    dates, close = store.read("SPY")
+    assert len(dates) == len(time_series)
+    assert np.all(np.diff(dates.astype("int64")) > 0)
+    assert close[-1] == float(time_series[str(dates[-1])]["4. close"])
+    assert sorted(p.name for p in (tmp_path / "SPY").iterdir()) == [
+        "close.npy",
+        "date.npy",
+        "high.npy",
+        "low.npy",
+        "open.npy",
+        "volume.npy",
+    ]
+
+
+def test_read_slices_the_sorted_columns(tmp_path):
+    store = PriceStore(tmp_path)
+    time_series = daily_payload("SPY", end="2024-06-28")["Time Series (Daily)"]
+    # payloads list the latest day first
+    store.ingest("SPY", time_series)
+    dates, close = store.read("SPY", min_date="2024-03-01", max_date="2024-03-28")
+    expected = sorted(d for d in time_series if "2024-03-01" <= d <= "2024-03-28")
+    assert list(np.datetime_as_string(dates)) == expected
+    assert list(close) == [float(time_series[d]["4. close"]) for d in expected]
+    assert not close.flags.writeable
+
+
+def test_store_is_stale_until_ingested_and_after_a_refresh(tmp_path):
+    store = PriceStore(tmp_path / "store")
+    raw_path = tmp_path / "SPY.json"
+    raw_path.write_text(json.dumps(daily_payload("SPY", end="2024-06-28")))
+    assert store.is_stale("SPY", raw_path)
+    store.ingest_json("SPY", raw_path)
+    assert not store.is_stale("SPY", raw_path)
+    modified = (tmp_path / "store" / "SPY" / "date.npy").stat().st_mtime_ns
+    os.utime(raw_path, ns=(modified + 10**9, modified + 10**9))
+    assert store.is_stale("SPY", raw_path)
+
+
+def test_data_processor_reads_the_same_prices_from_store_and_json(
+    tmp_path, monkeypatch
+):
+    monkeypatch.setattr(data_processor, "DATA_DIR", tmp_path)
+    for seed, ticker in enumerate(["AAA", "BBB"]):
+        payload = daily_payload(ticker, end="2024-06-28", seed=seed)
+        (tmp_path / f"{ticker}.json").write_text(json.dumps(payload))
+    frames = []
+    for use_store in (True, False):
+        dp = DataProcessor("2024-01-15", "2024-05-31", use_store=use_store)
+        if use_store:
+            dp.price_store = PriceStore(tmp_path / "store")
+        dp.retrieve_price(["AAA", "BBB"])
+        dp.refresh_dataframe()
+        frames.append(dp.data)
+    pd.testing.assert_frame_equal(*frames)
+    assert frames[0].index[0] >= "2024-01-15" and frames[0].index[-1] <= "2024-05-31"
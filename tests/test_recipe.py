@@ -0,0 +1,38 @@
+import pytest
+
+from investment_simulator import set_constraints
+from investment_simulator import set_objective
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.recipe import apply_recipe, apply_step
+from investment_simulator.set_variables import set_weights
+
+
+@pytest.mark.parametrize("name", ["cp", "ts", "Optimizer", "_missing", "nope"])
+def test_only_module_functions_are_steps(panel, name):
+    with Optimizer():
+        with pytest.raises(Exception, match=f"Unknown set_objective function {name}"):
+            apply_step(set_objective, name, panel, list(panel.columns))
+
+
+def test_apply_recipe(panel):
+    tickers = list(panel.columns)
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(tickers)
+    apply_recipe(
+        optimizer,
+        panel,
+        tickers,
+        ("maximize_ema_return", {"smoothing_window": 20}),
+        ["keep_long_positions_only"],
+    )
+    assert list(optimizer._optimizer_objectives) == ["maximize ema return"]
+    assert "keep long positions only" in optimizer._optimizer_constraints
+    with Optimizer():
+        with pytest.raises(Exception, match="no CPI was given"):
+            apply_step(
+                set_constraints,
+                ("cap_maximal_drawdown_at_threshold", {"threshold": 0.2, "real": True}),
+                panel,
+                tickers,
+            )
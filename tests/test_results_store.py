@@ -0,0 +1,70 @@
+import copy
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.results_store import ResultsStore, build_record
+from investment_simulator.simulator import InvestmentSimulator
+
+
+@pytest.fixture
+def sim(panel):
+    sim = InvestmentSimulator(list(panel.columns), data=panel)
+    sc.keep_long_positions_only()
+    sc.cap_maximal_drawdown_at_threshold(sim.data, sim.tickers, 0.2)
+    so.maximize_return(sim.data, sim.tickers)
+    sim.optimize()
+    sim.generate_report()
+    return sim
+
+
+def test_saved_runs_are_found_and_read_back(sim, tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    run_id = sim.save_report(store)
+    objective = list(sim._optimizer_objectives)[0]
+    assert list(store.find_runs(tickers=["T0", "T3"])["id"]) == [run_id]
+    assert store.find_runs(tickers=["T0", "SPY"]).empty
+    assert list(store.find_runs(objective=objective)["id"]) == [run_id]
+    assert store.find_runs(min_date=sim.data.index[1]).empty
+    weights = sim._optimizer_variables["weights"].var.value
+    allocation = store.allocations([run_id]).loc[run_id, sim.tickers]
+    np.testing.assert_allclose(allocation.to_numpy(dtype=float), weights)
+    metrics = store.metrics([run_id])
+    assert metrics.loc[run_id, "drawdown (historical max)"] == pytest.approx(
+        sim._optimizer_metrics["drawdown (historical max)"].get_value()
+    )
+    parameters = store.parameters([run_id])
+    assert parameters.loc[run_id, "cap maximal drawdown at threshold"] == 0.2
+
+
+def test_series_are_streamed_one_at_a_time(sim, tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    run_id = sim.save_report(store)
+    frames = list(store.iter_series([run_id], ["simple return"]))
+    assert len(frames) == 1
+    simple_return = frames[0]
+    assert list(simple_return["date"]) == list(sim.data.index)
+    np.testing.assert_allclose(
+        simple_return["value"],
+        sim._optimizer_metrics["simple return"].get_value(),
+    )
+    path = tmp_path / "series.csv"
+    rows = store.export_series(path, [run_id])
+    exported = pd.read_csv(path)
+    assert rows == len(exported) > len(simple_return)
+    assert list(exported.columns) == ["run_id", "name", "date", "value"]
+
+
+def test_a_failing_batch_is_rolled_back(sim, tmp_path):
+    store = ResultsStore(tmp_path / "results.sqlite")
+    record = build_record(sim)
+    broken = dict(copy.deepcopy(record), run_key="broken")
+    del broken["allocation"]
+    with pytest.raises(KeyError):
+        store.write([record, broken])
+    assert store.find_runs().empty
+    store.write([record, build_record(sim)], batch_size=1)
+    assert len(store.find_runs()) == 2
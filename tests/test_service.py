@@ -0,0 +1,121 @@
+import json
+import os
+import time
+
+import pytest
+
+from investment_simulator.mock_api import daily_payload
+from investment_simulator.service import OptimizationService, ServiceClient
+
+# a mixed-integer problem that runs until it is cancelled or times out
+SLOW = {
+    "objective": ["minimize_days_with_loss", {"threshold": 0, "backend": "exact"}],
+    "constraints": ["keep_long_positions_only"],
+    "solver": "HIGHS",
+}
+
+
+@pytest.fixture(scope="module")
+def data_dir(tmp_path_factory):
+    # workers are forkserver processes that import the package afresh, so the
+    # data directory reaches them through the environment
+    data_dir = tmp_path_factory.mktemp("data")
+    with pytest.MonkeyPatch.context() as patch:
+        patch.setenv("INVESTMENT_SIMULATOR_DATA_DIR", str(data_dir))
+        yield data_dir
+
+
+def _write_prices(data_dir, ticker: str, seed: int):
+    payload = daily_payload(ticker, "2018-01-01", "2019-12-31", seed=seed)
+    (data_dir / f"{ticker}.json").write_text(json.dumps(payload))
+
+
+@pytest.fixture(scope="module")
+def tickers(data_dir):
+    tickers = [f"ZZ{i}" for i in range(6)]
+    for seed, ticker in enumerate(tickers):
+        _write_prices(data_dir, ticker, seed)
+    return tickers
+
+
+@pytest.fixture
+def service():
+    with OptimizationService(port=0, workers=1, max_queue=1, timeout=60) as service:
+        yield service
+
+
+def _running(client: ServiceClient, job_id: str) -> dict:
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        job = client.get(job_id)
+        if job["status"] != "queued":
+            return job
+        time.sleep(0.05)
+    raise TimeoutError(job_id)
+
+
+def test_submit_and_wait(service, tickers):
+    client = ServiceClient(service.url)
+    objective = ["maximize_ema_return", {"smoothing_window": 20}]
+    first = client.wait(
+        client.submit(tickers, objective, ["keep_long_positions_only"]), poll=5
+    )
+    assert first["status"] == "done", first["error"]
+    assert first["result"]["status"] == "optimal"
+    assert first["result"]["data"]["hot"] is False
+    # the worker keeps the prices of its recent jobs
+    second = client.wait(client.submit(tickers, objective), poll=5)
+    assert second["result"]["data"]["hot"] is True
+    stats = client.stats()
+    assert (stats["submitted"], stats["done"]) == (2, 2)
+    assert stats["latency"]["total"]["max"] > 0
+
+
+def test_refreshed_prices_are_reloaded(service, tickers, data_dir):
+    client = ServiceClient(service.url)
+    recipe = ("maximize_return", ["keep_long_positions_only"])
+    submit = lambda: client.wait(client.submit(tickers[:2], *recipe))
+    first = submit()
+    assert submit()["result"]["data"]["hot"] is True
+    path = data_dir / f"{tickers[0]}.json"
+    modified = path.stat().st_mtime_ns
+    _write_prices(data_dir, tickers[0], seed=99)
+    os.utime(path, ns=(modified + 10**9, modified + 10**9))
+    refreshed = submit()
+    assert refreshed["status"] == "done", refreshed["error"]
+    assert refreshed["result"]["data"]["hot"] is False
+    assert refreshed["result"]["value"] != first["result"]["value"]
+
+
+def test_invalid_and_failing_jobs(service, tickers):
+    client = ServiceClient(service.url)
+    with pytest.raises(Exception, match="400"):
+        client.submit([], "maximize_ema_return")
+    job = client.wait(client.submit(tickers, "maximize_happiness"), poll=5)
+    assert job["status"] == "failed"
+    assert "maximize_happiness" in job["error"]
+
+
+def test_queue_full_and_cancel(service, tickers):
+    client = ServiceClient(service.url)
+    running = client.submit(tickers, **SLOW)
+    assert _running(client, running)["status"] == "running"
+    queued = client.submit(tickers, **SLOW)
+    with pytest.raises(Exception, match="503"):
+        client.submit(tickers, **SLOW)
+    assert client.cancel(queued)["error"] == "Cancelled while queued."
+    assert client.cancel(running)["error"] == "Cancelled while running."
+    stats = client.stats()
+    assert (stats["rejected"], stats["cancelled"]) == (1, 2)
+    assert stats["worker restarts"] == 1
+    # the replacement worker takes new jobs
+    job = client.wait(client.submit(tickers, "minimize_maximal_drawdown"), poll=5)
+    assert job["status"] == "done", job["error"]
+
+
+def test_timeout(service, tickers):
+    client = ServiceClient(service.url)
+    job = client.wait(client.submit(tickers, timeout=1, **SLOW), poll=5)
+    assert job["status"] == "timeout"
+    assert job["finished"] - job["started"] < 10
+    assert client.stats()["worker restarts"] == 1
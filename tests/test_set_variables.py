@@ -0,0 +1,28 @@
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.set_variables import set_weights
+
+
+def _solve(data, extra_constraint: bool) -> Optimizer:
+    tickers = list(data.columns)
+    optimizer = Optimizer()
+    with optimizer:
+        set_weights(tickers)
+        sc.keep_long_positions_only()
+        so.minimize_ema_drawdown(data, tickers, 20)
+        if extra_constraint:
+            sc.keep_ema_deviation_below_threshold(data, tickers, 20, 1.0)
+    optimizer.optimize()
+    return optimizer
+
+
+def test_ema_variables_are_per_series(panel):
+    alone = _solve(panel, extra_constraint=False)
+    both = _solve(panel, extra_constraint=True)
+    assert alone.status == "optimal"
+    # a non-binding constraint on another series' ema leaves the optimum
+    assert both.status == "optimal"
+    assert abs(both.value - alone.value) < 1e-6
+    names = [name for name in both._optimizer_variables if name.startswith("ema")]
+    assert len(names) == 2
@@ -0,0 +1,152 @@
+import pytest
+
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.evaluate import BatchEvaluator
+from investment_simulator.optimizer_object import Optimizer, timed
+from investment_simulator.simulator import InvestmentSimulator
+from conftest import synthetic_panel
+
+
+def test_sweep_threshold_parameter(panel):
+    sim = InvestmentSimulator(list(panel.columns), data=panel)
+    so.maximize_return(sim.data, sim.tickers)
+    sc.keep_long_positions_only()
+    sc.cap_maximal_drawdown_at_threshold(sim.data, sim.tickers, 0.2)
+    name = "cap maximal drawdown at threshold"
+    assert name in sim._optimizer_parameters
+    table = sim.sweep({name: [0.12, 0.2]})
+    assert list(table[name]) == [0.12, 0.2]
+    assert set(table["status"]) == {"optimal"}
+    # a tighter cap can only lower the return
+    assert table["value"][0] <= table["value"][1] + 1e-6
+    # the sweep restores the registered value
+    assert sim._optimizer_parameters[name]() == 0.2
+
+
+def test_fidelity_report_compares_horizon_metrics():
+    data = synthetic_panel(5, 600)
+    data["BENCH"] = data.mean(axis=1)
+    tickers = [ticker for ticker in data.columns if ticker != "BENCH"]
+    sim = InvestmentSimulator(tickers, data=data, frequency="W")
+    so.maximize_ema_return_against_benchmark(sim.data, tickers, "BENCH", 10)
+    sc.keep_long_positions_only()
+    sc.cap_maximal_drawdown_at_threshold(sim.data, tickers, 0.3, "anchored")
+    sc.cap_maximal_dod_loss_at_threshold(sim.data, tickers, 0.2)
+    sim.optimize()
+    sim.generate_report()
+    metrics = sim.report["fidelity"]["metrics"]
+    # benchmark and smoothing window are taken from the registered metrics
+    assert "return against BENCH (exponential weighted average)" in metrics
+    assert "drawdown (historical max)" in metrics
+    # per-period returns are not compared against daily ones
+    assert not any(name.startswith("DoD return") for name in metrics)
+    drawdown = metrics["drawdown (historical max)"]
+    assert drawdown["reduced"] <= 0.3 + 1e-4
+    assert drawdown["full"] >= drawdown["reduced"] - 1e-9
+
+
+def test_fidelity_report_evaluates_each_metric_with_its_own_arguments():
+    data = synthetic_panel(5, 600)
+    data["BENCH"] = data.mean(axis=1)
+    data["BENCH2"] = data["T0"]
+    tickers = ["T0", "T1", "T2", "T3", "T4"]
+    sim = InvestmentSimulator(tickers, data=data, frequency="W")
+    so.maximize_ema_return_against_benchmark(sim.data, tickers, "BENCH", 10)
+    sc.keep_long_positions_only()
+    sc.keep_avg_return_against_benchmark_above_threshold(
+        sim.data, tickers, "BENCH2", -1
+    )
+    sc.cap_ema_drawdown_at_threshold(sim.data, tickers, 3, 1)
+    sim.optimize()
+    metrics = sim.generate_fidelity_report()["metrics"]
+    weights = sim._optimizer_variables["weights"].var.value
+    scale = len(sim.full_data) / len(sim.data)
+    for name, benchmark, window in [
+        ("return against BENCH (exponential weighted average)", "BENCH", 10),
+        ("return against BENCH2 (historical average)", "BENCH2", None),
+        ("drawdown (exponential weighted average)", None, 3),
+    ]:
+        for series, data, factor in [
+            ("reduced", sim.data, 1),
+            ("full", sim.full_data, scale),
+        ]:
+            expected = BatchEvaluator(
+                data,
+                tickers,
+                smoothing_window=window and round(window * factor),
+                benchmark=benchmark,
+            ).evaluate(weights)[name]
+            assert metrics[name][series] == pytest.approx(expected.iloc[0])
+
+
+def test_helpers_reject_tickers_of_another_simulator(panel):
+    s1 = InvestmentSimulator(["T0", "T1", "T2"], data=panel)
+    s2 = InvestmentSimulator(list(panel.columns), data=panel)
+    with pytest.raises(Exception, match="do not match the weights"):
+        so.maximize_return(s1.data, s1.tickers)
+    # same number of tickers, other tickers
+    s3 = InvestmentSimulator(["T2", "T3", "T4"], data=panel)
+    with pytest.raises(Exception, match="do not match the weights"):
+        so.maximize_return(s1.data, s1.tickers)
+    assert not s3._optimizer_objectives
+    with s1:
+        so.maximize_return(s1.data, s1.tickers)
+    assert list(s1._optimizer_objectives) == ["maximize return"]
+    assert not s2._optimizer_objectives
+
+
+def test_threshold_constraints_follow_their_parameters(panel):
+    tickers = ["T2", "T3", "T4"]
+    sim = InvestmentSimulator(tickers, data=panel)
+    so.maximize_return(sim.data, tickers)
+    sc.keep_long_positions_only()
+    for benchmark in ("T0", "T1"):
+        sc.cap_percent_underperforming_days_at_threshold(
+            sim.data, tickers, benchmark, 0.6
+        )
+    names = [
+        f"cap % underperforming days at threshold (return against {b})"
+        for b in ("T0", "T1")
+    ]
+    for name in names:
+        # each constraint is bound to its own registered parameter
+        constraint = sim._optimizer_constraints[name]
+        assert constraint.threshold is sim._optimizer_parameters[name]
+    sim.set_parameters({names[0]: 0.8})
+    assert "80.00%" in sim._optimizer_constraints[names[0]].desc
+    assert "60.00%" in sim._optimizer_constraints[names[1]].desc
+    sim.optimize()
+    sim.generate_report()
+    assert "80.00%" in sim.report["constraints"][names[0]]
+
+
+def test_report_statistics(panel):
+    sim = InvestmentSimulator(list(panel.columns), data=panel)
+    sc.keep_long_positions_only()
+    so.maximize_ema_return(sim.data, sim.tickers, 20)
+    sim.optimize("CLARABEL")
+    sim.generate_report()
+    statistics = sim.report["statistics"]
+    timings = statistics["timings"]
+    assert {"metric construction", "canonicalization", "solver"} <= set(timings)
+    assert all(seconds >= 0 for seconds in timings.values())
+    assert statistics["solver"]["solver"] == "CLARABEL"
+    assert statistics["solver"]["rounds"] == 1
+    # the folded ema leaves the weights as the only variables
+    assert statistics["problem"]["variables"] == len(sim.tickers)
+    assert any(name.endswith("nnz") for name in statistics["problem"])
+
+
+def test_nested_timed_calls_count_once():
+    @timed("outer")
+    def outer():
+        return inner()
+
+    @timed("inner")
+    def inner():
+        return 1
+
+    with Optimizer() as optimizer:
+        outer()
+    assert set(optimizer.timings) == {"outer"}
@@ -0,0 +1,63 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from investment_simulator import set_constraints as sc
+from investment_simulator import set_objective as so
+from investment_simulator.optimizer_object import Optimizer
+from investment_simulator.set_variables import set_weights
+from investment_simulator.solve_cache import SolveCache
+from conftest import synthetic_panel
+
+
+def _solve(data, cache: SolveCache) -> Optimizer:
+    tickers = list(data.columns)
+    optimizer = Optimizer()
+    optimizer.solve_cache = cache
+    with optimizer:
+        set_weights(tickers)
+        sc.keep_long_positions_only()
+        so.minimize_classical_volatility(data, tickers)
+    optimizer.optimize()
+    return optimizer
+
+
+def test_hit_restores_the_solution(panel, tmp_path):
+    cache = SolveCache(tmp_path)
+    solved = _solve(panel, cache)
+    restored = _solve(panel.copy(), cache)
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert restored.status == solved.status == "optimal"
+    assert restored.value == solved.value
+    weights = restored.get_variable("weights").var.value
+    assert (weights == solved.get_variable("weights").var.value).all()
+
+
+def test_entries_outlive_the_process_and_are_keyed_by_data(panel, tmp_path):
+    _solve(panel, SolveCache(tmp_path))
+    assert len(list(tmp_path.glob("*.json"))) == 1
+    assert not list(tmp_path.glob(".*"))
+    cache = SolveCache(tmp_path)
+    _solve(panel, cache)
+    assert cache.hits == 1
+    # other data is another key; the first entry stays valid
+    _solve(synthetic_panel(seed=1), cache)
+    assert cache.misses == 1
+    _solve(panel, SolveCache(tmp_path, max_entries=0))
+    assert len(list(tmp_path.glob("*.json"))) == 2
+
+
+def test_shared_between_threads(tmp_path):
+    cache = SolveCache(tmp_path, max_entries=4)
+    solution = {"status": "optimal", "value": 1.0}
+
+    def put_and_get(i):
+        key = f"key-{i % 8}"
+        cache.put(key, dict(solution, value=float(i % 8)))
+        return cache.get(key)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(put_and_get, range(64)))
+    assert all(result is not None for result in results)
+    assert cache.hits == 64 and cache.misses == 0
+    assert len(cache._entries) <= 4
+    assert len(list(tmp_path.glob("*.json"))) == 8
+    assert not list(tmp_path.glob(".*"))
@@ -0,0 +1,71 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from investment_simulator import utils
+
+
+def test_fingerprint_is_content_based(panel):
+    tickers = ["T0", "T1"]
+    fingerprint = utils.get_fingerprint(panel, tickers)
+    assert utils.get_fingerprint(panel.copy(), tickers) == fingerprint
+    assert utils.get_fingerprint(panel, ["T0"]) != fingerprint
+    assert utils.get_fingerprint(panel.iloc[1:], tickers) != fingerprint
+    changed = panel.copy()
+    changed.iloc[0, 0] += 1
+    assert utils.get_fingerprint(changed, tickers) != fingerprint
+
+
+def test_in_place_edits_are_not_served_stale(panel):
+    frame = panel.copy()
+
+    def first_price(prices):
+        return prices.to_numpy(float)[0].copy()
+
+    fingerprint = utils.get_fingerprint(frame, ["T0"])
+    before = utils.get_derived_array(first_price, frame, ["T0"])
+    frame.loc[frame.index[0], "T0"] += 1
+    assert utils.get_fingerprint(frame, ["T0"]) != fingerprint
+    after = utils.get_derived_array(first_price, frame, ["T0"])
+    assert after[0] == before[0] + 1
+
+
+def _day(day: int) -> str:
+    return f"2024-01-0{day}"
+
+
+def _frames():
+    # A misses the 3rd; B is listed on the 3rd and misses the 5th
+    a = pd.DataFrame(
+        {"A": [1.0, 2.0, np.nan, 4.0, 5.0, 6.0]}, index=[_day(d) for d in range(1, 7)]
+    )
+    b = pd.DataFrame({"B": [3.0, 4.0, 6.0]}, index=[_day(d) for d in (3, 4, 6)])
+    return [a, b]
+
+
+def test_align_frames_inner():
+    aligned = utils.align_frames(_frames(), "inner")
+    assert list(aligned.index) == [_day(4), _day(6)]
+    assert aligned.loc[_day(6)].tolist() == [6.0, 6.0]
+
+
+def test_align_frames_forward_fill():
+    aligned = utils.align_frames(_frames(), 1)
+    assert list(aligned.index) == [_day(d) for d in (3, 4, 5, 6)]
+    assert aligned["A"].tolist() == [2.0, 4.0, 5.0, 6.0]
+    assert aligned["B"].tolist() == [3.0, 4.0, 4.0, 6.0]
+
+
+def test_align_frames_ragged():
+    aligned = utils.align_frames(_frames(), "ragged")
+    # kept before B's listing, dropped on later missing dates of either
+    assert list(aligned.index) == [_day(d) for d in (1, 2, 4, 6)]
+    assert aligned["B"].isna().tolist() == [True, True, False, False]
+
+
+def test_align_frames_per_ticker_policies():
+    aligned = utils.align_frames(_frames(), "inner", policies={"A": 1, "B": "ragged"})
+    assert list(aligned.index) == [_day(d) for d in (1, 2, 3, 4, 6)]
+    assert aligned.loc[_day(3), "A"] == 2.0
+    with pytest.raises(Exception, match="Unknown alignment policy"):
+        utils.align_frames(_frames(), "outer")